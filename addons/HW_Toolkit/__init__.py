@@ -35,18 +35,22 @@ bl_info = {
 
 if "bpy" in locals():
 	import imp
-	if "newDaeExport" in locals():
-		imp.reload(newDaeExport)
-	if "import_dae" in locals():
-		imp.reload(import_dae)
-	if "import_level" in locals():
-		imp.reload(import_level)
+	import sys
+	# Reloading the add-on: the submodules are looked up in sys.modules, as
+	#  most are only imported inside the operators and never bound here.
+	#  Helper modules first, so the reloaded importers pick up the new versions.
+	for name in ("hodor_names", "dae_stream", "dae_arrays", "dae_anims", "dae_scene", "dae_cache",
+				"texture_index", "texture_decode", "dae_reader", "dae_writer", "newDaeExport",
+				"import_dae", "import_level"):
+		if __name__ + "." + name in sys.modules:
+			imp.reload(sys.modules[__name__ + "." + name])
 	
 
 import math
 import bpy
 import mathutils
 import os
+import traceback
 import bpy_extras
 
 from bpy.props import StringProperty, BoolProperty, FloatProperty, EnumProperty, IntProperty
@@ -84,6 +88,14 @@ class ExportDAE(bpy.types.Operator, ExportHelper):
             default={'EMPTY', 'CAMERA', 'LAMP', 'ARMATURE', 'MESH','CURVE'},
             )
 
+    float_digits = IntProperty(
+            name="Float Digits",
+            description="Significant digits written for positions, normals, UVs and animation keys. 0 writes them exactly, 6 makes much smaller files",
+            default=0,
+            min=0,
+            max=17,
+            )
+
     
 
     @property
@@ -126,13 +138,13 @@ class ExportDAE(bpy.types.Operator, ExportHelper):
                                             ))
 
         from . import newDaeExport
-        return newDaeExport.save(self.filepath)
+        return newDaeExport.save(self.filepath, self.float_digits)
 
 class ImportDAE(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
 	"""Import HWRM DAE"""
 	bl_idname = "import_scene.dae"
 	bl_label = "Import HWRM DAE"
-	bl_options = {'UNDO'}
+	bl_options = set() # undo is pushed in execute(), see use_undo
 
 	filename_ext = ".dae"
 
@@ -154,6 +166,42 @@ class ImportDAE(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
 			default=False,
 			)
 			
+	import_lods = bpy.props.EnumProperty(
+			name="LODs",
+			description="Which ROOT_LOD[n] to import, with their meshes",
+			items=(('0', "LOD 0", ""),
+				   ('1', "LOD 1", ""),
+				   ('2', "LOD 2", ""),
+				   ('3', "LOD 3", ""),
+				   ),
+			options={'ENUM_FLAG'},
+			default={'0', '1', '2', '3'},
+			)
+	
+	import_collision = bpy.props.BoolProperty(
+			name="Collision",
+			description="Import ROOT_COL and the collision meshes",
+			default=True,
+			)
+	
+	import_goblins = bpy.props.BoolProperty(
+			name="Goblins",
+			description="Import the GOBG[] goblin meshes",
+			default=True,
+			)
+	
+	import_dock_paths = bpy.props.BoolProperty(
+			name="Dock paths",
+			description="Import the DOCK[] paths and their segments",
+			default=True,
+			)
+	
+	import_background = bpy.props.BoolProperty(
+			name="Background lights and parameters",
+			description="Import LITE[] background lights and MAT[]_PARAM[] joints",
+			default=True,
+			)
+	
 	merge_goblins = bpy.props.BoolProperty(
 			name="Merge goblins",
 			description="Merge goblins into LOD[0] mesh",
@@ -162,7 +210,45 @@ class ImportDAE(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
 
 	use_smoothing = bpy.props.BoolProperty(
 			name="Split normals",
-			description="Sometimes splitting normals causes Crash To Desktop for unknown reasons. If you get CTD, try turning this off...",
+			description="Use the normals in the DAE as custom split normals. Zero length and NaN normals are replaced with smooth ones first",
+			default=True,
+			)
+	
+	weld_distance = bpy.props.FloatProperty(
+			name="Weld distance",
+			description="Merge vertices closer than this when their normals and UVs also match. 0 keeps every vertex of the DAE",
+			default=0.0001,
+			min=0.0,
+			precision=5,
+			)
+	
+	use_undo = bpy.props.BoolProperty(
+			name="Undo snapshot",
+			description="Store an undo step for the import. Turn this off for very big DAEs, the snapshot is a full copy of the scene",
+			default=True,
+			)
+	
+	use_texture_proxies = bpy.props.BoolProperty(
+			name="Half size textures",
+			description="Load TGA textures at half size, made in the background while the meshes are built. Full size images are loaded for rendering, or with Load Full Size HWRM Textures",
+			default=True,
+			)
+	
+	use_cache = bpy.props.BoolProperty(
+			name="Use cache",
+			description="Keep what was read from each DAE, so importing it again unchanged skips the XML parse and decode",
+			default=True,
+			)
+	
+	use_background = bpy.props.BoolProperty(
+			name="Import in the background",
+			description="Keep Blender responsive while importing, with a progress bar. Press Esc to cancel the import and take out what it had made",
+			default=True,
+			)
+	
+	use_raw_scan = bpy.props.BoolProperty(
+			name="Fast array scan",
+			description="Decode the vertex and index arrays straight from the file rather than through the XML parser, which uses a lot less memory on big DAEs. Turn this off if a DAE fails to import",
 			default=True,
 			)
 	
@@ -181,13 +267,106 @@ class ImportDAE(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
 
 	def execute(self, context):
 		print("Executing HWRM DAE import")
-		print(self.filepath)
+		# Every file selected in the browser, read in parallel and built one after the other
+		paths = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+		if len(paths) == 0:
+			paths = [self.filepath]
+		print(paths)
 		from . import import_dae # re-import, just in case!
+		from . import dae_scene
 		if self.import_as_visual_mesh:
 			print("Importing visual mesh only...")
-			import_dae.ImportLOD0(self.filepath, self.use_smoothing)
-		else:
-			import_dae.ImportDAE(self.filepath, self.use_smoothing, self.dock_path_vis, self.merge_goblins)
+		# Whatever is left out is skipped before its arrays are decoded
+		# All four LODs ticked means no LOD filter, so ROOT_LOD[4] and up still come in
+		import_lods = self.import_lods
+		if len(import_lods) == 4:
+			import_lods = None
+		import_filter = dae_scene.ImportFilter(import_lods, self.import_collision, self.import_goblins, self.import_dock_paths, self.import_background)
+		if import_filter.everything():
+			import_filter = None
+		steps = import_dae.ImportDAEFilesSteps(paths, self.use_smoothing, self.dock_path_vis, self.merge_goblins, self.weld_distance, self.import_as_visual_mesh, self.use_cache, self.use_texture_proxies, import_filter, self.use_raw_scan, self.use_background)
+		self._runner = import_dae.ImportRunner(steps, len(paths))
+		if not self.use_background:
+			while not self._runner.step(1.0):
+				pass
+			return self.finish(context)
+		
+		# Built a slice at a time on a timer, see modal()
+		wm = context.window_manager
+		wm.progress_begin(0, 100)
+		self._timer = wm.event_timer_add(0.05, context.window)
+		wm.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
+	
+	def modal(self, context, event):
+		wm = context.window_manager
+		if event.type == 'ESC':
+			self.stop(context)
+			count, size = self._runner.cancel(context.scene)
+			self.report({'WARNING'}, "Import cancelled, %d datablocks taken out (about %.1f MB)" % (count, size / (1024.0 * 1024.0)))
+			return {'CANCELLED'}
+		if event.type == 'TIMER':
+			self._runner.resume()
+			try:
+				done = self._runner.step(0.1)
+			except Exception:
+				# The timer and progress bar must not outlive the import; the steps
+				#  have already taken out what they made
+				traceback.print_exc()
+				self.stop(context)
+				self.report({'ERROR'}, "Import failed (see the console), what it had made was taken out")
+				return {'CANCELLED'}
+			wm.progress_update(int(self._runner.progress * 100))
+			if done:
+				self.stop(context)
+				return self.finish(context)
+		if self.blocked(context, event):
+			return {'RUNNING_MODAL'}
+		return {'PASS_THROUGH'}
+	
+	def blocked(self, context, event):
+		# Undo (which reloads Main), deleting and loading or starting a file would
+		#  pull the objects and datablocks the import holds from under it, so
+		#  those keys are swallowed while it runs
+		if (event.ctrl or event.oskey) and event.type in ('Z', 'Y', 'O', 'N', 'Q'):
+			return True
+		# X and DEL only where they delete: over the 3D view or the outliner. A
+		#  text field being edited (a rename in the outliner) has its handler
+		#  ahead of this one, so it still gets them.
+		if event.type in ('X', 'DEL') and not (event.ctrl or event.oskey or event.alt):
+			area, region = self.regionUnder(context, event)
+			return area in ('VIEW_3D', 'OUTLINER') and region == 'WINDOW'
+		return False
+	
+	def regionUnder(self, context, event):
+		# (area type, region type) under the mouse, or None for either
+		x = event.mouse_x
+		y = event.mouse_y
+		for area in context.window.screen.areas:
+			if area.x <= x < area.x + area.width and area.y <= y < area.y + area.height:
+				for region in area.regions:
+					if region.x <= x < region.x + region.width and region.y <= y < region.y + region.height:
+						return area.type, region.type
+				return area.type, None
+		return None, None
+	
+	def stop(self, context):
+		wm = context.window_manager
+		wm.event_timer_remove(self._timer)
+		wm.progress_end()
+	
+	def finish(self, context):
+		failed, purged = self._runner.result
+		for path in failed:
+			self.report({'WARNING'}, "Could not read " + path + " (see the console)")
+		if purged[0] > 0:
+			self.report({'INFO'}, "Purged %d unused datablocks, about %.1f MB" % (purged[0], purged[1] / (1024.0 * 1024.0)))
+		times = self._runner.report()
+		if times:
+			print("Import times: " + times)
+			self.report({'INFO'}, "Import times: " + times)
+		if self.use_undo:
+			bpy.ops.ed.undo_push(message="Import HWRM DAE")
 		return {'FINISHED'}
 ###############################################################################
 class ImportLevel(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
@@ -211,9 +390,23 @@ class ImportLevel(bpy.types.Operator, bpy_extras.io_utils.ImportHelper):
 			)
 	def execute(self, context):
 		print("Executing HWRM Level import")
-		print(self.filepath)
+		paths = [os.path.join(self.directory, f.name) for f in self.files if f.name]
+		if len(paths) == 0:
+			paths = [self.filepath]
 		from . import import_level # re-import, just in case!
-		import_level.ImportLevel(self.filepath)
+		for path in paths:
+			import_level.ImportLevel(path)
+		return {'FINISHED'}
+###############################################################################
+class LoadFullSizeTextures(bpy.types.Operator):
+	"""Replace the half size texture proxies made by the DAE importer with the full size images"""
+	bl_idname = "image.hwrm_full_size_textures"
+	bl_label = "Load Full Size HWRM Textures"
+	bl_options = {'UNDO'}
+
+	def execute(self, context):
+		from . import import_dae
+		import_dae.loadFullSizeImages()
 		return {'FINISHED'}
 ###############################################################################
 def menu_func(self, context):
@@ -227,12 +420,20 @@ def register():
 	bpy.utils.register_module(__name__)
 	bpy.types.INFO_MT_file_export.append(menu_func)
 	bpy.types.INFO_MT_file_import.append(menu_import)
+	from . import import_dae
+	bpy.app.handlers.render_pre.append(import_dae.loadFullSizeOnRender)
+	bpy.app.handlers.load_post.append(import_dae.loadFullSizeIfProxyGone)
 	
 	
 def unregister():
 	bpy.utils.unregister_module(__name__)
 	bpy.types.INFO_MT_file_export.remove(menu_func)
 	bpy.types.INFO_MT_file_import.remove(menu_import)
+	from . import import_dae
+	if import_dae.loadFullSizeOnRender in bpy.app.handlers.render_pre:
+		bpy.app.handlers.render_pre.remove(import_dae.loadFullSizeOnRender)
+	if import_dae.loadFullSizeIfProxyGone in bpy.app.handlers.load_post:
+		bpy.app.handlers.load_post.remove(import_dae.loadFullSizeIfProxyGone)
 
 if __name__ == "__main__":
     register()
@@ -0,0 +1,156 @@
+# DAE animation decoding
+#
+# Reads one <animation> channel (a sampler and the sources it points at)
+# into NumPy arrays: key times, values, interpolations and Bezier tangents.
+# The importer turns that into a whole F-curve in one go instead of one
+# keyframe_insert() per sampled frame.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import numpy as np
+
+try:
+	from . import dae_arrays
+except (ImportError, SystemError):
+	# a top level module in a reader worker process, see dae_reader.readDAEs()
+	import dae_arrays
+
+#############
+#DAE Schemas#
+#############
+
+DAEInput = "{http://www.collada.org/2005/11/COLLADASchema}input"
+DAEFloats = "{http://www.collada.org/2005/11/COLLADASchema}float_array"
+DAENames = "{http://www.collada.org/2005/11/COLLADASchema}Name_array"
+DAESource = "{http://www.collada.org/2005/11/COLLADASchema}source"
+DAESampler = "{http://www.collada.org/2005/11/COLLADASchema}sampler"
+DAEChannel = "{http://www.collada.org/2005/11/COLLADASchema}channel"
+
+# COLLADA interpolation names -> Blender keyframe interpolation. The exporter
+#  writes Blender's own names, which are in here too.
+INTERPOLATIONS = {
+	"LINEAR": "LINEAR",
+	"BEZIER": "BEZIER",
+	"HERMITE": "BEZIER",
+	"STEP": "CONSTANT",
+	"CONSTANT": "CONSTANT",
+}
+
+###########
+#Functions#
+###########
+
+class AnimationData:
+	"""One decoded animation channel.
+
+	target is the node name and channel what it animates ("translate.X",
+	"rotateY.ANGLE", ...). times are in seconds and values as written in the
+	DAE (degrees for rotations). interpolations is a list of Blender
+	interpolation names, or None if the DAE has none. inTangents and
+	outTangents are (n, 2) arrays, or None.
+	"""
+	def __init__(self, target, channel, times, values, interpolations, inTangents, outTangents):
+		self.target = target
+		self.channel = channel
+		self.times = times
+		self.values = values
+		self.interpolations = interpolations
+		self.inTangents = inTangents
+		self.outTangents = outTangents
+
+	def blenderPath(self):
+		# (data_path, index) of the Blender property this channel drives, or None
+		channel = self.channel.lower()
+		if channel.startswith("translate"):
+			path = "location"
+		elif channel.startswith("rotate"):
+			path = "rotation_euler"
+			channel = channel[len("rotate"):]
+		elif channel.startswith("scale"):
+			path = "scale"
+		else:
+			return None
+		for i, axis in enumerate("xyz"):
+			if channel.lstrip(".").startswith(axis) or channel.endswith("." + axis):
+				return (path, i)
+		return None
+
+def samplerSources(anim):
+	# semantic -> <source>, following the sampler's inputs where there is one
+	sources = {}
+	for source in anim.findall(DAESource):
+		sources[source.attrib["id"]] = source
+	found = {}
+	sampler = anim.find(DAESampler)
+	if sampler is not None:
+		for inp in sampler.findall(DAEInput):
+			source = sources.get(inp.attrib.get("source", "").lstrip("#"))
+			if source is not None:
+				found[inp.attrib["semantic"].upper()] = source
+	if "INPUT" not in found or "OUTPUT" not in found:
+		# No usable sampler - go by the source ids, as older importers did
+		for id, source in sources.items():
+			if "input" in id.lower():
+				found["INPUT"] = source
+			elif "output" in id.lower():
+				found["OUTPUT"] = source
+	return found
+
+def readTangents(source, count):
+	if source is None:
+		return None
+	tangents = dae_arrays.parseFloatSource(source, 2, np.float64)
+	if len(tangents) != count:
+		return None
+	return tangents
+
+def decodeAnimation(anim):
+	"""Decode the channel of an <animation> element into an AnimationData.
+
+	Returns None if the element has no samples of its own (e.g. the empty
+	per-object <animation> the exporter writes next to the real ones).
+	"""
+	channel = anim.find(DAEChannel)
+	if channel is None:
+		return None
+	sources = samplerSources(anim)
+	if "INPUT" not in sources or "OUTPUT" not in sources:
+		return None
+
+	times = dae_arrays.parseFloats(sources["INPUT"].find(DAEFloats).text, np.float64)
+	values = dae_arrays.parseFloats(sources["OUTPUT"].find(DAEFloats).text, np.float64)
+	count = min(len(times), len(values))
+	times = times[0:count]
+	values = values[0:count]
+
+	interpolations = None
+	if "INTERPOLATION" in sources:
+		names = sources["INTERPOLATION"].find(DAENames)
+		if names is not None and names.text is not None:
+			names = names.text.split()
+			if len(names) >= count:
+				interpolations = [INTERPOLATIONS.get(n.upper(), "BEZIER") for n in names[0:count]]
+
+	inTangents = readTangents(sources.get("IN_TANGENT"), count)
+	outTangents = readTangents(sources.get("OUT_TANGENT"), count)
+	if inTangents is None or outTangents is None:
+		inTangents = outTangents = None
+
+	target = channel.attrib["target"].split("/")
+	return AnimationData(target[0], target[1], times, values, interpolations, inTangents, outTangents)
+
+def tangentsToFrames(animation, fps, scale):
+	"""Return the tangents of animation as Blender handle positions.
+
+	The exporter writes handles as Blender has them, x in frames and y in
+	Blender units (radians for rotations). Other tools write COLLADA
+	tangents, x in seconds and y in the units of the output. Whichever the
+	handle x values sit closer to is taken to be what the file holds; scale
+	converts output units to Blender units.
+	"""
+	frames = animation.times * fps
+	inX = animation.inTangents[:, 0]
+	if np.abs(inX - frames).mean() <= np.abs(inX - animation.times).mean():
+		return animation.inTangents, animation.outTangents
+	factor = np.array([fps, scale])
+	return animation.inTangents * factor, animation.outTangents * factor
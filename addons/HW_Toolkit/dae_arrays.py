@@ -0,0 +1,432 @@
+# DAE array decoding
+#
+# Turns the text bodies of <float_array> and <p> straight into typed NumPy
+# arrays, one reshape per array, instead of going through Python lists of
+# floats and slicing them up. meshBuilder() works from what comes out of here.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import numpy as np
+
+try:
+	from . import dae_stream
+except (ImportError, SystemError):
+	# a top level module in a reader worker process, see dae_reader.readDAEs()
+	import dae_stream
+
+#############
+#DAE Schemas#
+#############
+
+DAEInput = "{http://www.collada.org/2005/11/COLLADASchema}input"
+DAEFloats = "{http://www.collada.org/2005/11/COLLADASchema}float_array"
+DAESource = "{http://www.collada.org/2005/11/COLLADASchema}source"
+DAEMesh = "{http://www.collada.org/2005/11/COLLADASchema}mesh"
+DAETris = "{http://www.collada.org/2005/11/COLLADASchema}triangles"
+DAEPolylist = "{http://www.collada.org/2005/11/COLLADASchema}polylist"
+DAEPolygons = "{http://www.collada.org/2005/11/COLLADASchema}polygons"
+DAEvcount = "{http://www.collada.org/2005/11/COLLADASchema}vcount"
+DAEp = "{http://www.collada.org/2005/11/COLLADASchema}p"
+DAEph = "{http://www.collada.org/2005/11/COLLADASchema}ph"
+
+###########
+#Functions#
+###########
+
+def parseFloats(text, dtype=np.float32):
+	# numpy's text parser treats a " " separator as "any run of whitespace",
+	#  so line breaks and tabs inside the array body are fine. text may be a
+	#  dae_stream.RawText, which is parsed from the file's bytes.
+	if text is None:
+		return np.zeros(0, dtype)
+	if isinstance(text, dae_stream.RawText):
+		text = text.bytes()
+	return np.fromstring(text, dtype=dtype, sep=" ")
+
+def parseInts(text):
+	return parseFloats(text, np.int32)
+
+def parseFloatSource(source, width, dtype=np.float32):
+	"""Decode the <float_array> of a <source> into an (n, width) array."""
+	floats = source.find(DAEFloats)
+	if floats is None:
+		return np.zeros((0, width), dtype)
+	values = parseFloats(floats.text, dtype)
+	return values[0:len(values) - len(values) % width].reshape(-1, width)
+
+class TriangleSet:
+	"""One <triangles> block (or a triangulated <polylist> or <polygons>):
+	its material and its <p> soup as an (n, stride) array.
+
+	Each row of indices is one triangle corner; column vertOffset indexes the
+	positions, normOffset the normals (None if the set has no NORMAL input)
+	and uvOffsets[i] the i-th UV set.
+	"""
+	def __init__(self, material, indices, vertOffset, normOffset, uvOffsets):
+		self.material = material
+		self.indices = indices
+		self.vertOffset = vertOffset
+		self.normOffset = normOffset
+		self.uvOffsets = uvOffsets
+
+class GeometryData:
+	"""The decoded arrays of one <geometry>."""
+	def __init__(self, id, name, positions, normals, uvs, triangles):
+		self.id = id
+		self.name = name
+		self.positions = positions # (n, 3) float32
+		self.normals = normals # (n, 3) float32
+		self.uvs = uvs # list of (n, 2) float32, one per UV set
+		self.triangles = triangles # list of TriangleSet
+
+def readInputs(prim):
+	# (material, stride, vertOffset, normOffset, UVOffsets) of a <triangles>,
+	#  <polylist> or <polygons>
+	if "material" in prim.attrib:
+		material = prim.attrib["material"]
+	else:
+		material = "None"
+
+	maxOffset = 0
+	UVOffsets = []
+	vertOffset = 0
+	normOffset = None
+	for inp in prim.iter(DAEInput):
+		if int(inp.attrib["offset"]) > maxOffset:
+			maxOffset = int(inp.attrib["offset"])
+		if inp.attrib["semantic"].lower() == "texcoord":
+			UVOffsets.append(int(inp.attrib["offset"]))
+		if inp.attrib["semantic"].lower() == "vertex":
+			vertOffset = int(inp.attrib["offset"])
+		if inp.attrib["semantic"].lower() == "normal":
+			normOffset =  int(inp.attrib["offset"])
+	return material, maxOffset + 1, vertOffset, normOffset, UVOffsets
+
+def decodeTriangles(tris):
+	material, stride, vertOffset, normOffset, UVOffsets = readInputs(tris)
+	p = tris.find(DAEp)
+	if p is None or p.text is None:
+		return None
+	soup = parseInts(p.text)
+	# whole triangles only - a truncated <p> would otherwise shift every corner after it
+	soup = soup[0:len(soup) - len(soup) % (stride * 3)]
+	return TriangleSet(material, soup.reshape(-1, stride), vertOffset, normOffset, UVOffsets)
+
+def fanTriangulate(vcount, corners):
+	"""Split polygons into triangle fans, all of them at once.
+
+	vcount is the number of corners of each polygon and corners their (n,
+	stride) index soup, one polygon after the other. Returns the corners of
+	the triangles, three rows per triangle as in a <triangles> <p>. Polygon
+	k becomes (0, i+1, i+2) for i in 0..vcount[k]-3, so the winding is kept;
+	polygons of fewer than three corners, or cut short by the end of the
+	soup, are dropped.
+	"""
+	vcount = vcount.astype(np.int64)
+	vcount = vcount[0:np.searchsorted(np.cumsum(vcount), len(corners), side="right")]
+	starts = np.cumsum(vcount) - vcount
+	numTris = np.maximum(vcount - 2, 0)
+	polygon = np.repeat(np.arange(len(vcount)), numTris) # the polygon of each triangle
+	fan = np.arange(len(polygon)) - (np.cumsum(numTris) - numTris)[polygon] # i, within its polygon
+	tris = np.empty((len(polygon), 3), np.int64)
+	tris[:, 0] = starts[polygon]
+	tris[:, 1] = tris[:, 0] + fan + 1
+	tris[:, 2] = tris[:, 0] + fan + 2
+	return corners[tris.ravel()]
+
+def decodePolylist(polys):
+	material, stride, vertOffset, normOffset, UVOffsets = readInputs(polys)
+	p = polys.find(DAEp)
+	vcount = polys.find(DAEvcount)
+	if p is None or p.text is None or vcount is None:
+		return None
+	soup = parseInts(p.text)
+	corners = soup[0:len(soup) - len(soup) % stride].reshape(-1, stride)
+	return TriangleSet(material, fanTriangulate(parseInts(vcount.text), corners), vertOffset, normOffset, UVOffsets)
+
+def decodePolygons(polys):
+	# One <p> per polygon. A <ph> (polygon with holes) gives its outline, the
+	#  holes are left out.
+	material, stride, vertOffset, normOffset, UVOffsets = readInputs(polys)
+	texts = []
+	for child in polys:
+		if child.tag == DAEph:
+			child = child.find(DAEp)
+		elif child.tag != DAEp:
+			continue
+		if child is not None and child.text is not None:
+			texts.append(str(child.text))
+	if len(texts) == 0:
+		return None
+	# One parse for the lot, the polygon sizes from the number of values in each
+	sizes = [len(text.split()) for text in texts]
+	for number, size in enumerate(sizes):
+		# a polygon cut short would shift every corner of the ones after it
+		if size % stride != 0:
+			raise ValueError("<polygons> of material " + material + ": <p> " + str(number) + " has " + str(size) + " indices, not a multiple of " + str(stride) + " inputs")
+	vcount = np.array(sizes, np.int64) // stride
+	corners = parseInts(" ".join(texts)).reshape(-1, stride)
+	return TriangleSet(material, fanTriangulate(vcount, corners), vertOffset, normOffset, UVOffsets)
+
+# How each kind of primitive under <mesh> becomes a TriangleSet
+DECODERS = {
+	DAETris: decodeTriangles,
+	DAEPolylist: decodePolylist,
+	DAEPolygons: decodePolygons,
+}
+
+def decodeGeometry(geo):
+	"""Decode a <geometry> element into a GeometryData."""
+	mesh = geo.find(DAEMesh)
+
+	positions = np.zeros((0, 3), np.float32)
+	normals = np.zeros((0, 3), np.float32)
+	UVs = []
+
+	for source in mesh.iter(DAESource):
+		if "position" in source.attrib["id"].lower():
+			positions = parseFloatSource(source, 3)
+
+		if "normal" in source.attrib["id"].lower():
+			normals = parseFloatSource(source, 3)
+
+		if "uv" in source.attrib["id"].lower():
+			UVs.append(parseFloatSource(source, 2))
+
+	triangles = []
+	for prim in mesh:
+		if prim.tag not in DECODERS:
+			continue
+		this_set = DECODERS[prim.tag](prim)
+		# Only keep the set if it actually has triangles
+		if this_set is not None and len(this_set.indices) > 0:
+			triangles.append(this_set)
+
+	return GeometryData(geo.attrib["id"], geo.attrib["name"], positions, normals, UVs, triangles)
+
+class MeshData:
+	"""One <geometry> as a single mesh, ready to go into bpy.
+
+	Every triangle set is in here, with only the positions its corners use.
+	Loop arrays have one row per triangle corner, in triangle order.
+	"""
+	def __init__(self, positions, loopVerts, loopNormals, loopUVs, triMaterials, materials):
+		self.positions = positions # (n, 3) float32
+		self.loopVerts = loopVerts # (loops,) int32, indexes positions
+		self.loopNormals = loopNormals # (loops, 3) float32, or None if there are no normals
+		self.loopUVs = loopUVs # list of (loops, 2) float32, one per UV set
+		self.triMaterials = triMaterials # (loops/3,) int32, indexes materials
+		self.materials = materials # material names, in slot order
+
+def mergeTriangleSets(geometry, use_materials=True):
+	"""Gather all the triangle sets of a GeometryData into one MeshData.
+
+	Triangle sets become material indices instead of separate meshes, and
+	positions no triangle refers to are dropped. Sets without a NORMAL input
+	get zero normals if others have them, which splitNormals() swaps for
+	smooth ones. Returns None if the geometry has no triangles.
+	"""
+	if len(geometry.triangles) == 0:
+		return None
+
+	numUVs = min(max([len(tris.uvOffsets) for tris in geometry.triangles]), len(geometry.uvs))
+	hasNormals = len(geometry.normals) > 0 and any([tris.normOffset is not None for tris in geometry.triangles])
+
+	materials = []
+	loopVerts = []
+	loopNormals = []
+	loopUVs = [[] for c in range(0, numUVs)]
+	triMaterials = []
+	for tris in geometry.triangles:
+		indices = tris.indices
+		loopVerts.append(indices[:, tris.vertOffset])
+		if hasNormals:
+			if tris.normOffset is not None:
+				loopNormals.append(geometry.normals[indices[:, tris.normOffset]])
+			else:
+				loopNormals.append(np.zeros((len(indices), 3), np.float32))
+		for c in range(0, numUVs):
+			if c < len(tris.uvOffsets):
+				loopUVs[c].append(geometry.uvs[c][indices[:, tris.uvOffsets[c]]])
+			else:
+				# this set has fewer UV sets than the others
+				loopUVs[c].append(np.zeros((len(indices), 2), np.float32))
+		matIndex = 0
+		if use_materials and tris.material != "None":
+			if tris.material not in materials:
+				materials.append(tris.material)
+			matIndex = materials.index(tris.material)
+		triMaterials.append(np.full(len(indices) // 3, matIndex, np.int32))
+
+	# Keep only the positions that are used, renumbered in their original order
+	used, loopVerts = np.unique(np.concatenate(loopVerts), return_inverse=True)
+	positions = geometry.positions[used]
+
+	if hasNormals:
+		loopNormals = np.concatenate(loopNormals)
+	else:
+		loopNormals = None
+	loopUVs = [np.concatenate(uv) for uv in loopUVs]
+
+	return MeshData(positions, loopVerts.astype(np.int32).ravel(), loopNormals, loopUVs, np.concatenate(triMaterials), materials)
+
+def weldVertices(meshData, tolerance=0.0001):
+	"""Merge the corners of a MeshData that share position, normal and UVs.
+
+	Corners whose attributes all round to the same multiple of tolerance
+	end up on one vertex; corners on a UV or normal seam keep separate
+	vertices. Triangles that collapse are dropped. This is a sort, so it is
+	O(n log n) in the number of corners. Returns a new MeshData, vertices
+	numbered in order of first use.
+	"""
+	numLoops = len(meshData.loopVerts)
+	if numLoops == 0:
+		return meshData
+
+	loopPositions = meshData.positions[meshData.loopVerts]
+	columns = [loopPositions]
+	if meshData.loopNormals is not None:
+		columns.append(meshData.loopNormals)
+	columns.extend(meshData.loopUVs)
+	keys = np.floor(np.hstack(columns).astype(np.float64) / tolerance + 0.5).astype(np.int64)
+
+	# Sort the corners by key, then every run of equal keys is one vertex.
+	#  lexsort is stable, so the first corner of each run is its lowest index.
+	order = np.lexsort(keys.T[::-1])
+	sortedKeys = keys[order]
+	starts = np.ones(numLoops, bool)
+	starts[1:] = np.any(sortedKeys[1:] != sortedKeys[:-1], axis=1)
+	groupOfSorted = np.cumsum(starts) - 1
+	firstLoop = order[starts]
+
+	# Number the vertices by first use rather than by key
+	rank = np.empty(len(firstLoop), np.int64)
+	rank[np.argsort(firstLoop)] = np.arange(len(firstLoop))
+	loopVerts = np.empty(numLoops, np.int32)
+	loopVerts[order] = rank[groupOfSorted]
+	positions = loopPositions[np.sort(firstLoop)]
+
+	loopNormals = meshData.loopNormals
+	loopUVs = meshData.loopUVs
+	triMaterials = meshData.triMaterials
+
+	# Drop triangles that have collapsed to a line or a point
+	tris = loopVerts.reshape(-1, 3)
+	keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+	if not keep.all():
+		keepLoops = np.repeat(keep, 3)
+		used, loopVerts = np.unique(loopVerts[keepLoops], return_inverse=True)
+		loopVerts = loopVerts.astype(np.int32).ravel()
+		positions = positions[used]
+		if loopNormals is not None:
+			loopNormals = loopNormals[keepLoops]
+		loopUVs = [uv[keepLoops] for uv in loopUVs]
+		triMaterials = triMaterials[keep]
+
+	return MeshData(positions, loopVerts, loopNormals, loopUVs, triMaterials, meshData.materials)
+
+def unitVectors(vectors):
+	# vectors scaled to unit length, and a mask of the ones that could be -
+	#  the rest (zero length, NaN or inf) come back as zero
+	lengths = np.sqrt((vectors * vectors).sum(axis=1))
+	good = np.isfinite(lengths) & (lengths > 1e-12)
+	unit = np.zeros(vectors.shape, vectors.dtype)
+	unit[good] = vectors[good] / lengths[good, np.newaxis]
+	return unit, good
+
+def faceNormals(positions, loopVerts):
+	# The cross product of each triangle's edges: its normal, as long as
+	#  twice its area, so summing them weights big triangles more
+	corners = positions[loopVerts].astype(np.float64).reshape(-1, 3, 3)
+	return np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+def splitNormals(meshData):
+	"""The loop normals of a MeshData, made safe for custom split normals.
+
+	Normals are brought to unit length. Any that can't be (zero length, NaN
+	or inf) are replaced by the smooth normal of their vertex, worked out
+	from the triangles around it, or failing that by their triangle's own
+	normal, or failing that by +Z. Returns (normals, perVertex): when all the
+	corners of each vertex agree, normals is one row per vertex, for
+	normals_split_custom_set_from_vertices(); otherwise one row per loop.
+	"""
+	loopVerts = meshData.loopVerts
+	numVerts = len(meshData.positions)
+	normals, good = unitVectors(meshData.loopNormals.astype(np.float64))
+
+	if not good.all():
+		loopFaces = np.repeat(faceNormals(meshData.positions, loopVerts), 3, axis=0)
+		smooth = np.column_stack([np.bincount(loopVerts, loopFaces[:, i], numVerts) for i in range(0, 3)])
+		smooth, smoothGood = unitVectors(smooth)
+		flat, flatGood = unitVectors(loopFaces)
+		bad = ~good
+		use = bad & smoothGood[loopVerts]
+		normals[use] = smooth[loopVerts[use]]
+		bad = bad & ~use
+		use = bad & flatGood
+		normals[use] = flat[use]
+		normals[bad & ~flatGood] = (0.0, 0.0, 1.0)
+
+	# Welded vertices mostly have one normal for all their corners, and a
+	#  normal per vertex is a lot less to hand over to Blender
+	vertNormals = np.zeros((numVerts, 3), np.float64)
+	vertNormals[loopVerts] = normals
+	if np.allclose(vertNormals[loopVerts], normals, rtol=0.0, atol=1e-6):
+		return vertNormals.astype(np.float32), True
+	return normals.astype(np.float32), False
+
+def transformMeshData(meshData, matrix):
+	"""Return meshData with its positions and normals moved by a 4x4 matrix."""
+	matrix = np.asarray(matrix, np.float64)
+	positions = (np.dot(meshData.positions, matrix[0:3, 0:3].T) + matrix[0:3, 3]).astype(np.float32)
+	loopNormals = meshData.loopNormals
+	if loopNormals is not None:
+		# Normals go by the inverse transpose, then back to unit length
+		loopNormals = unitVectors(np.dot(loopNormals, np.linalg.inv(matrix[0:3, 0:3])))[0].astype(np.float32)
+	return MeshData(positions, meshData.loopVerts, loopNormals, meshData.loopUVs, meshData.triMaterials, meshData.materials)
+
+def concatMeshData(meshes):
+	"""Join several MeshData into one, the way joining their objects would.
+
+	Material slots are shared by name, in order of first use. Meshes with
+	fewer UV sets get zeros for the rest; if only some have normals, the
+	others get zero normals, which splitNormals() swaps for smooth ones.
+	"""
+	materials = []
+	positions = []
+	loopVerts = []
+	loopNormals = []
+	triMaterials = []
+	numUVs = max([len(m.loopUVs) for m in meshes])
+	loopUVs = [[] for c in range(0, numUVs)]
+	hasNormals = any([m.loopNormals is not None for m in meshes])
+	offset = 0
+	for m in meshes:
+		slots = []
+		for name in m.materials:
+			if name not in materials:
+				materials.append(name)
+			slots.append(materials.index(name))
+		if len(slots) > 0:
+			triMaterials.append(np.array(slots, np.int32)[m.triMaterials])
+		else:
+			triMaterials.append(np.zeros(len(m.triMaterials), np.int32))
+		positions.append(m.positions)
+		loopVerts.append(m.loopVerts + offset)
+		offset = offset + len(m.positions)
+		if hasNormals:
+			if m.loopNormals is not None:
+				loopNormals.append(m.loopNormals)
+			else:
+				loopNormals.append(np.zeros((len(m.loopVerts), 3), np.float32))
+		for c in range(0, numUVs):
+			if c < len(m.loopUVs):
+				loopUVs[c].append(m.loopUVs[c])
+			else:
+				loopUVs[c].append(np.zeros((len(m.loopVerts), 2), np.float32))
+
+	if hasNormals:
+		loopNormals = np.concatenate(loopNormals)
+	else:
+		loopNormals = None
+	return MeshData(np.concatenate(positions), np.concatenate(loopVerts).astype(np.int32), loopNormals, [np.concatenate(uv) for uv in loopUVs], np.concatenate(triMaterials), materials)
@@ -0,0 +1,146 @@
+# Decoded DAE cache
+#
+# Re-importing a DAE that hasn't changed shouldn't mean parsing the XML and
+# decoding every float again. dae_reader packs what it read into a small
+# JSON description plus a set of NumPy arrays; this module keeps those in
+# one .npz per file in a cache folder, least recently used out first once
+# the folder goes over its size limit. MemoryCache keeps the unpacked
+# results of this session as well, so importing the same file again doesn't
+# even touch the disk.
+#
+# An entry is keyed on the file's path, size and mtime, and on the read
+# options, so anything that changes what would be read misses the cache.
+# The contents aren't hashed: that would mean reading the whole file on
+# every import just to find out it doesn't need reading. A tool that
+# rewrites a file in place keeping its size and mtime is not caught.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import os
+import json
+import hashlib
+import tempfile
+import collections
+
+import numpy as np
+
+# Bump whenever what dae_reader packs changes shape, or what it reads from a file
+CACHE_VERSION = 5
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "HW_Toolkit_cache")
+CACHE_SIZE = 2 * 1024 * 1024 * 1024 # bytes on disk before the oldest entries go
+MEMORY_SIZE = 512 * 1024 * 1024 # bytes of arrays kept in memory
+
+###########
+#Functions#
+###########
+
+def fileStamp(path):
+	# Path, size and mtime, to the nanosecond where the file system has it
+	stat = os.stat(path)
+	return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+def fileKey(path, options):
+	"""The cache key for reading path with options (a tuple of plain values)."""
+	key = repr((CACHE_VERSION, fileStamp(path), options))
+	return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def entryPath(key, cache_dir):
+	return os.path.join(cache_dir, key + ".npz")
+
+def load(key, cache_dir=CACHE_DIR):
+	"""Return (description, arrays) stored under key, or None."""
+	path = entryPath(key, cache_dir)
+	try:
+		with np.load(path) as npz:
+			arrays = dict([(name, npz[name]) for name in npz.files])
+		# Touch it, the mtime is what the eviction goes by
+		os.utime(path, None)
+	except (IOError, OSError, ValueError, KeyError):
+		return None
+	description = json.loads(str(arrays.pop("description")))
+	if description.get("version") != CACHE_VERSION:
+		return None
+	return description, arrays
+
+def store(key, description, arrays, cache_dir=CACHE_DIR, cache_size=CACHE_SIZE):
+	"""Store description (JSON-able) and arrays (name -> ndarray) under key."""
+	description = dict(description, version=CACHE_VERSION)
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		path = entryPath(key, cache_dir)
+		# Write under another name and move it into place, so a reader in
+		#  another process never sees half an entry
+		temp = path + "." + str(os.getpid()) + ".tmp"
+		with open(temp, "wb") as f:
+			np.savez(f, description=np.array(json.dumps(description)), **arrays)
+		os.replace(temp, path)
+	except (IOError, OSError) as e:
+		print("!- Could not write to the DAE cache: " + str(e))
+		return
+	evict(cache_dir, cache_size)
+
+def evict(cache_dir=CACHE_DIR, cache_size=CACHE_SIZE):
+	# Least recently used entries first, until the folder fits
+	entries = []
+	for name in os.listdir(cache_dir):
+		if name.endswith(".npz"):
+			try:
+				stat = os.stat(os.path.join(cache_dir, name))
+			except OSError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, name))
+	entries.sort()
+	total = sum([size for mtime, size, name in entries])
+	for mtime, size, name in entries:
+		if total <= cache_size:
+			break
+		try:
+			os.remove(os.path.join(cache_dir, name))
+		except OSError:
+			pass # another import got there first
+		total = total - size
+
+def clear(cache_dir=CACHE_DIR):
+	if os.path.isdir(cache_dir):
+		evict(cache_dir, 0)
+
+class MemoryCache:
+	"""Unpacked read results of this session, least recently used out first.
+
+	Keyed on fileStamp() and the read options; size is what the arrays of
+	each result add up to, as given to put().
+	"""
+	def __init__(self, limit=MEMORY_SIZE):
+		self.limit = limit
+		self.entries = collections.OrderedDict() # key -> (result, size)
+		self.total = 0
+
+	def key(self, path, options):
+		try:
+			return (fileStamp(path), options)
+		except OSError:
+			return None
+
+	def get(self, key):
+		if key not in self.entries:
+			return None
+		result, size = self.entries.pop(key)
+		self.entries[key] = (result, size)
+		return result
+
+	def put(self, key, result, size):
+		if key is None or size > self.limit:
+			return
+		if key in self.entries:
+			self.total = self.total - self.entries.pop(key)[1]
+		self.entries[key] = (result, size)
+		self.total = self.total + size
+		while self.total > self.limit:
+			old_key, (old_result, old_size) = self.entries.popitem(last=False)
+			self.total = self.total - old_size
+
+	def clear(self):
+		self.entries.clear()
+		self.total = 0
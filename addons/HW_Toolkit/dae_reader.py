@@ -0,0 +1,629 @@
+# DAE reading, apart from building
+#
+# Everything the importer does to a DAE before it touches bpy: the XML
+# parse, the array decode, merging and welding the meshes, the scene index
+# and the animation channels. What comes out is plain Python and NumPy, so
+# it can be read in another process and handed back to Blender's main
+# thread to build.
+#
+# readDAEs() reads several files at once in a pool of worker processes,
+# going through dae_cache first when it is given a cache folder. A file read
+# on its own has its bigger <geometry>s decoded across the pool instead.
+# The workers run Blender's Python without bpy and without the add-on
+# package (its __init__ imports bpy), so they load this module and its
+# helpers as top level modules from the add-on folder. Blender itself only
+# ever has the package's copies: jobs name the worker functions rather
+# than pickling them, and results come back as plain data, see ReaderPool.
+
+import os
+import sys
+import site
+import queue
+import threading
+import importlib
+import collections
+import traceback
+import multiprocessing
+
+try:
+	from . import dae_stream
+	from . import dae_arrays
+	from . import dae_anims
+	from . import dae_scene
+	from . import dae_cache
+except (ImportError, SystemError):
+	# a top level module in a reader worker process, see readDAEs()
+	import dae_stream
+	import dae_arrays
+	import dae_anims
+	import dae_scene
+	import dae_cache
+
+#############
+#DAE Schemas#
+#############
+
+DAEInit = "{http://www.collada.org/2005/11/COLLADASchema}init_from"
+DAEUpAxis = "{http://www.collada.org/2005/11/COLLADASchema}up_axis"
+DAEMaterials = "{http://www.collada.org/2005/11/COLLADASchema}material"
+DAEInstanceEffect = "{http://www.collada.org/2005/11/COLLADASchema}instance_effect"
+DAEfx = "{http://www.collada.org/2005/11/COLLADASchema}effect"
+DAEimage = "{http://www.collada.org/2005/11/COLLADASchema}image"
+DAELibImages = "{http://www.collada.org/2005/11/COLLADASchema}library_images"
+DAEDiff = "{http://www.collada.org/2005/11/COLLADASchema}diffuse"
+DAETex = "{http://www.collada.org/2005/11/COLLADASchema}texture"
+DAEGeo = "{http://www.collada.org/2005/11/COLLADASchema}geometry"
+DAEVisualScene = "{http://www.collada.org/2005/11/COLLADASchema}visual_scene"
+DAEAnim = "{http://www.collada.org/2005/11/COLLADASchema}animation"
+
+# <geometry>s smaller than this (in bytes of the file) aren't worth sending
+#  to another process, see readDAE()
+GEOMETRY_JOB_SIZE = 256 * 1024
+
+# Seconds to wait for a new worker to answer before giving up on the pool
+STARTUP_TIMEOUT = 30
+
+###########
+#Functions#
+###########
+
+class DAEContents:
+	"""Everything the importer builds from one DAE, read and decoded."""
+	def __init__(self, path):
+		self.path = path
+		self.up_axis = "Z_UP"
+		self.y_up = False # Y up with an unturned ROOT_LOD[0], see dae_scene.unrotatedRoot()
+		self.index = dae_scene.SceneIndex() # geometries is left for the build to fill in
+		self.images = [] # (<image> id, <init_from> path)
+		self.effects = [] # (material name, [texture names])
+		self.geometries = [] # (<geometry> id, name, MeshData or None)
+		self.scenes = [] # list of SceneNode for each <visual_scene>
+		self.animations = [] # AnimationData
+
+def readGeometry(geo, use_materials, weld_dist):
+	"""Decode a <geometry> into a single, welded MeshData (or None if it has no triangles)."""
+	geometry = dae_arrays.decodeGeometry(geo)
+
+	# One mesh for the whole <geometry>, the <triangles> sets become material slots
+	meshData = dae_arrays.mergeTriangleSets(geometry, use_materials)
+
+	# Weld on the arrays before the mesh is made (no edit mode / remove_doubles)
+	if meshData is not None and weld_dist > 0:
+		numVerts = len(meshData.positions)
+		meshData = dae_arrays.weldVertices(meshData, weld_dist)
+		print("Welded " + str(numVerts) + " vertices down to " + str(len(meshData.positions)))
+	return meshData
+
+def readGeometryAt(job):
+	# (path, root, span, id, weld_dist) -> the MeshData of the <geometry> at
+	#  span, see dae_stream.elementSpans()
+	DAEfullpath, root, span, id, weld_dist = job
+	geo = dae_stream.readElement(DAEfullpath, root, span)
+	if geo.tag != DAEGeo or geo.attrib.get("id") != id:
+		raise ValueError("<geometry> " + id + " was not where it was expected in " + DAEfullpath)
+	return readGeometry(geo, True, weld_dist)
+
+def readGeometryPacked(job):
+	# Runs in a worker: readGeometryAt() as (mesh, arrays), see packMesh()
+	arrays = {}
+	return packMesh(readGeometryAt(job), "", arrays), arrays
+
+def geometryKept(importFilter, id, name, wantedGeometries, usedGeometries):
+	# A <geometry> a node uses goes with its nodes, once the scene is known;
+	#  one no node uses (or not known yet) is only dropped by its name
+	if wantedGeometries is not None and id in usedGeometries:
+		return id in wantedGeometries
+	return importFilter.geometryWanted(name) and importFilter.geometryWanted(id)
+
+def readScene(contents, visual_scene, importFilter, allNames, usedGeometries, wantedGeometries):
+	# Adds the (filtered) nodes of a <visual_scene> to contents.scenes. Y up
+	#  is decided on all of them, as the filter may drop ROOT_LOD[0].
+	contents.y_up = contents.y_up or dae_scene.unrotatedRoot(visual_scene)
+	nodes = dae_scene.readNodes(visual_scene)
+	if importFilter is not None:
+		allNames.update([node.name for node in nodes])
+		for node in nodes:
+			usedGeometries.update(node.geometries)
+		nodes = dae_scene.filterNodes(nodes, importFilter)
+		for node in nodes:
+			wantedGeometries.update(node.geometries)
+	contents.scenes.append(nodes)
+
+def readDAE(DAEfullpath, weld_dist=0.0001, importFilter=None, raw=False, pool=None):
+	"""Read a DAE into a DAEContents.
+
+	importFilter (a dae_scene.ImportFilter) drops nodes and the geometries
+	only they use before anything of the geometry is decoded: the visual
+	scene is read ahead of the rest of the file to find them. raw has the
+	arrays decoded straight from the file, see dae_stream.iterDAE().
+	Given a ReaderPool, big geometries are decoded in its processes, all at
+	once, while this one carries on through the file. Any the pool fails
+	on (it would not start, or a worker died) are decoded here instead.
+	"""
+	contents = DAEContents(DAEfullpath)
+	index = contents.index
+	if importFilter is not None and importFilter.everything():
+		importFilter = None
+	allNames = set() # every node name, for dropping the animations of filtered nodes
+	wantedGeometries = None # <geometry> ids the kept nodes use, if there is a scene
+	usedGeometries = set() # <geometry> ids any node uses, kept or not
+	spans = [] # where each <geometry> is in the file, for the pool
+	pending = [] # (place in contents.geometries, result of readGeometryAt())
+	if pool is not None:
+		root, spans = dae_stream.elementSpans(DAEfullpath, "geometry")
+	geoCount = 0
+
+	wanted = (DAEUpAxis, DAEimage, DAEMaterials, DAEfx, DAEGeo, DAEVisualScene, DAEAnim)
+	if importFilter is not None:
+		# The scene may well come after the geometries (it does from most
+		#  exporters but ours), so it is found and read first
+		sceneRoot, sceneSpans = dae_stream.elementSpans(DAEfullpath, "visual_scene")
+		if len(sceneSpans) > 0:
+			wantedGeometries = set()
+		for span in sceneSpans:
+			readScene(contents, dae_stream.readElement(DAEfullpath, sceneRoot, span), importFilter, allNames, usedGeometries, wantedGeometries)
+		wanted = (DAEUpAxis, DAEimage, DAEMaterials, DAEfx, DAEGeo, DAEAnim)
+	# Effects may have <image>s of their own (COLLADA 1.4 profile_COMMON); only
+	#  the library's are textures
+	for tag, elem in dae_stream.iterDAE(DAEfullpath, wanted, raw=raw, under={DAEimage: DAELibImages}):
+		if tag == DAEUpAxis:
+			contents.up_axis = elem.text.strip()
+
+		elif tag == DAEVisualScene:
+			# Only without a filter - with one, the scene was read above
+			readScene(contents, elem, None, allNames, usedGeometries, wantedGeometries)
+
+		elif tag == DAEimage:
+			# We use attrib["id]" here because RODOH DAEs have "name"s that do not match their "id"s
+			#  this means we will lose the _FMT[] tag but we will have to live with that for now...
+			#
+			# Example (to solve we would need to add the _FMT[] tag back on at the <texture> stage:
+			# <image id="IMG[Hgn_MarineFrigate_Front_DIFF]-image" name="IMG[Hgn_MarineFrigate_Front_DIFF]_FMT[DXT5]">
+			# <texture texture="IMG[Hgn_MarineFrigate_Front_DIFF]-image">
+			#
+			# Let's have a warning message just to let the user know:
+			if elem.attrib["id"].rstrip("-image") != elem.attrib["name"]:
+				print("This appears to be a RODOH DAE. _FMT[] tags will be lost from textures - sorry!")
+			contents.images.append((elem.attrib["id"], elem.find(DAEInit).text)) # resolved by texture_index when built
+			index.images[elem.attrib["id"]] = elem.attrib["id"].rstrip("-image")
+
+		elif tag == DAEMaterials:
+			fx = elem.find(DAEInstanceEffect)
+			if fx is not None:
+				index.materials[elem.attrib["id"]] = fx.attrib["url"].lstrip("#")
+
+		elif tag == DAEfx:
+			matname = elem.attrib["name"]
+			index.effects[elem.attrib["id"]] = matname
+			matTextures = []
+			# Just look for the <diffuse> tag - don't care about the other image files
+			for d in elem.iter(DAEDiff):
+				t = d.find(DAETex)
+				if t is not None:
+					texture_id = t.attrib["texture"]
+					matTextures.append(index.images.get(texture_id, texture_id.rstrip("-image")))
+			contents.effects.append((matname, matTextures))
+
+		elif tag == DAEGeo:
+			span = None
+			if geoCount < len(spans):
+				span = spans[geoCount]
+			geoCount = geoCount + 1
+			if importFilter is not None:
+				# Skipped before a single float is decoded - by the scene, or by
+				#  name if the file has none
+				if not geometryKept(importFilter, elem.attrib["id"], elem.attrib["name"], wantedGeometries, usedGeometries):
+					print("Skipping " + elem.attrib["name"])
+					continue
+			meshData = None # filled in below if the pool takes it
+			queued = False
+			if pool is not None and span is not None and span[1] - span[0] >= GEOMETRY_JOB_SIZE:
+				job = (DAEfullpath, root, span, elem.attrib["id"], weld_dist)
+				try:
+					pending.append((len(contents.geometries), job, pool.apply_async("readGeometryPacked", job)))
+					queued = True
+				except Exception:
+					traceback.print_exc()
+					print("!- The reader pool could not start, decoding here instead")
+					pool = None
+			if not queued:
+				meshData = readGeometry(elem, True, weld_dist)
+			contents.geometries.append((elem.attrib["id"], elem.attrib["name"], meshData))
+
+		elif tag == DAEAnim:
+			this_anim = dae_anims.decodeAnimation(elem)
+			if this_anim is not None:
+				contents.animations.append(this_anim)
+
+	if len(pending) > 0 and not pool.working():
+		print("!- The reader pool did not start, decoding here instead")
+		pending = [(i, job, None) for i, job, result in pending]
+	for i, job, result in pending:
+		id, name, meshData = contents.geometries[i]
+		if result is not None:
+			try:
+				meshData = unpackMesh(*result.get())
+			except Exception:
+				traceback.print_exc()
+				print("!- The reader pool failed on " + name + ", decoding it here instead")
+				result = None
+		if result is None:
+			meshData = readGeometryAt(job)
+		contents.geometries[i] = (id, name, meshData)
+
+	contents.y_up = contents.y_up and contents.up_axis == "Y_UP"
+	if importFilter is not None and wantedGeometries is not None:
+		keptNames = set()
+		for nodes in contents.scenes:
+			keptNames.update([node.name for node in nodes])
+		contents.animations = [a for a in contents.animations if a.target in keptNames or a.target not in allNames]
+
+	# Materials are named after their effects, which may come after the geometry
+	for id, name, meshData in contents.geometries:
+		if meshData is not None:
+			meshData.materials = [index.materialName(m) for m in meshData.materials]
+	return contents
+
+def readLOD0(DAEfullpath, weld_dist=0.0001, raw=False):
+	"""Read the MULT[]_LOD[0] meshes of a DAE, without materials.
+
+	Returns a list of (<geometry> name, MeshData or None).
+	"""
+	meshes = []
+	for tag, geo in dae_stream.iterDAE(DAEfullpath, (DAEGeo,), raw=raw):
+		if "MULT[" in geo.attrib["name"] and "_LOD[0]" in geo.attrib["name"]:
+			meshes.append((geo.attrib["name"], readGeometry(geo, False, weld_dist)))
+	return meshes
+
+###################
+#Cache (un)packing#
+###################
+
+def packMesh(meshData, prefix, arrays):
+	# Moves the arrays of a MeshData into arrays, returns the rest of it
+	if meshData is None:
+		return None
+	arrays[prefix + "positions"] = meshData.positions
+	arrays[prefix + "loopVerts"] = meshData.loopVerts
+	arrays[prefix + "triMaterials"] = meshData.triMaterials
+	if meshData.loopNormals is not None:
+		arrays[prefix + "loopNormals"] = meshData.loopNormals
+	for i, uv in enumerate(meshData.loopUVs):
+		arrays[prefix + "uv" + str(i)] = uv
+	return {"prefix": prefix, "normals": meshData.loopNormals is not None, "uvs": len(meshData.loopUVs), "materials": meshData.materials}
+
+def unpackMesh(mesh, arrays):
+	if mesh is None:
+		return None
+	prefix = mesh["prefix"]
+	loopNormals = None
+	if mesh["normals"]:
+		loopNormals = arrays[prefix + "loopNormals"]
+	loopUVs = [arrays[prefix + "uv" + str(i)] for i in range(0, mesh["uvs"])]
+	return dae_arrays.MeshData(arrays[prefix + "positions"], arrays[prefix + "loopVerts"], loopNormals, loopUVs, arrays[prefix + "triMaterials"], mesh["materials"])
+
+def packResult(result, lod0_only):
+	"""Split a readDAE() or readLOD0() result into (description, arrays) for dae_cache."""
+	arrays = {}
+	if lod0_only:
+		return {"lod0": [[name, packMesh(meshData, "mesh" + str(i) + "_", arrays)] for i, (name, meshData) in enumerate(result)]}, arrays
+
+	description = {
+		"path": result.path,
+		"up_axis": result.up_axis,
+		"y_up": result.y_up,
+		"materials": result.index.materials,
+		"effect_names": result.index.effects,
+		"image_names": result.index.images,
+		"images": result.images,
+		"effects": result.effects,
+		"geometries": [[id, name, packMesh(meshData, "mesh" + str(i) + "_", arrays)] for i, (id, name, meshData) in enumerate(result.geometries)],
+		"scenes": [[[n.name, n.parent, n.children, n.location, n.rotation, n.geometries] for n in nodes] for nodes in result.scenes],
+		"animations": [],
+	}
+	for i, anim in enumerate(result.animations):
+		prefix = "anim" + str(i) + "_"
+		arrays[prefix + "times"] = anim.times
+		arrays[prefix + "values"] = anim.values
+		if anim.inTangents is not None:
+			arrays[prefix + "in"] = anim.inTangents
+			arrays[prefix + "out"] = anim.outTangents
+		description["animations"].append([anim.target, anim.channel, anim.interpolations, anim.inTangents is not None])
+	return description, arrays
+
+def unpackResult(description, arrays, lod0_only):
+	if lod0_only:
+		return [(name, unpackMesh(mesh, arrays)) for name, mesh in description["lod0"]]
+
+	contents = DAEContents(description["path"])
+	contents.up_axis = description["up_axis"]
+	contents.y_up = description["y_up"]
+	contents.index.materials = description["materials"]
+	contents.index.effects = description["effect_names"]
+	contents.index.images = description["image_names"]
+	contents.images = [tuple(image) for image in description["images"]]
+	contents.effects = [tuple(effect) for effect in description["effects"]]
+	contents.geometries = [(id, name, unpackMesh(mesh, arrays)) for id, name, mesh in description["geometries"]]
+	for scene in description["scenes"]:
+		nodes = []
+		for name, parent, children, location, rotation, geometries in scene:
+			node = dae_scene.SceneNode(name, parent, location, rotation, geometries)
+			node.children = children
+			nodes.append(node)
+		contents.scenes.append(nodes)
+	for i, (target, channel, interpolations, tangents) in enumerate(description["animations"]):
+		prefix = "anim" + str(i) + "_"
+		inTangents = outTangents = None
+		if tangents:
+			inTangents = arrays[prefix + "in"]
+			outTangents = arrays[prefix + "out"]
+		contents.animations.append(dae_anims.AnimationData(target, channel, arrays[prefix + "times"], arrays[prefix + "values"], interpolations, inTangents, outTangents))
+	return contents
+
+def resultSize(result, lod0_only):
+	# bytes of array data in a result, for the memory cache
+	description, arrays = packResult(result, lod0_only)
+	return sum([a.nbytes for a in arrays.values()])
+
+#########
+#Reading#
+#########
+
+# Results read in this session, see readDAEs()
+memory = dae_cache.MemoryCache()
+
+def readJob(job, pool=None):
+	# Runs in a worker: (path, weld_dist, lod0_only, cache_dir, filter key, raw) -> (path, result, error)
+	#  Errors come back as text so one bad file doesn't stop the others.
+	#  pool is a ReaderPool for readDAE(), when this is run in Blender itself.
+	DAEfullpath, weld_dist, lod0_only, cache_dir, filterKey, raw = job
+	try:
+		key = None
+		if cache_dir is not None:
+			key = dae_cache.fileKey(DAEfullpath, (weld_dist, lod0_only, filterKey))
+			cached = dae_cache.load(key, cache_dir)
+			if cached is not None:
+				print("Read " + DAEfullpath + " from the cache")
+				return (DAEfullpath, unpackResult(cached[0], cached[1], lod0_only), None)
+		if lod0_only:
+			result = readLOD0(DAEfullpath, weld_dist, raw)
+		else:
+			result = readDAE(DAEfullpath, weld_dist, dae_scene.ImportFilter(*filterKey), raw, pool)
+		if key is not None:
+			description, arrays = packResult(result, lod0_only)
+			dae_cache.store(key, description, arrays, cache_dir)
+		return (DAEfullpath, result, None)
+	except Exception:
+		return (DAEfullpath, None, traceback.format_exc())
+
+def readJobPacked(job):
+	# Runs in a worker: readJob() with the result as (description, arrays),
+	#  see packResult()
+	DAEfullpath, result, error = readJob(job)
+	if result is not None:
+		result = packResult(result, job[2])
+	return (DAEfullpath, result, error)
+
+def readDAEs(paths, weld_dist=0.0001, lod0_only=False, executable=None, processes=None, cache_dir=None, importFilter=None, raw=False):
+	"""Read several DAEs at once, yielding (path, result, error) in the order of paths.
+
+	result is what readDAE() (or readLOD0() with lod0_only) returns, or None
+	with the traceback in error if the file could not be read. Files are read
+	in a pool of processes started from executable (Blender's own Python),
+	so later files are still being read while the caller builds the first
+	ones. At most one file per process is read ahead of the one the caller
+	has taken, as each holds all of its decoded arrays until it is built.
+	A single file is read here, without a pool.
+
+	With a cache_dir, files read earlier in the session come straight from
+	memory and the workers look in the on-disk cache before reading.
+	importFilter and raw are passed on to readDAE().
+	"""
+	if importFilter is None:
+		importFilter = dae_scene.ImportFilter()
+	options = (weld_dist, lod0_only, importFilter.key())
+	hits = {} # place in paths -> result from memory, so a path given twice comes out twice
+	jobs = []
+	for number, path in enumerate(paths):
+		result = None
+		if cache_dir is not None:
+			result = memory.get(memory.key(path, options))
+		if result is not None:
+			print("Read " + path + " from memory")
+			hits[number] = result
+		else:
+			jobs.append((path, weld_dist, lod0_only, cache_dir, importFilter.key(), raw))
+
+	number = 0
+	for result in readJobs(jobs, executable, processes):
+		# Results waiting in memory go out in their place in paths
+		while number in hits:
+			yield (paths[number], hits.pop(number), None)
+			number = number + 1
+		number = number + 1
+		if cache_dir is not None and result[1] is not None:
+			memory.put(memory.key(result[0], options), result[1], resultSize(result[1], lod0_only))
+		yield result
+	for number in range(number, len(paths)):
+		yield (paths[number], hits.pop(number), None)
+
+class PickledCall:
+	"""Pickles as func(*args), so it is that call that comes out of the pickle."""
+	def __init__(self, func, args):
+		self.func = func
+		self.args = args
+
+	def __reduce__(self):
+		return (self.func, self.args)
+
+def workerFunction(module, name):
+	# module.name as the workers have it: a top level module from the add-on
+	#  folder, imported when the job is unpickled in the worker
+	return PickledCall(getattr, (PickledCall(importlib.import_module, (module,)), name))
+
+class ReaderPool:
+	"""Worker processes started from executable, once there is work for them.
+
+	Functions are given by name and run from the top level copy of module
+	the workers import. The add-on folder only goes on the workers' own
+	sys.path, so they must hand back plain data (builtins and NumPy arrays),
+	never objects of the add-on's classes.
+	"""
+	def __init__(self, processes, executable, module="dae_reader"):
+		self.processes = processes
+		self.executable = executable
+		self.module = module
+		self.pool = None
+		self.probe = None
+		self.failed = False # the pool did not start, see working()
+
+	def start(self):
+		if self.pool is None:
+			addon_dir = os.path.dirname(os.path.abspath(__file__))
+			# Spawn rather than fork - a forked copy of Blender is not safe to run.
+			#  The spawn context is shared, so its executable is always set.
+			context = multiprocessing.get_context("spawn")
+			if self.executable is not None:
+				context.set_executable(self.executable)
+			else:
+				context.set_executable(sys.executable)
+			self.pool = context.Pool(self.processes, site.addsitedir, (addon_dir,))
+			# The first job of a new pool: import module and hand back its name.
+			#  multiprocessing.Pool just starts another worker when one dies, so
+			#  this is how a pool that can never run anything shows up.
+			self.probe = self.pool.apply_async(str, (workerFunction(self.module, "__name__"),))
+		return self.pool
+
+	def working(self, timeout=None):
+		"""Start the pool if need be, and wait for a worker to answer. False if
+		it could not be started, or no worker imported module within timeout
+		seconds (STARTUP_TIMEOUT by default; the executable does not run, say).
+		Once False, it stays False until the pool is terminated."""
+		if timeout is None:
+			timeout = STARTUP_TIMEOUT
+		if self.failed:
+			return False
+		try:
+			self.start()
+			self.failed = self.probe.get(timeout) != self.module
+		except Exception:
+			traceback.print_exc()
+			self.failed = True
+		return not self.failed
+
+	def apply_async(self, name, job):
+		return self.start().apply_async(workerFunction(self.module, name), (job,))
+
+	def terminate(self):
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool = None
+			self.probe = None
+		self.failed = False
+
+class BackgroundReader:
+	"""Runs a readDAEs() on a thread, so its results can be waited for
+	without blocking (Blender's UI, say): check ready() before next().
+	Only one result is kept waiting, so readDAEs() reads no further ahead
+	than it would for the caller itself.
+	"""
+	def __init__(self, results):
+		self.results = queue.Queue(1)
+		self.stopped = threading.Event()
+		self.error = None
+		self.thread = threading.Thread(target=self.run, args=(results,))
+		self.thread.daemon = True
+		self.thread.start()
+
+	def run(self, results):
+		try:
+			for result in results:
+				if not self.put(result):
+					break
+		except Exception:
+			self.error = traceback.format_exc()
+		finally:
+			results.close()
+			self.put(None) # the end
+
+	def put(self, item):
+		# Waits for room, unless the reader has been closed and nobody will
+		#  take it. False if item was dropped.
+		while not self.stopped.is_set():
+			try:
+				self.results.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		try:
+			self.results.put_nowait(item)
+			return True
+		except queue.Full:
+			return False
+
+	def ready(self):
+		return not self.results.empty()
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		result = self.results.get()
+		if result is None:
+			self.results.put(None) # still the end next time
+			if self.error is not None:
+				raise RuntimeError("Reading stopped:\n" + self.error)
+			raise StopIteration
+		return result
+
+	def close(self):
+		# Drops whatever is still to come; a file being read is finished first
+		self.stopped.set()
+
+def readJobs(jobs, executable, processes):
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if processes <= 1 or len(jobs) == 0:
+		for job in jobs:
+			yield readJob(job)
+		return
+
+	if len(jobs) == 1:
+		# One file - read here, with the pool decoding its bigger geometries
+		pool = ReaderPool(processes, executable)
+		try:
+			yield readJob(jobs[0], pool)
+		finally:
+			pool.terminate()
+		return
+
+	pool = ReaderPool(min(processes, len(jobs)), executable)
+	try:
+		if not pool.working():
+			print("!- The reader pool did not start, reading here instead")
+			for job in jobs:
+				yield readJob(job)
+			return
+		# One job per process ahead of the caller, and no more: a file read
+		#  holds all its arrays until the caller is done with it
+		pending = collections.deque()
+		queued = 0
+		while queued < len(jobs) and len(pending) < pool.processes:
+			pending.append((jobs[queued], pool.apply_async("readJobPacked", jobs[queued])))
+			queued = queued + 1
+		while pending:
+			job, result = pending.popleft()
+			try:
+				DAEfullpath, result, error = result.get()
+				if result is not None:
+					result = unpackResult(result[0], result[1], job[2])
+			except Exception:
+				traceback.print_exc()
+				print("!- The reader pool failed on " + job[0] + ", reading it here instead")
+				DAEfullpath, result, error = readJob(job)
+			if queued < len(jobs):
+				pending.append((jobs[queued], pool.apply_async("readJobPacked", jobs[queued])))
+				queued = queued + 1
+			yield (DAEfullpath, result, error)
+	finally:
+		pool.terminate()
@@ -0,0 +1,292 @@
+# DAE scene indexing
+#
+# Everything the importer needs to know about how a DAE hangs together,
+# gathered in one pass: which id is which geometry, material, effect and
+# image, and which node sits under which. Parenting is then a straight run
+# down a list instead of a recursive walk with lookups at every step.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import math
+
+import numpy as np
+
+try:
+	from . import hodor_names
+except (ImportError, SystemError):
+	# a top level module in a reader worker process, see dae_reader.readDAEs()
+	import hodor_names
+
+#############
+#DAE Schemas#
+#############
+
+DAENode = "{http://www.collada.org/2005/11/COLLADASchema}node"
+DAETranslation = "{http://www.collada.org/2005/11/COLLADASchema}translate"
+DAEInstance = "{http://www.collada.org/2005/11/COLLADASchema}instance_geometry"
+
+###########
+#Functions#
+###########
+
+class SceneIndex:
+	"""id -> name lookups for one DAE, filled in as the file streams past."""
+	def __init__(self):
+		self.geometries = {} # <geometry> id -> name of the object made for it
+		self.materials = {} # <material> id -> <effect> id
+		self.effects = {} # <effect> id -> name
+		self.images = {} # <image> id -> texture name
+
+	def materialName(self, symbol):
+		# <triangles material=""> normally holds a <material> id, which points
+		#  at the <effect> the Blender material is named after
+		symbol = symbol.lstrip("#")
+		effect = self.materials.get(symbol)
+		if effect in self.effects:
+			return self.effects[effect]
+		return symbol
+
+class SceneNode:
+	"""One <node> of the visual scene, without its subtree.
+
+	parent and children are indices into the list readNodes() returns.
+	"""
+	def __init__(self, name, parent, location, rotation, geometries):
+		self.name = name
+		self.parent = parent # -1 for a top level node
+		self.children = []
+		self.location = location # [x, y, z]
+		self.rotation = rotation # [x, y, z] in degrees
+		self.geometries = geometries # <instance_geometry> urls, without the "#"
+		self.kind = nodeKind(name, geometries)
+
+def nodeKind(name, geometries):
+	# Nav lights, background lights and MAT[xx]_PARAM[yy] nodes come in as lamps
+	#  and joints with custom properties; anything with geometry is a mesh
+	kind = hodor_names.parseName(name).kind
+	if kind == "NAVL":
+		return "navl"
+	elif kind == "LITE":
+		return "lite"
+	elif kind == "MATPARAM":
+		return "matparam"
+	elif len(geometries) > 0:
+		return "mesh"
+	return "joint"
+
+def readNode(node, parent):
+	# Joint location
+	joint_location = node.find(DAETranslation)
+	if joint_location == None:
+		joint_location = [0.0, 0.0, 0.0] # If there is no translation specified, default to 0,0,0
+	else:
+		joint_location = [float(i) for i in joint_location.text.split()]
+	# Joint rotation
+	joint_rotation = [0.0, 0.0, 0.0] # If there is no rotation specified, default to 0
+	geometries = []
+	for item in node:
+		if "rotate" in item.tag:
+			if "sid" in item.attrib: # sometimes there are "dummy" <rotate> tags with no "sid"... (-pivot, from 3DSMax)
+				if "rotateX" in item.attrib["sid"]:
+					joint_rotation[0] = float(item.text.split()[3])
+				elif "rotateY" in item.attrib["sid"]:
+					joint_rotation[1] = float(item.text.split()[3])
+				elif "rotateZ" in item.attrib["sid"]:
+					joint_rotation[2] = float(item.text.split()[3])
+		elif item.tag == DAEInstance:
+			geometries.append(item.attrib["url"].lstrip("#"))
+	return SceneNode(node.attrib["name"], parent, joint_location, joint_rotation, geometries)
+
+def readNodes(visual_scene):
+	"""Flatten a <visual_scene> into a list of SceneNode.
+
+	The list is in document order, the same order as visual_scene.iter(), so
+	every parent comes before its children.
+	"""
+	nodes = []
+	stack = [(child, -1) for child in reversed(list(visual_scene)) if child.tag == DAENode]
+	while stack:
+		node, parent = stack.pop()
+		index = len(nodes)
+		nodes.append(readNode(node, parent))
+		if parent >= 0:
+			nodes[parent].children.append(index)
+		stack.extend([(child, index) for child in reversed(list(node)) if child.tag == DAENode])
+	return nodes
+
+def unrotatedRoot(visual_scene):
+	"""True if a ROOT_LOD[0] of visual_scene has a rotateX of less than 89
+	degrees, as RODOH writes it - with a Y up axis, the scene then needs
+	turning about X by 90. A ROOT_LOD[0] with no rotateX at all doesn't count.
+	"""
+	for node in visual_scene.iter(DAENode):
+		if "ROOT_LOD[0]" in node.attrib.get("name", ""):
+			for item in node:
+				if "rotate" in item.tag and "rotateX" in item.attrib.get("sid", ""):
+					if float(item.text.split()[3]) < 89:
+						return True
+	return False
+
+def resolveHierarchy(nodes, geometries):
+	"""Work out the parenting for a list of SceneNode in one pass.
+
+	geometries is the <geometry> id -> name map of the meshes that were made.
+	Returns (child, parent) index pairs. Nothing under a light or a
+	MAT[xx]_PARAM[yy] node is parented (those children are HODOR parameters),
+	and neither is anything under a mesh whose geometry was not made.
+	"""
+	linked = [False] * len(nodes)
+	pairs = []
+	for i, node in enumerate(nodes):
+		if node.kind == "mesh" and not hasGeometry(node, geometries):
+			continue
+		if node.parent < 0:
+			linked[i] = node.kind in ("joint", "mesh")
+			continue
+		if not linked[node.parent]:
+			continue
+		pairs.append((i, node.parent))
+		linked[i] = node.kind in ("joint", "mesh")
+	return pairs
+
+def hasGeometry(node, geometries):
+	for url in node.geometries:
+		if url in geometries:
+			return True
+	return False
+
+def subParams(nodes, i):
+	# RODOH writes nav light parameters as children of a "SUB_PARAMS" node under the light
+	params = []
+	for child in nodes[i].children:
+		if "SUB_PARAMS" in nodes[child].name:
+			params.extend([nodes[param].name for param in nodes[child].children])
+	return params
+
+class ImportFilter:
+	"""What to bring in from a DAE.
+
+	lods are the n of the ROOT_LOD[n] to keep (None for all of them);
+	collision is ROOT_COL and its COL[] meshes, goblins the GOBG[] meshes,
+	dock the dock paths (HOLD_DOCK, DOCK[] and their SEG[]) and background
+	the background lights and parameters (HOLD_LITE, LITE[] and MAT[]_PARAM[]).
+	Built from and turned back into a plain tuple with key(), so it can go to
+	the reader's worker processes and into the cache key.
+	"""
+	def __init__(self, lods=None, collision=True, goblins=True, dock=True, background=True):
+		if lods is not None:
+			lods = tuple(sorted(set([int(n) for n in lods])))
+		self.lods = lods
+		self.collision = collision
+		self.goblins = goblins
+		self.dock = dock
+		self.background = background
+
+	def key(self):
+		return (self.lods, self.collision, self.goblins, self.dock, self.background)
+
+	def everything(self):
+		return self.lods is None and self.collision and self.goblins and self.dock and self.background
+
+	def nodeWanted(self, node):
+		# Just this node - filterNodes() takes care of the subtree
+		name = node.name
+		tag = hodor_names.parseName(name)
+		if self.lods is not None and tag.tags and tag.tags[0][0].upper() == "ROOT_LOD":
+			try:
+				if int(tag.tags[0][1]) not in self.lods:
+					return False
+			except ValueError:
+				pass
+		if not self.collision and name.startswith("ROOT_COL"):
+			return False
+		if not self.dock and (tag.kind == "DOCK" or name.startswith("HOLD_DOCK")):
+			return False
+		if not self.background and (node.kind in ("lite", "matparam") or name.startswith("HOLD_LITE")):
+			return False
+		if not self.goblins and name.startswith("GOBG["):
+			return False
+		if node.kind == "mesh":
+			if not self.geometryWanted(name):
+				return False
+			for url in node.geometries:
+				if not self.geometryWanted(url):
+					return False
+		return True
+
+	def geometryWanted(self, name):
+		# By the HODOR name of a <geometry> (or its id, which is usually the same)
+		tag = hodor_names.parseName(name)
+		if not tag.tags:
+			return True
+		first = tag.tags[0][0].upper()
+		if not self.collision and first == "COL":
+			return False
+		if not self.goblins and first == "GOBG":
+			return False
+		if self.lods is not None:
+			for key, value in tag.tags:
+				if key.upper() == "LOD":
+					try:
+						if int(value) not in self.lods:
+							return False
+					except ValueError:
+						pass
+		return True
+
+def filterNodes(nodes, importFilter):
+	"""Drop the nodes importFilter doesn't want, with everything under them.
+
+	Returns a new list of SceneNode, parent and children renumbered.
+	"""
+	if importFilter.everything():
+		return nodes
+	newIndex = [-1] * len(nodes)
+	kept = []
+	for i, node in enumerate(nodes):
+		# parents come first, so a dropped parent is already known
+		if node.parent >= 0 and newIndex[node.parent] < 0:
+			continue
+		if not importFilter.nodeWanted(node):
+			continue
+		newIndex[i] = len(kept)
+		kept.append(node)
+	filtered = []
+	for node in kept:
+		parent = -1
+		if node.parent >= 0:
+			parent = newIndex[node.parent]
+		copy = SceneNode(node.name, parent, node.location, node.rotation, node.geometries)
+		copy.children = [newIndex[c] for c in node.children if newIndex[c] >= 0]
+		filtered.append(copy)
+	return filtered
+
+def eulerMatrix(location, rotation):
+	# 4x4 of a location and an XYZ euler in degrees, as Blender puts them together
+	x, y, z = [math.radians(r) for r in rotation]
+	rx = np.array([[1, 0, 0], [0, math.cos(x), -math.sin(x)], [0, math.sin(x), math.cos(x)]])
+	ry = np.array([[math.cos(y), 0, math.sin(y)], [0, 1, 0], [-math.sin(y), 0, math.cos(y)]])
+	rz = np.array([[math.cos(z), -math.sin(z), 0], [math.sin(z), math.cos(z), 0], [0, 0, 1]])
+	matrix = np.identity(4)
+	matrix[0:3, 0:3] = np.dot(rz, np.dot(ry, rx))
+	matrix[0:3, 3] = location
+	return matrix
+
+def nodeMatrices(nodes, pairs):
+	"""World matrix of the object made for each node, given the (child, parent)
+	pairs of resolveHierarchy().
+
+	The importer makes joints with the node's transform, and meshes
+	untransformed under their parent, so that is what this works out too.
+	"""
+	parents = dict(pairs)
+	world = []
+	for i, node in enumerate(nodes):
+		if node.kind == "mesh":
+			basis = np.identity(4)
+		else:
+			basis = eulerMatrix(node.location, node.rotation)
+		if i in parents:
+			basis = np.dot(world[parents[i]], basis)
+		world.append(basis)
+	return world
@@ -0,0 +1,188 @@
+# Streaming DAE reader
+#
+# ET.parse() keeps the whole document in memory while the scene is built,
+# which for big capital ship DAEs runs to several GB. The reader here hands
+# out one complete subtree at a time (a <geometry>, an <animation>, ...) and
+# throws it away as soon as the caller moves on to the next one.
+#
+# Most of a big DAE is the text of its <float_array>s and <p>s, and even
+# streamed each of those becomes one long Python string before it can be
+# decoded. With raw set, the file is memory mapped instead and the bodies
+# of those elements are cut out of what the XML parser sees; the elements
+# get a RawText in place of their text, which dae_arrays decodes straight
+# from the mapped bytes.
+#
+# elementSpans() finds where each element of a kind sits in the file, so
+# that a worker process can read one (a <geometry>, say) on its own.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import os
+import re
+import mmap
+import collections
+import xml.etree.ElementTree
+
+ET = xml.etree.ElementTree
+
+#############
+#DAE Schemas#
+#############
+
+DAEFloats = "{http://www.collada.org/2005/11/COLLADASchema}float_array"
+DAEp = "{http://www.collada.org/2005/11/COLLADASchema}p"
+
+# The start tags whose bodies the raw scan skips (the same elements as above),
+#  and comments, so a tag written in one isn't taken for the real thing
+RAW_TAGS = re.compile(rb"<!--|<(float_array|p)(?=[\s/>])[^>]*>")
+
+###########
+#Functions#
+###########
+
+class RawText:
+	"""The text of an element the raw scan skipped: a span of the mapped file."""
+	def __init__(self, mapped, start, end):
+		self.mapped = mapped
+		self.start = start
+		self.end = end
+
+	def bytes(self):
+		return self.mapped[self.start:self.end]
+
+	def __str__(self):
+		return self.bytes().decode("utf-8")
+
+class RawScan:
+	"""A file object over a mapped DAE that leaves out the bodies of RAW_TAGS.
+
+	The parser reads the file through read(); the span of each body skipped
+	is queued in spans (None for an empty element), in document order.
+	"""
+	def __init__(self, mapped):
+		self.mapped = mapped
+		self.pos = 0
+		self.spans = collections.deque()
+		self.next = RAW_TAGS.search(mapped, 0) # the next start tag, found once
+
+	def read(self, size=-1):
+		start = self.pos
+		if self.next is None or (size >= 0 and self.next.start() >= start + size):
+			end = len(self.mapped) if size < 0 else min(start + size, len(self.mapped))
+			self.pos = end
+			return self.mapped[start:end]
+		# Up to the end of the start tag, then carry on from the end of the body
+		tagEnd = self.next.end()
+		if self.next.group(1) is None:
+			# A comment, passed on whole
+			tagEnd = self.mapped.find(b"-->", tagEnd)
+			tagEnd = len(self.mapped) if tagEnd < 0 else tagEnd + 3
+			self.pos = tagEnd
+		elif self.mapped[tagEnd - 2:tagEnd] == b"/>":
+			self.spans.append(None)
+			self.pos = tagEnd
+		else:
+			# Text can't hold a "<", so the body runs up to the next one
+			bodyEnd = self.mapped.find(b"<", tagEnd)
+			if bodyEnd < 0:
+				bodyEnd = len(self.mapped)
+			self.spans.append((tagEnd, bodyEnd) if bodyEnd > tagEnd else None)
+			self.pos = bodyEnd
+		self.next = RAW_TAGS.search(self.mapped, self.pos)
+		return self.mapped[start:tagEnd]
+
+def elementSpans(DAEfullpath, name):
+	"""Find the elements called name (which must not nest) in a DAE.
+
+	Returns (root, spans): root is the <COLLADA> start tag, with the
+	namespaces it declares, and spans the (start, end) byte offsets of each
+	element, in document order. Elements inside comments are not counted.
+	"""
+	pattern = re.compile(rb"<!--|<COLLADA(?=[\s>])[^>]*>|<(/?)" + name.encode("ascii") + rb"(?=[\s/>])[^>]*>")
+	root = b"<COLLADA>"
+	spans = []
+	start = None
+	if os.path.getsize(DAEfullpath) == 0:
+		return root, spans
+	with open(DAEfullpath, "rb") as f:
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			pos = 0
+			match = pattern.search(mapped, pos)
+			while match is not None:
+				pos = match.end()
+				tag = match.group(0)
+				if tag == b"<!--":
+					pos = mapped.find(b"-->", pos)
+					if pos < 0:
+						break
+				elif tag.startswith(b"<COLLADA"):
+					root = tag
+				elif match.group(1):
+					if start is not None:
+						spans.append((start, match.end()))
+					start = None
+				elif tag.endswith(b"/>"):
+					spans.append((match.start(), match.end()))
+				else:
+					start = match.start()
+				match = pattern.search(mapped, pos)
+		finally:
+			mapped.close()
+	return root, spans
+
+def readElement(DAEfullpath, root, span):
+	"""Parse the element at span (from elementSpans()) on its own, under root."""
+	with open(DAEfullpath, "rb") as f:
+		f.seek(span[0])
+		data = f.read(span[1] - span[0])
+	return ET.fromstring(root + data + b"</COLLADA>")[0]
+
+def iterDAE(DAEfullpath, tags, keep=(), raw=False, under={}):
+	"""Yield (tag, element) for each element of DAEfullpath whose tag is in tags.
+
+	under maps a tag to the tag of the parent it must have to be yielded
+	(an <image> of <library_images>, not one inside an effect's profile).
+	Elements are yielded once they have been read completely. Unless the tag
+	is also in keep, the element is cleared and unlinked from its parent when
+	the caller asks for the next one, so the caller must take what it needs
+	from it before moving on. Library level elements that were not asked for
+	are dropped as soon as they end.
+	With raw, <float_array> and <p> elements have a RawText for their text
+	(see RawScan), which is only good until the iteration ends.
+	"""
+	if not raw or os.path.getsize(DAEfullpath) == 0:
+		for item in iterElements(ET.iterparse(DAEfullpath, events=("start", "end")), tags, keep, None, under):
+			yield item
+		return
+	with open(DAEfullpath, "rb") as f:
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			scan = RawScan(mapped)
+			for item in iterElements(ET.iterparse(scan, events=("start", "end")), tags, keep, scan, under):
+				yield item
+		finally:
+			mapped.close()
+
+def iterElements(events, tags, keep, scan, under):
+	stack = []
+	for event, elem in events:
+		if event == "start":
+			stack.append(elem)
+			continue
+		stack.pop()
+		if scan is not None and (elem.tag == DAEFloats or elem.tag == DAEp):
+			# Its body was cut out by the scan - the spans come in the same order
+			span = scan.spans.popleft()
+			if span is not None and elem.text is None:
+				elem.text = RawText(scan.mapped, span[0], span[1])
+		if elem.tag in tags and (elem.tag not in under or (stack and stack[-1].tag == under[elem.tag])):
+			yield elem.tag, elem
+			if elem.tag not in keep:
+				elem.clear()
+				if stack:
+					stack[-1].remove(elem)
+		elif len(stack) == 1:
+			# A direct child of <COLLADA> (library_xxx, asset, scene) - anything
+			#  wanted out of it has already been handed out
+			elem.clear()
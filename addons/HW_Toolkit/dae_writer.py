@@ -0,0 +1,140 @@
+# Streaming XML writer
+#
+# The exporter used to build the whole COLLADA document as an ElementTree,
+# indent it with prettify() and only then write it out, so every array of
+# every mesh was held as a string until the end. XMLWriter writes each
+# element as soon as it is given, indented the way prettify() did it.
+# Library sections that are filled in while the scene is walked (geometry,
+# animation, ...) go to a Spool each, a temporary file that is copied into
+# place once the sections before it are written.
+#
+# Attributes are written in sorted order, as ElementTree did in the Python
+# Blender ships with, so the output is the same as before.
+#
+# numberChunks() turns NumPy arrays into the text of <float_array> and <p>
+# a chunk at a time, with one % format per chunk rather than one str() per
+# number, either losslessly or rounded to a number of significant digits.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import shutil
+import tempfile
+
+import numpy as np
+
+NUMBER_CHUNK = 16384 # numbers formatted at a time by numberChunks()
+
+###########
+#Functions#
+###########
+
+def escapeText(text):
+	return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def escapeAttrib(value):
+	return escapeText(value).replace("\"", "&quot;").replace("\n", "&#10;")
+
+def attribText(attrib):
+	return "".join([" " + key + "=\"" + escapeAttrib(str(value)) + "\"" for key, value in sorted(attrib.items())])
+
+def numberFormat(dtype, digits=0):
+	"""The % format that writes one number of dtype.
+
+	With digits 0 floats are written so they read back exactly: 9
+	significant digits are enough for a float32, a float64 needs repr().
+	"""
+	if dtype.kind in "iub":
+		return "%d"
+	if digits > 0:
+		return "%." + str(digits) + "g"
+	if dtype.itemsize <= 4:
+		return "%.9g"
+	return "%r"
+
+def numberChunks(values, digits=0):
+	"""Yields the numbers of values, any NumPy array, as space separated text."""
+	values = np.asarray(values).ravel()
+	fmt = numberFormat(values.dtype, digits)
+	fullChunk = " ".join([fmt] * NUMBER_CHUNK)
+	for start in range(0, len(values), NUMBER_CHUNK):
+		chunk = values[start:start + NUMBER_CHUNK].tolist()
+		text = (fullChunk if len(chunk) == NUMBER_CHUNK else " ".join([fmt] * len(chunk))) % tuple(chunk)
+		yield text if start == 0 else " " + text
+
+class XMLWriter:
+	"""Writes elements to the text file f as they come, depth levels in.
+
+	start() and end() bracket an element with children; element() writes one
+	with only text. An element that gets no children or text is closed as
+	<tag ... />.
+	"""
+	def __init__(self, f, depth=0, indent="  "):
+		self.f = f
+		self.depth = depth
+		self.indent = indent
+		self.stack = []
+		self.open = False # the last start tag still needs its ">"
+
+	def declaration(self):
+		self.f.write("<?xml version='1.0' encoding='utf-8'?>\n")
+
+	def close(self):
+		if self.open:
+			self.f.write(">\n")
+			self.open = False
+
+	def start(self, tag, **attrib):
+		self.close()
+		self.f.write(self.indent * (self.depth + len(self.stack)) + "<" + tag + attribText(attrib))
+		self.stack.append(tag)
+		self.open = True
+
+	def end(self):
+		tag = self.stack.pop()
+		if self.open:
+			self.f.write(" />\n")
+			self.open = False
+		else:
+			self.f.write(self.indent * (self.depth + len(self.stack)) + "</" + tag + ">\n")
+
+	def element(self, tag, text=None, **attrib):
+		self.close()
+		line = self.indent * (self.depth + len(self.stack)) + "<" + tag + attribText(attrib)
+		if not text:
+			self.f.write(line + " />\n")
+		else:
+			self.f.write(line + ">" + escapeText(text) + "</" + tag + ">\n")
+
+	def array(self, tag, chunks, **attrib):
+		# An element whose text is written a piece at a time; chunks are
+		#  already fit for XML (numbers, names). No chunks closes it as <tag ... />
+		self.close()
+		line = self.indent * (self.depth + len(self.stack)) + "<" + tag + attribText(attrib)
+		empty = True
+		for chunk in chunks:
+			if empty:
+				self.f.write(line + ">")
+				empty = False
+			self.f.write(chunk)
+		if empty:
+			self.f.write(line + " />\n")
+		else:
+			self.f.write("</" + tag + ">\n")
+
+	def copy(self, spool):
+		# Writes out what was written to spool, as children of the current element
+		if spool.size() > 0:
+			self.close()
+			spool.f.seek(0)
+			shutil.copyfileobj(spool.f, self.f)
+
+class Spool(XMLWriter):
+	"""An XMLWriter to a temporary file, for a section written out of order."""
+	def __init__(self, depth):
+		XMLWriter.__init__(self, tempfile.TemporaryFile("w+", encoding="utf-8", newline="\n"), depth)
+
+	def size(self):
+		return self.f.tell()
+
+	def discard(self):
+		self.f.close()
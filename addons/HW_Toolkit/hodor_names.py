@@ -0,0 +1,72 @@
+# HODOR joint name codec
+#
+# HODOR keeps joint parameters in the node name itself, as a run of
+# Key[value] tags joined with "_", e.g.
+#
+#   NAVL[Light1]_Type[default]_Sz[1.5]_Ph[0]_Fr[1]_Col[1,0,0]_Dist[100]
+#   DOCK[Path1]_Fam[Fighter]_Link[Path2]_Flags[Exit]_MAD[2]
+#   SEG[0]_Tol[10]_Spd[50]_Flags[UseRot]
+#   MAT[Hull]_PARAM[Glow]_Type[RGBA]_Data[1,0,0,1]
+#
+# parseName() splits a name into a HodorTag and buildName() puts one back
+# together. The importer and the exporter both go through here.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import functools
+import re
+
+# A tag is a key, which may itself contain "_" (ROOT_LOD[0]), then [value].
+#  Each tag starts the name or follows a "_".
+TAG_RE = re.compile(r"(?:^|_)([^\[\]]+?)\[([^\]]*)\]")
+
+class HodorTag:
+	"""A HODOR node name split into its tags.
+
+	kind is "NAVL", "LITE", "MATPARAM", "DOCK", "SEG" or "JOINT" for anything
+	else. name is the name without its parameters ("NAVL[Light1]",
+	"SEG[0]", "MAT[Hull]_PARAM[Glow]_Type[RGBA]"), params the remaining
+	(key, value) pairs in name order and tags every (key, value) pair. A
+	JOINT keeps its whole name.
+	parseName() hands out shared instances, so treat them as read only.
+	"""
+	def __init__(self, kind, name, params, tags):
+		self.kind = kind
+		self.name = name
+		self.params = params
+		self.tags = tags
+
+	def get(self, key, default=None):
+		# keys are matched without case - DAEs from different tools disagree
+		key = key.lower()
+		for k, v in self.params:
+			if k.lower() == key:
+				return v
+		return default
+
+def buildName(name, params):
+	"""Append (key, value) params to name as HODOR tags."""
+	return name + "".join(["_" + key + "[" + str(value) + "]" for key, value in params])
+
+@functools.lru_cache(maxsize=4096)
+def parseName(name):
+	"""Split a node name into a HodorTag."""
+	tags = tuple((m.group(1), m.group(2)) for m in TAG_RE.finditer(name))
+	if len(tags) == 0:
+		return HodorTag("JOINT", name, (), ())
+
+	first = tags[0][0].upper()
+	keys = [key.upper() for key, value in tags]
+	if first in ("NAVL", "LITE", "DOCK", "SEG"):
+		kind = first
+		name = buildName("", tags[0:1])[1:]
+		params = tags[1:]
+	elif first == "MAT" and "PARAM" in keys:
+		# Only the Data[] goes into custom properties, the rest stays in the name
+		kind = "MATPARAM"
+		name = buildName("", [t for t in tags if t[0].upper() != "DATA"])[1:]
+		params = tuple(t for t in tags if t[0].upper() == "DATA")
+	else:
+		kind = "JOINT"
+		params = tags[1:]
+	return HodorTag(kind, name, params, tags)
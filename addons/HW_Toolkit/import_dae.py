@@ -17,11 +17,23 @@
 #
 
 import os
+import time
+import collections
 import xml.etree.ElementTree
 import math
+import numpy as np
 import mathutils
 import bpy
 
+from . import dae_arrays
+from . import dae_anims
+from . import dae_reader
+from . import dae_cache
+from . import texture_index
+from . import texture_decode
+from . import dae_scene
+from . import hodor_names
+
 ET = xml.etree.ElementTree
 
 ###############################################################################
@@ -88,10 +100,12 @@ DAEInput = "{http://www.collada.org/2005/11/COLLADASchema}input"
 DAEFloats = "{http://www.collada.org/2005/11/COLLADASchema}float_array"
 DAESource = "{http://www.collada.org/2005/11/COLLADASchema}source"
 DAEInstance = "{http://www.collada.org/2005/11/COLLADASchema}instance_geometry"
+DAEVisualScene = "{http://www.collada.org/2005/11/COLLADASchema}visual_scene"
 
 #Material Schemas
 DAELibMaterials = "{http://www.collada.org/2005/11/COLLADASchema}library_materials"
 DAEMaterials = "{http://www.collada.org/2005/11/COLLADASchema}material"
+DAEInstanceEffect = "{http://www.collada.org/2005/11/COLLADASchema}instance_effect"
 DAELibEffects = "{http://www.collada.org/2005/11/COLLADASchema}library_effects"
 DAEfx = "{http://www.collada.org/2005/11/COLLADASchema}effect"
 DAELibImages = "{http://www.collada.org/2005/11/COLLADASchema}library_images"
@@ -118,662 +132,653 @@ DAEChannel = "{http://www.collada.org/2005/11/COLLADASchema}channel"
 #Functions#
 ###########
 
-def makeTextures(name, DAEPath, path):
+# Images loaded this session, normcased file path -> image name, so a texture
+#  sheet shared by a whole fleet is only read once
+loadedImages = {}
+
+# Makes the half size proxies in worker processes, see texture_decode.py
+proxyDecoder = texture_decode.ProxyDecoder(dae_reader.ReaderPool(4, bpy.app.binary_path_python, "texture_decode"))
+
+# What an import goes through, in order - see ImportDAEFilesSteps()
+PHASES = ("reading", "textures", "joints", "meshes", "hierarchy", "animation", "cleanup")
+
+# Datablocks made by the import so far, bpy.data collection name -> as_pointer()s,
+#  so the ones that end up with no users can be purged, see PurgeImported()
+importedData = {}
+
+# The order they are purged in: a mesh going can leave its materials unused,
+#  a material its texture and a texture its image, so one pass gets them all
+PURGE_ORDER = ("meshes", "lamps", "actions", "materials", "textures", "images")
+
+# What a finished import purges: the data of the objects it deleted again and
+#  the images it swapped out. Materials (and their textures) the DAE defines
+#  are kept even if no mesh uses them, for re-export.
+ORPHAN_KINDS = ("meshes", "lamps", "actions", "images")
+
+def untrack(kind, block):
+	# block is going, so its pointer can't be taken for something made later
+	importedData.get(kind, set()).discard(block.as_pointer())
+
+def track(kind, block):
+	# Notes block (from bpy.data.<kind>) as made by the import, and returns it
+	importedData.setdefault(kind, set()).add(block.as_pointer())
+	return block
+
+def dataSize(kind, block):
+	# Roughly how many bytes block holds - Blender doesn't say, so this goes by
+	#  the size of its vertices, loops, pixels and keys
+	if kind == "meshes":
+		loops = len(block.loops)
+		size = len(block.vertices) * 20 + len(block.edges) * 12 + loops * 8 + len(block.polygons) * 12
+		return size + len(block.uv_layers) * loops * 12
+	elif kind == "images":
+		if not block.has_data:
+			return 0
+		return block.size[0] * block.size[1] * block.channels * (4 if block.is_float else 1)
+	elif kind == "actions":
+		return sum([len(fcurve.keyframe_points) for fcurve in block.fcurves]) * 72
+	return 0
+
+def PurgeImported(kinds=ORPHAN_KINDS):
+	# Removes whatever of kinds the import made that nothing uses in the end
+	#  (meshes and lamps of deleted objects, images that were swapped out...)
+	#  instead of leaving it in memory until the .blend is saved and opened
+	#  again. Returns (datablocks removed, roughly the bytes they held).
+	count = 0
+	size = 0
+	for kind in PURGE_ORDER:
+		if kind not in kinds:
+			continue
+		pointers = importedData.get(kind, set())
+		collection = getattr(bpy.data, kind)
+		for block in [b for b in collection if b.users == 0 and b.as_pointer() in pointers]:
+			print("Purging unused " + kind + " " + block.name)
+			size = size + dataSize(kind, block)
+			collection.remove(block)
+			count = count + 1
+	importedData.clear()
+	return count, size
+
+def RollbackImported(scene):
+	# Takes out everything the import has made so far (a cancelled import),
+	#  objects first so their data is left with no users, then every kind of
+	#  datablock. Returns what PurgeImported() does.
+	pointers = importedData.pop("objects", set())
+	RemoveObjects([ob for ob in bpy.data.objects if ob.as_pointer() in pointers], scene)
+	return PurgeImported(PURGE_ORDER)
+
+def imageFilePath(image):
+	if texture_decode.PROXY_PROP in image:
+		return image[texture_decode.PROXY_PROP]
+	return bpy.path.abspath(image.filepath)
+
+def findImage(image_path):
+	# The image already loaded (full size or proxy) for image_path, or None
+	key = os.path.normcase(os.path.abspath(image_path))
+	image = bpy.data.images.get(loadedImages.get(key, ""))
+	if image is not None and os.path.normcase(os.path.abspath(imageFilePath(image))) == key:
+		print("Image already loaded: " + image.name)
+		return image
+	return None
+
+def loadImage(image_path, name, proxy_path=None):
+	# name is only used if the file has not been loaded yet
+	image = findImage(image_path)
+	if image is not None:
+		return image
+	if proxy_path is not None:
+		image = track("images", bpy.data.images.load(proxy_path))
+		image[texture_decode.PROXY_PROP] = image_path
+	else:
+		image = track("images", bpy.data.images.load(image_path))
+	image.name = name
+	loadedImages[os.path.normcase(os.path.abspath(image_path))] = image.name
+	return image
+
+def loadFullSizeImages(images=None):
+	# Swaps proxies (all of them, or those in images) for their full size images
+	if images is None:
+		images = bpy.data.images
+	for image in images:
+		if texture_decode.PROXY_PROP in image:
+			print("Loading full size " + image[texture_decode.PROXY_PROP])
+			image.filepath = image[texture_decode.PROXY_PROP]
+			del image[texture_decode.PROXY_PROP]
+			image.reload()
+
+@bpy.app.handlers.persistent
+def loadFullSizeOnRender(scene):
+	loadFullSizeImages()
+
+@bpy.app.handlers.persistent
+def loadFullSizeIfProxyGone(dummy):
+	# A .blend saved with proxies still points at them; if they have been
+	#  cleared from the cache since, go back to the full size images
+	loadFullSizeImages([image for image in bpy.data.images if texture_decode.PROXY_PROP in image and not os.path.isfile(bpy.path.abspath(image.filepath))])
+
+def makeTextures(name, DAEPath, path, pending=None):
+	# Returns the name of the texture made (or reused) for this <image>.
+	#  Given a pending list, a new image is not loaded here: a proxy is started
+	#  in the background and finishTextures() loads it once the build is done.
 	name = name.rstrip("-image")
-	# Sort out the image path (it could be absolute, local or relative)
+	# Sort out the image path (it could be absolute, local, relative or a file:// URL, in any case)
 	print("makeTextures()")
 	print("************************************************")
-	DAEPath = DAEPath + "/"
-	print(DAEPath)
 	print("Image path from DAE file:")
 	print(path)
-	if "\\" in DAEPath:
-		print("Found \\ in DAEPath!")
-		DAEPath = DAEPath.replace("\\","/")
-	if "\\" in path:
-		print("Found \\ in path!")
-		path = path.replace("\\","/")
-		print(path)
-	if "/" in path:
-		if ".." in path:
-			print("This is a relative path...")
-			DAEPath_elements = DAEPath.split("/")
-			print(DAEPath_elements)
-			del DAEPath_elements[-1]
-			print(DAEPath_elements)
-			path_elements = path.split("/")
-			print(path_elements)
-			for i in path_elements:
-				if i == "..":
-					del DAEPath_elements[-1]
-			image_path = ""
-			print("Building full path...")
-			print("-----------")
-			for j in DAEPath_elements:
-				image_path = image_path + j + "/"
-				print(image_path)
-			for k in path_elements:
-				if k != ".." and k != ".":
-					print(image_path)
-					print(len(image_path))
-					if image_path[len(image_path)-1] != "/":
-						image_path = image_path + "/" + k
-					else:
-						image_path = image_path + k
-					print(image_path)
-			print("-----------")
-		else:
-			if path.startswith("./"):
-				print("This is a local path with ./")
-				image_path = DAEPath + path[2:]
-			else:
-				print("This is an absolute path")
-				image_path = path
-	else:
-		print("This is a file name only")
-		image_path = DAEPath + "/" + path
-	
-	# Now we have an image path ready to load
+	image_path, found = texture_index.resolveImagePath(DAEPath, path)
 	print("Processed image path:")
 	print(image_path)
 	
-	# But sometimes it is not the DIFF (e.g. Kad_Swarmer)...
-	# So correct the image file name
-	if "DIFF" not in image_path:
-		print("switching file name to DIFF...")
-		image_path = image_path[0:len(image_path)-8] + "DIFF" + ".tga"
-		print(image_path)
 	print(name)
 	# And correct the image name (IMG[xxx_DIFF]_FMT[...)
 	if "DIFF" not in name:
 		print("switching image name to DIFF...")
-		# This is a lazy way of doing it, but it works - may no longer be necessary (Dom2 28-NOV-2016)
-		name = name.replace("_DIFX]","_DIFF]")
-		name = name.replace("_GLOW]","_DIFF]")
-		name = name.replace("_GLOX]","_DIFF]")
-		name = name.replace("_NORM]","_DIFF]")
-		name = name.replace("_PAIN]","_DIFF]")
-		name = name.replace("_REFL]","_DIFF]")
-		name = name.replace("_REFX]","_DIFF]")
-		name = name.replace("_SPEC]","_DIFF]")
-		name = name.replace("_SPEX]","_DIFF]")
-		name = name.replace("_STRP]","_DIFF]")
-		name = name.replace("_TEAM]","_DIFF]")
+		name = texture_index.diffName(name)
 		print(name)
-	# Now get the image
-	bpy.data.textures.new(name, 'IMAGE')	
-	bpy.data.textures[name].image = bpy.data.images.load(image_path)
-	image_file_name = image_path.split("/")[len(image_path.split("/"))-1]
-	print(image_file_name)
-	bpy.data.images[image_file_name].name = name
-	print("************************************************")
 	
+	# Now get the image - one image per file, however many DAEs use it
+	image = None
+	if not found:
+		print("!- makeTextures() could not find " + image_path)
+	elif pending is None:
+		image = loadImage(image_path, name)
+	else:
+		image = findImage(image_path)
+		if image is None:
+			proxyDecoder.request(image_path)
+	
+	texture = bpy.data.textures.get(name)
+	if texture is None or texture.type != 'IMAGE' or (texture.image is not None and texture.image != image):
+		texture = track("textures", bpy.data.textures.new(name, 'IMAGE'))
+	texture.image = image
+	if found and image is None:
+		pending.append((texture.name, image_path, name))
+	print("************************************************")
+	return texture.name
+
+def finishTextures(pending):
+	# Loads the proxies makeTextures() started; files that got no proxy (not
+	#  a TGA, or unreadable) are loaded full size
+	for texture_name, image_path, name in pending:
+		proxy_path = proxyDecoder.result(image_path)
+		bpy.data.textures[texture_name].image = loadImage(image_path, name, proxy_path)
+	proxyDecoder.forget()
+
 def makeMaterials(name, textures):
-	bpy.data.materials.new(name)
+	# The material may already be there if a <geometry> asked for it first,
+	#  or from another DAE using the same material
+	mat = getMaterial(name)
 	if len(textures) > 0:	
-		bpy.data.materials[name].specular_shader = 'PHONG'
-		bpy.data.materials[name].texture_slots.add()
+		mat.specular_shader = 'PHONG'
 		texture_name = textures[0]
 		if "_DIFF" not in texture_name:
 			print("!- makeMaterials() could not find '_DIFF' in texture_name: " + texture_name)
-			texture_name = texture_name.replace("_DIFX]","_DIFF]")
-			texture_name = texture_name.replace("_GLOW]","_DIFF]")
-			texture_name = texture_name.replace("_GLOX]","_DIFF]")
-			texture_name = texture_name.replace("_NORM]","_DIFF]")
-			texture_name = texture_name.replace("_PAIN]","_DIFF]")
-			texture_name = texture_name.replace("_REFL]","_DIFF]")
-			texture_name = texture_name.replace("_REFX]","_DIFF]")
-			texture_name = texture_name.replace("_SPEC]","_DIFF]")
-			texture_name = texture_name.replace("_SPEX]","_DIFF]")
-			texture_name = texture_name.replace("_STRP]","_DIFF]")
-			texture_name = texture_name.replace("_TEAM]","_DIFF]")
+			texture_name = texture_index.diffName(texture_name)
 			print("!- makeMaterials() tried to fix it, now using: " + texture_name)
-		bpy.data.materials[name].texture_slots[0].texture = bpy.data.textures[texture_name]
+		if mat.texture_slots[0] is None:
+			mat.texture_slots.add()
+		mat.texture_slots[0].texture = bpy.data.textures[texture_name]
 	else:
 		print("!- makeMaterials() was given an empty list of textures for mat " + name)
 
-def meshBuilder(matName, Verts, Normals, UVCoords, vertOffset, normOffset, UVoffsets, pArray, smooth):
-	print("meshBuilder() - Building "+matName)
-	print(UVoffsets)
-	subMesh = bpy.data.meshes.new(matName)
-	ob = bpy.data.objects.new(subMesh.name, subMesh)
-	
-	#split <p> array to get just the face data
-	faceIndices = []
-	for i in range(0, len(pArray)):
-		faceIndices.append(pArray[i][vertOffset])
-	faceTris = [faceIndices[i:i+3] for i in range(0,len(faceIndices),3)]
-	subMesh.from_pydata(Verts,[],faceTris)
-	if matName is not "None":
-		print("meshBuilder() - appending material '" + matName + "' to submesh '" + subMesh.name + "'")
-		subMesh.materials.append(bpy.data.materials[matName.lstrip("#")])
-	
-	if smooth:
-		normIndices = []
-		for i in range(0, len(pArray)):
-			this_norm_index = mathutils.Vector(Normals[pArray[i][normOffset]])
-			normIndices.append(this_norm_index) # This line causes problems for some DAEs, not yet traced why (Dom2 28-NOV-2016)
-		
-		print("Splitting normals...")
-		subMesh.normals_split_custom_set(normIndices)
+def getMaterial(name):
+	# <geometry> can come before <effect> in the stream, so make the material
+	#  now and let makeMaterials() fill it in when its effect turns up
+	mat = bpy.data.materials.get(name)
+	if mat is None:
+		mat = track("materials", bpy.data.materials.new(name))
+	return mat
+
+def meshBuilder(meshName, meshData, smooth):
+	print("meshBuilder() - Building "+meshName)
+	mesh = track("meshes", bpy.data.meshes.new(meshName))
+	if meshData is None:
+		return mesh
+	
+	#fill the mesh in bulk - one polygon per triangle, every <triangles> set in one go
+	# (builds the same mesh as from_pydata(), without going through Python lists)
+	numLoops = len(meshData.loopVerts)
+	numTris = numLoops // 3
+	mesh.vertices.add(len(meshData.positions))
+	mesh.vertices.foreach_set("co", np.ascontiguousarray(meshData.positions, np.float32).ravel())
+	mesh.loops.add(numLoops)
+	mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(meshData.loopVerts, np.int32))
+	mesh.polygons.add(numTris)
+	mesh.polygons.foreach_set("loop_start", np.arange(0, numLoops, 3, dtype=np.int32))
+	mesh.polygons.foreach_set("loop_total", np.full(numTris, 3, np.int32))
+	mesh.polygons.foreach_set("material_index", np.ascontiguousarray(meshData.triMaterials, np.int32))
+	mesh.update(calc_edges=True)
+	for matName in meshData.materials:
+		print("meshBuilder() - appending material '" + matName + "' to mesh '" + mesh.name + "'")
+		mesh.materials.append(getMaterial(matName.lstrip("#")))
+	
 	print("Smoothing mesh...")
-	subMesh.use_auto_smooth = True
+	mesh.use_auto_smooth = True
+	if smooth and meshData.loopNormals is not None:
+		# Unit length, no NaNs or zeros (see dae_arrays.splitNormals()) and
+		#  one per vertex where they can be
+		print("Splitting normals...")
+		normals, perVertex = dae_arrays.splitNormals(meshData)
+		if perVertex:
+			mesh.normals_split_custom_set_from_vertices(normals.tolist())
+		else:
+			mesh.normals_split_custom_set(normals.tolist())
 	
 	print("Adding UVs...")
 	#Add UVs
-	if len(UVCoords) > 0:
-		for coords in range(0,len(UVoffsets)):
-			subMesh.uv_textures.new()
-	
-			meshUV = []
-			for p in range(0, len(pArray)):
-				meshUV.append(UVCoords[coords][pArray[p][UVoffsets[coords]]])
-	
-			for l in range(0,len(subMesh.uv_layers[coords].data)):
-				subMesh.uv_layers[coords].data[l].uv = meshUV[l]
+	for coords in range(0,len(meshData.loopUVs)):
+		mesh.uv_textures.new()
+		mesh.uv_layers[coords].data.foreach_set("uv", np.ascontiguousarray(meshData.loopUVs[coords], np.float32).ravel())
 	
-	print("Linking objects...")
-	bpy.context.scene.objects.link(ob)
-	
-	return ob
+	return mesh
+
+def SetNavLightParams(this_lamp, params):
+	# params are HODOR (key, value) tags, from the nav light's name or its SUB_PARAMS
+	for key, value in params:
+		print(key + "[" + value + "]")
+		key = key.lower()
+		if key == 'sz':
+			this_lamp.energy = float(value)
+		elif key == 'ph':
+			this_lamp["Phase"] = float(value)
+		elif key == 'fr':
+			this_lamp["Freq"] = float(value)
+		elif key == 'col':
+			rgb = value.split(',')
+			this_lamp.color[0] = float(rgb[0])
+			this_lamp.color[1] = float(rgb[1])
+			this_lamp.color[2] = float(rgb[2])
+		elif key == 'dist':
+			this_lamp.distance = float(value)
+		elif key == 'flags':
+			this_lamp["Flags"] = value
+		elif key == 'type':
+			this_lamp["Type"] = value
 
 #If it ain't broke don't fix it. This function written by Dom2
 def CreateJoint(jnt_name,jnt_locn,jnt_rotn,jnt_context, dock_seg_type):
 	
-	if 'navl' in jnt_name.lower(): # nav lights are treated in a special way, they are made into lamps with custom parameters
-		navl_name = "NAVL[" + jnt_name.split("]")[0].split("[")[1] + "]"
+	tag = hodor_names.parseName(jnt_name)
+	
+	if tag.kind == "NAVL": # nav lights are treated in a special way, they are made into lamps with custom parameters
+		navl_name = tag.name
 		print("Creating nav light " + navl_name)
-		this_lamp = bpy.data.lamps.new(navl_name,'POINT')
+		this_lamp = track("lamps", bpy.data.lamps.new(navl_name,'POINT'))
 		
-		this_jnt = bpy.data.objects.new(navl_name,this_lamp)
-		jnt_context.scene.objects.link(this_jnt)
-		pi = math.pi
-		this_jnt.rotation_euler.x = jnt_rotn[0]*(pi/180.0)
-		this_jnt.rotation_euler.y = jnt_rotn[1]*(pi/180.0)
-		this_jnt.rotation_euler.z = jnt_rotn[2]*(pi/180.0)
-		this_jnt.location.x = float(jnt_locn[0])
-		this_jnt.location.y = float(jnt_locn[1])
-		this_jnt.location.z = float(jnt_locn[2])
+		this_jnt = track("objects", bpy.data.objects.new(navl_name,this_lamp))
 		
 		this_lamp["name"] = navl_name
-		lampProps = jnt_name.split("]_")
 		
-		if 'type' not in jnt_name.lower():
+		if tag.get("Type") is None:
 			this_lamp["Type"] = 'default'
-		for p in lampProps:
-			p = p + "]"
-			print(p)
-			if p.split("[")[0].lower() == 'sz':
-				this_lamp.energy = float(p[3:].rstrip("]").split("]")[0])
-			elif p.split("[")[0].lower() == 'ph':
-				this_lamp["Phase"] = float(p[3:].rstrip("]").split("]")[0])
-			elif p.split("[")[0].lower() == 'fr':
-				this_lamp["Freq"] = float(p[3:].rstrip("]").split("]")[0])
-			elif p.split("[")[0].lower() == 'col':
-				rgb = p[4:].rstrip("]").split("]")[0].split(',')
-				this_lamp.color[0] = float(rgb[0])
-				this_lamp.color[1] = float(rgb[1])
-				this_lamp.color[2] = float(rgb[2])
-			elif p.split("[")[0].lower() == 'dist':
-				this_lamp.distance = float(p[5:].rstrip("]").split("]")[0])
-			elif p.split("[")[0].lower() == 'flags':
-				this_lamp["Flags"] = p[6:].rstrip("]").split("]")[0]
-			elif p.split("[")[0].lower() == 'type':
-				this_lamp["Type"] = p[5:].rstrip("]").split("]")[0]
-		print("-------------------------------------------")
-	elif 'lite[' in jnt_name.lower(): # background lights are treated in a special way, they are made into lamps with custom parameters
-		lite_name = "LITE[" + jnt_name.split("]")[0].split("[")[1] + "]"
+		SetNavLightParams(this_lamp, tag.params)
+	elif tag.kind == "LITE": # background lights are treated in a special way, they are made into lamps with custom parameters
+		lite_name = tag.name
 		print("Creating lite " + lite_name)
-		this_lamp = bpy.data.lamps.new(lite_name,'POINT')
+		this_lamp = track("lamps", bpy.data.lamps.new(lite_name,'POINT'))
 		
-		this_jnt = bpy.data.objects.new(lite_name,this_lamp)
-		jnt_context.scene.objects.link(this_jnt)
-		pi = math.pi
-		this_jnt.rotation_euler.x = jnt_rotn[0]*(pi/180.0)
-		this_jnt.rotation_euler.y = jnt_rotn[1]*(pi/180.0)
-		this_jnt.rotation_euler.z = jnt_rotn[2]*(pi/180.0)
-		this_jnt.location.x = float(jnt_locn[0])
-		this_jnt.location.y = float(jnt_locn[1])
-		this_jnt.location.z = float(jnt_locn[2])
+		this_jnt = track("objects", bpy.data.objects.new(lite_name,this_lamp))
 		
 		this_lamp["name"] = lite_name # used later on when parenting...
-		lampProps = jnt_name.split("]_")
 		
-		for p in lampProps:
-			p = p + "]"
-			print(p)
-			if p.split("[")[0].lower() == 'type':
-				this_lamp["Type"] = p[5:].rstrip("]").split("]")[0]
-			elif p.split("[")[0].lower() == 'diff':
-				rgb = p[5:].rstrip("]").split("]")[0].split(',')
+		for key, value in tag.params:
+			print(key + "[" + value + "]")
+			if key.lower() == 'type':
+				this_lamp["Type"] = value
+			elif key.lower() == 'diff':
+				rgb = value.split(',')
 				this_lamp.color[0] = float(rgb[0])
 				this_lamp.color[1] = float(rgb[1])
 				this_lamp.color[2] = float(rgb[2])
-			elif p.split("[")[0].lower() == 'spec':
+			elif key.lower() == 'spec':
 				pass #not really sure what to do here yet... How to store lamp spec..?
-				#this_lamp["Atten"] = p[6:].rstrip("]").split("]")[0]
-			elif p.split("[")[0].lower() == 'atten':
-				this_lamp["Atten"] = p[6:].rstrip("]").split("]")[0]
-			
-		print("-------------------------------------------")
-	elif 'mat[' in jnt_name.lower() and 'param[' in jnt_name.lower(): # MAT[xx]_PARAM_[yy] nodes are treated in a special way, because their names sometimes get too long for blender.
-		mat_pex_name = jnt_name.split("_Data")[0] # should now be something like "MAT[xx]_PARAM[yy]_Type[RGBA]"
+			elif key.lower() == 'atten':
+				this_lamp["Atten"] = value
+	elif tag.kind == "MATPARAM": # MAT[xx]_PARAM_[yy] nodes are treated in a special way, because their names sometimes get too long for blender.
+		mat_pex_name = tag.name # should now be something like "MAT[xx]_PARAM[yy]_Type[RGBA]"
 		print("Creating MAT[xx]_PARAM[yy] node " + mat_pex_name)
 		
-		this_jnt = bpy.data.objects.new(mat_pex_name, None)
-		jnt_context.scene.objects.link(this_jnt)
-		pi = math.pi
-		this_jnt.rotation_euler.x = jnt_rotn[0] * (pi/180.0)
-		this_jnt.rotation_euler.y = jnt_rotn[1] * (pi/180.0)
-		this_jnt.rotation_euler.z = jnt_rotn[2] * (pi/180.0)
-		this_jnt.location.x = float(jnt_locn[0])
-		this_jnt.location.y = float(jnt_locn[1])
-		this_jnt.location.z = float(jnt_locn[2])
+		this_jnt = track("objects", bpy.data.objects.new(mat_pex_name, None))
 		
 		this_jnt["name"] = mat_pex_name # used later on when parenting...
 
 		# Store custom parameters
-		jointProps = jnt_name.split("_")
-			
-		for p in jointProps:
-			if "data" in p.split("[")[0].lower():
-				this_data_list = p[5:].rstrip("]").split(",")
-				for d in range(0,len(this_data_list)):
-					print("creating custom parameter " + str(d) + " = " + str(this_data_list[d]))
-					this_jnt["data"+str(d)] = this_data_list[d] # stores a custom parameter "data0" = x, "data1" = y, etc.
-			
-		print("-------------------------------------------")
+		this_data = tag.get("Data")
+		if this_data is not None:
+			this_data_list = this_data.split(",")
+			for d in range(0,len(this_data_list)):
+				print("creating custom parameter " + str(d) + " = " + str(this_data_list[d]))
+				this_jnt["data"+str(d)] = this_data_list[d] # stores a custom parameter "data0" = x, "data1" = y, etc.
 	else: # Not a nav light, background light or MAT[xx]_PARAM[yy], so carry on and create a joint...
 		print("Creating joint" + jnt_name)
-		this_jnt = bpy.data.objects.new(jnt_name, None)
-		jnt_context.scene.objects.link(this_jnt)
-		pi = math.pi
-		this_jnt.rotation_euler.x = jnt_rotn[0] * (pi/180.0)
-		this_jnt.rotation_euler.y = jnt_rotn[1] * (pi/180.0)
-		this_jnt.rotation_euler.z = jnt_rotn[2] * (pi/180.0)
-		this_jnt.location.x = float(jnt_locn[0])
-		this_jnt.location.y = float(jnt_locn[1])
-		this_jnt.location.z = float(jnt_locn[2])
-	
-		if "dock" in jnt_name.lower(): # DOCK[] nodes need special paramters (their names sometimes get too long for Blender)
-			if jnt_name.lower() is not "hold_dock":
-				jointProps = jnt_name.split("_")
-			
-				for p in jointProps:
-					if "flags" in p.split("[")[0].lower():
-						print(p)
-						this_jnt["Flags"] = p[6:].rstrip("]")
-					if "link" in p.split("[")[0].lower():
-						print(p)
-						this_jnt["Link"] = p[5:].rstrip("]")
-					if "fam" in p.split("[")[0].lower():
-						this_jnt["Fam"] = p[4:].rstrip("]")
-					if "mad" in p.split("[")[0].lower():
-						print(p)
-						this_jnt["MAD"] = p.lstrip("MAD[").rstrip("]") 
+		this_jnt = track("objects", bpy.data.objects.new(jnt_name, None))
+	
+		if tag.kind == "DOCK": # DOCK[] nodes need special paramters (their names sometimes get too long for Blender)
+			for key, value in tag.params:
+				print(key + "[" + value + "]")
+				if key.lower() == "flags":
+					this_jnt["Flags"] = value
+				elif key.lower() == "link":
+					this_jnt["Link"] = value
+				elif key.lower() == "fam":
+					this_jnt["Fam"] = value
+				elif key.lower() == "mad":
+					this_jnt["MAD"] = value
 			
-		if "seg" in jnt_name.lower(): # SEG[] nodes need special paramters (their names sometimes get too long for Blender)
-			jointProps = jnt_name.split("_")
+		if tag.kind == "SEG": # SEG[] nodes need special paramters (their names sometimes get too long for Blender)
 			this_jnt.empty_draw_type = dock_seg_type
 		
-			for p in jointProps:
-				if "flags" in p.split("[")[0].lower():
-					this_jnt["Flags"] = p[6:].rstrip("]")
-				if "spd" in p.split("[")[0].lower():
-					this_jnt["Speed"] = float(p[4:].rstrip("]"))
-				if "tol" in p.split("[")[0].lower():
-					this_jnt.empty_draw_size = float(p[4:].rstrip("]"))
-		print("-------------------------------------------")
+			for key, value in tag.params:
+				if key.lower() == "flags":
+					this_jnt["Flags"] = value
+				elif key.lower() == "spd":
+					this_jnt["Speed"] = float(value)
+				elif key.lower() == "tol":
+					this_jnt.empty_draw_size = float(value)
+	
+	jnt_context.scene.objects.link(this_jnt)
+	pi = math.pi
+	this_jnt.rotation_euler.x = jnt_rotn[0] * (pi/180.0)
+	this_jnt.rotation_euler.y = jnt_rotn[1] * (pi/180.0)
+	this_jnt.rotation_euler.z = jnt_rotn[2] * (pi/180.0)
+	this_jnt.location.x = float(jnt_locn[0])
+	this_jnt.location.y = float(jnt_locn[1])
+	this_jnt.location.z = float(jnt_locn[2])
+	print("-------------------------------------------")
 	return this_jnt
 
-def CheckForChildren(node,context,root):
-	#print("-----------------------------------------------------------------")
-	#print("CheckForChildren() checking for children of "+node.attrib["name"])
-	for item in node:
-		# If there is a child node...
-		if "node" in item.tag:
-			# Nav lights need name modification
-			if "NAVL[" in item.attrib["name"]:
-				#print("Found child nav light:")
-				#print(bpy.data.objects.get(item.attrib["name"]))
-				print("Found child nav light: "+item.attrib["name"]+" of "+node.attrib["name"])
-				navlight_name = item.attrib["name"].split("]")[0] + "]"
-				print(navlight_name)
-				child_navlight = bpy.data.objects.get(navlight_name)
-				child = bpy.data.objects[navlight_name]
-				parent = bpy.data.objects[node.attrib["name"][0:63]]
-				child.parent = parent
-				CheckForNavSubParams(item,navlight_name,context) # check for children of nav light (RODOH generates "SUB_PARAMS" as children of the nav light)
-			elif "LITE[" in item.attrib["name"]:
-				#print("Found child background light:")
-				#print(bpy.data.objects.get(item.attrib["name"]))
-				print("Found child background light: "+item.attrib["name"]+" of "+node.attrib["name"])
-				lite_name = item.attrib["name"].split("]")[0] + "]"
-				print(lite_name)
-				child_lite = bpy.data.objects.get(lite_name)
-				child = bpy.data.objects[lite_name]
-				parent = bpy.data.objects[node.attrib["name"][0:63]]
-				child.parent = parent
-				#CheckForNavSubParams(item,lite_name,context) # check for children of nav light (RODOH generates "SUB_PARAMS" as children of the nav light)
-			elif "MAT[" in item.attrib["name"] and "PARAM[" in item.attrib["name"]:
-				print("Found child MAT[xx]_PARAM[yy] node: "+item.attrib["name"]+" of "+node.attrib["name"])
-				mat_pex_name = item.attrib["name"].split("_Data")[0] # should be something like "MAT[xx]_PARAM[yy]"
-				print(mat_pex_name)
-				#child_mat_pex = bpy.data.objects.get(mat_pex_name)
-				child = bpy.data.objects[mat_pex_name]
-				parent = bpy.data.objects[node.attrib["name"][0:63]]
-				child.parent = parent
-			# Node without a name is a mesh(?)
-			elif bpy.data.objects.get(item.attrib["name"][0:63]) is None: # Do we need the [0:63]???
-				for i in item:
-					if "instance_geometry" in i.tag:
-						url = i.attrib["url"].lstrip("#")
-						for geo in root.iter(DAEGeo):
-							if geo.attrib["id"] == url:
-								child = bpy.data.objects[geo.attrib["name"]]
-								parent = bpy.data.objects[node.attrib["name"][0:63]]
-								child.parent = parent
-								CheckForChildren(item,context,root)
-			# Anything else is a standard joint
-			else:
-				print("Found child node: "+item.attrib["name"]+" of "+node.attrib["name"])
-				child = bpy.data.objects[item.attrib["name"][0:63]]
-				parent = bpy.data.objects[node.attrib["name"][0:63]]
-				child.parent = parent
-				CheckForChildren(item,context,root)
-
-def CheckForNavSubParams(navlight,name,context):
+def ApplyHierarchy(nodes, nodeObjects, index, context):
+	# nodeObjects holds the objects made for each node; the parenting itself
+	#  is worked out in one pass by dae_scene.resolveHierarchy()
+	pairs = dae_scene.resolveHierarchy(nodes, index.geometries)
+	for child, parent in pairs:
+		print("Found child node: "+nodes[child].name+" of "+nodes[parent].name)
+		for ob in nodeObjects[child]:
+			ob.parent = nodeObjects[parent][0]
+		# check for children of nav light (RODOH generates "SUB_PARAMS" as children of the nav light)
+		if nodes[child].kind == "navl":
+			CheckForNavSubParams(dae_scene.subParams(nodes, child), nodeObjects[child][0].data.name, context)
+
+def CheckForNavSubParams(params,name,context):
 	this_lamp = bpy.data.lamps[name]
-	# Check each item under the nav light for "SUB_PARAMS"
-	for item in navlight:
-		if "node" in item.tag:
-			if "SUB_PARAMS" in item.attrib["name"]:
-				# Check each item under SUB_PARAMS for parameters
-				for param in item:
-					if "node" in param.tag:
-						p = param.attrib["name"]
-						if p.split("[")[0].lower() == 'sz':
-							this_lamp.energy = float(p[3:].rstrip("]").split("]")[0])
-						if p.split("[")[0].lower() == 'ph':
-							this_lamp["Phase"] = float(p[3:].rstrip("]").split("]")[0])
-						if p.split("[")[0].lower() == 'fr':
-							this_lamp["Freq"] = float(p[3:].rstrip("]").split("]")[0])
-						if p.split("[")[0].lower() == 'col':
-							rgb = p[4:].rstrip("]").split("]")[0].split(',')
-							this_lamp.color[0] = float(rgb[0])
-							this_lamp.color[1] = float(rgb[1])
-							this_lamp.color[2] = float(rgb[2])
-						if p.split("[")[0].lower() == 'dist':
-							this_lamp.distance = float(p[5:].rstrip("]").split("]")[0])
-						if p.split("[")[0].lower() == 'flags':
-							this_lamp["Flags"] = p[6:].rstrip("]").split("]")[0]
-						if p.split("[")[0].lower() == 'type':
-							this_lamp["Type"] = p[5:].rstrip("]").split("]")[0]
-			# Delete SUB_PARAMS object and all child objects... (perhaps do this later, as a final step to delete everything that is not a child of the root nodes (e.g. Root Col, Root LOD[0], etc.)
+	# params are the names of the nodes under the nav light's "SUB_PARAMS", e.g. "Sz[1.5]"
+	for p in params:
+		SetNavLightParams(this_lamp, hodor_names.parseName(p).tags)
+	# Delete SUB_PARAMS object and all child objects... (perhaps do this later, as a final step to delete everything that is not a child of the root nodes (e.g. Root Col, Root LOD[0], etc.)
 	print("%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%")
 
-################
-#XML Processing#
-################
+def CreateJoints(nodes, dock_opt):
+	# Returns the objects made for each node - joints now, meshes are filled in later
+	nodeObjects = []
+	for node in nodes:
+		print(node.name)
+		# If this is a joint, make it!
+		if node.kind == "mesh":
+			print("this is a mesh:" + node.geometries[0])
+			nodeObjects.append([])
+		else:
+			# y up is fixed at the end of the import by rotating the roots by +90deg
+			nodeObjects.append([CreateJoint(node.name, node.location, node.rotation, bpy.context, dock_opt)])
+	return nodeObjects
+
+def YUpNodes(nodes):
+	# The roots of a Y up scene are made turned +90deg about X, rather than
+	#  rotated with an operator once they are in the scene
+	fix = mathutils.Matrix.Rotation(math.pi/2.0, 3, 'X')
+	fixed = []
+	for node in nodes:
+		if node.parent < 0 and "ROOT_" in node.name:
+			euler = mathutils.Euler([math.radians(r) for r in node.rotation], 'XYZ')
+			rotation = [math.degrees(r) for r in (fix * euler.to_matrix()).to_euler('XYZ')]
+			copy = dae_scene.SceneNode(node.name, node.parent, node.location, rotation, node.geometries)
+			copy.children = node.children
+			node = copy
+		fixed.append(node)
+	return fixed
+
+def BuildGeometry(meshName, meshData, smoothing_opt):
+	# meshData comes from dae_reader.readGeometry(), already merged and welded
+	mesh = meshBuilder(meshName, meshData, smoothing_opt)
+	ob = track("objects", bpy.data.objects.new(meshName, mesh))
+	print("Linking objects...")
+	bpy.context.scene.objects.link(ob)
+	return ob
 
-#More Dom2 code here
-def ImportDAE(DAEfullpath, smoothing_opt, dock_opt, goblins_opt):
-	tree = ET.parse(DAEfullpath)
-	root = tree.getroot()
-
-	DAE_file_path = os.path.dirname(DAEfullpath)
-	
-	# if up axis = Y and ROOT_LOD[0] has no X rotation, need to rotate about X by 90...
-	y_up = False
-	for axis in root.iter(DAEUpAxis): # find all <up_axis> in the file
-		if axis.text == "Y_UP":
-			for n in root.iter(DAENode): # find all <node> in the file
-				if "ROOT_LOD[0]" in n.attrib["name"]:
-					for par in n:
-						if "rotate" in par.tag:
-							if "sid" in par.attrib: # sometimes there are "dummy" <rotate> tags with no "sid"... (-pivot, from 3DSMax)
-								if "rotateX" in par.attrib["sid"]:
-									if float(par.text.split()[3]) < 89:
-										print("This is probably a RODOH dae - Y axis = up and there is no x rotation on ROOT_LOD[0]")
-										y_up = True
+def MergeGoblins(contents, scenes):
+	# Joins the GOBG[] meshes into the (last) MULT[]_LOD[0] mesh on the arrays,
+	#  so the goblin objects are never made. Returns contents.geometries with
+	#  the goblins taken out and the LOD[0] mesh replaced.
+	geometries = contents.geometries
+	LOD0 = None
+	goblins = []
+	for i, (geo_id, meshName, meshData) in enumerate(geometries):
+		if meshName.startswith("GOBG["):
+			print(meshName + " is a goblin mesh")
+			goblins.append(i)
+		elif meshName.startswith("MULT[") and "LOD[0]" in meshName:
+			LOD0 = i
+	if LOD0 is None or len(goblins) == 0:
+		return geometries
+	print(geometries[LOD0][1] + " is the LOD[0] mesh I will use to combine Goblins...")
 	
-	print(" ")
-	print("CREATING JOINTS")
-	print(" ")
+	# Where each mesh object would sit, to bring the goblins into LOD[0]'s space
+	made = dict([(g[0], g[1]) for g in geometries])
+	matrices = {}
+	for nodes in scenes:
+		world = dae_scene.nodeMatrices(nodes, dae_scene.resolveHierarchy(nodes, made))
+		for i, node in enumerate(nodes):
+			for url in node.geometries:
+				matrices[url] = world[i]
+	identity = np.identity(4)
+	toLOD0 = np.linalg.inv(matrices.get(geometries[LOD0][0], identity))
+	
+	meshes = []
+	if geometries[LOD0][2] is not None:
+		meshes.append(geometries[LOD0][2])
+	for i in goblins:
+		if geometries[i][2] is not None:
+			matrix = np.dot(toLOD0, matrices.get(geometries[i][0], identity))
+			meshes.append(dae_arrays.transformMeshData(geometries[i][2], matrix))
+	
+	print("Merging goblins...")
+	merged = None
+	if len(meshes) > 0:
+		merged = dae_arrays.concatMeshData(meshes)
+	geo_id, meshName, meshData = geometries[LOD0]
+	result = []
+	for i, g in enumerate(geometries):
+		if i == LOD0:
+			result.append((geo_id, meshName, merged))
+		elif i not in goblins:
+			result.append(g)
+	return result
+
+def RemoveObjects(objects, scene):
+	# Straight through bpy.data - no selecting, no operator and no scene update per object
+	for ob in objects:
+		untrack("objects", ob)
+		if ob.name in scene.objects:
+			scene.objects.unlink(ob)
+		bpy.data.objects.remove(ob)
+
+def BuildAnimation(object, animation, fps):
+	# Makes the whole F-curve for one decoded channel at once, rather than
+	#  keyframe_insert() for every frame (each one a path lookup and an insert)
+	path = animation.blenderPath()
+	if path is None or len(animation.times) == 0:
+		return
+	data_path, array_index = path
+	scale = 1.0
+	if data_path == "rotation_euler":
+		scale = math.pi/180
+	
+	if object.animation_data is None:
+		object.animation_data_create()
+	if object.animation_data.action is None:
+		object.animation_data.action = track("actions", bpy.data.actions.new(object.name + "Action"))
+	fcurves = object.animation_data.action.fcurves
+	fcurve = fcurves.find(data_path, array_index)
+	if fcurve is None:
+		fcurve = fcurves.new(data_path, array_index, "Object Transforms")
+	
+	count = len(animation.times)
+	points = fcurve.keyframe_points
+	first = len(points)
+	points.add(count)
+	co = np.empty((first + count, 2), np.float32)
+	points.foreach_get("co", co.ravel())
+	co[first:, 0] = animation.times * fps
+	co[first:, 1] = animation.values * scale
+	points.foreach_set("co", co.ravel())
+	
+	if animation.inTangents is not None:
+		inTangents, outTangents = dae_anims.tangentsToFrames(animation, fps, scale)
+		handles = np.empty((first + count, 2), np.float32)
+		points.foreach_get("handle_left", handles.ravel())
+		handles[first:] = inTangents
+		points.foreach_set("handle_left", handles.ravel())
+		points.foreach_get("handle_right", handles.ravel())
+		handles[first:] = outTangents
+		points.foreach_set("handle_right", handles.ravel())
+	
+	# Enums can't go through foreach_set, so interpolation and handle types are
+	#  set per key - and only when the DAE says something the defaults don't
+	if animation.interpolations is not None or animation.inTangents is not None:
+		for i in range(0, count):
+			key = points[first + i]
+			if animation.interpolations is not None:
+				key.interpolation = animation.interpolations[i]
+			if animation.inTangents is not None:
+				key.handle_left_type = "FREE"
+				key.handle_right_type = "FREE"
+	
+	fcurve.update()
+	
+	# Leave the property where the last key puts it, as keyframe_insert() did
+	getattr(object, data_path)[array_index] = animation.values[-1] * scale
 
-	# Create joints
-	for joint in root.iter(DAENode): # find all <node> in the file
-		# Joint name
-		joint_name = joint.attrib["name"]
-		print(joint_name)
-		# Joint location
-		joint_location = joint.find(DAETranslation)
-		if joint_location == None:
-			joint_location = ['0','0','0'] # If there is no translation specified, default to 0,0,0
-		else:
-			joint_location = joint_location.text.split()
-		# Joint rotation
-		joint_rotationX = 0 #	 \
-		joint_rotationY = 0 #	  |-- If there is no rotation specified, default to 0
-		joint_rotationZ = 0 #	 /
-		for rot in joint:
-			if "rotate" in rot.tag:
-				if "sid" in rot.attrib: # sometimes there are "dummy" <rotate> tags with no "sid"... (-pivot, from 3DSMax)
-					if "rotateX" in rot.attrib["sid"]:
-						if y_up and "ROOT" in joint_name:
-							#joint_rotationX = (math.pi/2.0) + float(rot.text.split()[3]) # if "y up", rotate everything by +90deg
-							joint_rotationX = float(rot.text.split()[3])
-						else:
-							joint_rotationX = float(rot.text.split()[3])
-					elif "rotateY" in rot.attrib["sid"]:
-						joint_rotationY = float(rot.text.split()[3])
-					elif "rotateZ" in rot.attrib["sid"]:
-						joint_rotationZ = float(rot.text.split()[3])
-		joint_rotation = [joint_rotationX,joint_rotationY,joint_rotationZ]
-		# Joint or mesh?
-		is_joint = True
-		for item in joint:
-			if "instance_geometry" in item.tag:
-				print("this is a mesh:" + item.attrib["url"])
-				is_joint = False
-		# If this is a joint, make it!
-		if is_joint:
-			CreateJoint(joint_name, joint_location,joint_rotation,bpy.context, dock_opt)
-			
+#More Dom2 code here
+def ImportDAE(DAEfullpath, smoothing_opt, dock_opt, goblins_opt, weld_dist=0.0001):
+	# A failed import is taken out again, see ImportDAEFilesSteps()
+	try:
+		BuildDAE(dae_reader.readDAE(DAEfullpath, weld_dist), smoothing_opt, dock_opt, goblins_opt)
+		PurgeImported()
+	except Exception:
+		RollbackImported(bpy.context.scene)
+		raise
+	finally:
+		importedData.clear()
+
+def BuildDAE(contents, smoothing_opt, dock_opt, goblins_opt, proxy_opt=False):
+	for phase in BuildDAESteps(contents, smoothing_opt, dock_opt, goblins_opt, proxy_opt):
+		pass
+
+def BuildDAESteps(contents, smoothing_opt, dock_opt, goblins_opt, proxy_opt=False):
+	# BuildDAE() a piece at a time, for the modal import: yields the phase
+	#  (see PHASES) of each piece as it is done.
+	# contents is a dae_reader.DAEContents - everything bpy-free has been done
+	DAE_file_path = os.path.dirname(contents.path)
+	index = contents.index
+	index.geometries = {} # contents may have come from the memory cache, built before
+	created = [] # every object made for this file, for the clean up at the end
+	
 	#My code starts here - DL
-
+	
 	#find textures and create them
-	for img in root.find(DAELibImages):
-		# We use attrib["id]" here because RODOH DAEs have "name"s that do not match their "id"s
-		#  this means we will lose the _FMT[] tag but we will have to live with that for now...
-		#
-		# Example (to solve we would need to add the _FMT[] tag back on at the <texture> stage:
-		# <image id="IMG[Hgn_MarineFrigate_Front_DIFF]-image" name="IMG[Hgn_MarineFrigate_Front_DIFF]_FMT[DXT5]">
-		# <texture texture="IMG[Hgn_MarineFrigate_Front_DIFF]-image">
-		#
-		# Let's have a warning message just to let the user know:
-		if img.attrib["id"].rstrip("-image") != img.attrib["name"]:
-			print("This appears to be a RODOH DAE. _FMT[] tags will be lost from textures - sorry!")
-		makeTextures(img.attrib["id"],DAE_file_path,img.find(DAEInit).text.lstrip("file://"))
-
+	texture_names = {} # the name a texture should have -> the one it got
+	pending = None # textures waiting for their proxy images, see makeTextures()
+	if proxy_opt:
+		pending = []
+	for image_id, image_path in contents.images:
+		texture_name = texture_index.diffName(image_id.rstrip("-image"))
+		texture_names[texture_name] = makeTextures(image_id,DAE_file_path,image_path,pending)
+		yield "textures"
+	
 	#Make materials based on the Effects library
-	for fx in root.find(DAELibEffects).iter(DAEfx):
-		matname = fx.attrib["name"]
-		matTextures = []
-		
-		# Just look for the <diffuse> tag - don't care about the other image files
-		for d in fx.iter(DAEDiff):
-			t = d.find(DAETex)
-			print(d)
-			print(d.tag)
-			if t is not None:
-				matTextures.append(t.attrib["texture"].rstrip("-image"))
-			# !- may not need to do replacing "DIFF" now... -!
-		
+	for matname, matTextures in contents.effects:
+		matTextures = [texture_names.get(texture_index.diffName(t), t) for t in matTextures]
 		makeMaterials(matname, matTextures)
-
-	#Find the mesh data and split the coords into 2D arrays
-
-	for geo in root.iter(DAEGeo):
-		meshName = geo.attrib["name"]
-		mesh = geo.find(DAEMesh)
-		
-		blankMesh = bpy.data.meshes.new(meshName)
-		ob = bpy.data.objects.new(meshName, blankMesh)
-		bpy.context.scene.objects.link(ob)
-		
-		print(meshName)	
-		
-		UVs = []
-		
-		for source in mesh.iter(DAESource):
-			if "position" in source.attrib["id"].lower():
-				rawVerts = [float(i) for i in source.find(DAEFloats).text.split()]
-			
-			if "normal" in source.attrib["id"].lower():
-				rawNormals = [float(i) for i in source.find(DAEFloats).text.split()]
-			
-			if "uv" in source.attrib["id"].lower():
-				rawUVs = [float(i) for i in source.find(DAEFloats).text.split()]
-				coords = [rawUVs[i:i+2] for i in range(0, len(rawUVs),2)]
-				UVs.append(coords)
-					
-		vertPositions = [rawVerts[i:i+3] for i in range(0, len(rawVerts),3)]
-		meshNormals = [rawNormals[i:i+3] for i in range(0, len(rawNormals),3)]
-		
-		subMeshes = []
-		
-		for tris in mesh.iter(DAETris):
-			if "material" in tris.attrib:
-				material = tris.attrib["material"]
-				print("Found <triangles> with material " + material)
-			else:
-				material = "None"
-				
-			maxOffset = 0
-			UVOffsets = []
-			vertOffset = 0
-			normOffset = 0
-			for inp in tris.iter(DAEInput):
-				if int(inp.attrib["offset"]) > maxOffset:
-					maxOffset = int(inp.attrib["offset"])
-				if inp.attrib["semantic"].lower() == "texcoord":
-					UVOffsets.append(int(inp.attrib["offset"]))
-				if inp.attrib["semantic"].lower() == "vertex":
-					vertOffset = int(inp.attrib["offset"])
-				if inp.attrib["semantic"].lower() == "normal":
-					normOffset =  int(inp.attrib["offset"])
-			if tris.find(DAEp).text is not None:
-				splitPsoup = [int(i) for i in tris.find(DAEp).text.split()]
-				pArray = [splitPsoup[i:i+(maxOffset+1)] for i in range(0, len(splitPsoup),(maxOffset+1))]
-				# Only build the submesh if it actually has triangles
-				subMeshes.append(meshBuilder(material, vertPositions, meshNormals, UVs, vertOffset, normOffset, UVOffsets, pArray, smoothing_opt))
-		
-		#Combines the material submeshes into one mesh
-		for obs in subMeshes:
-			obs.select = True
-		
-		ob.select = True
-		bpy.context.scene.objects.active = ob
-		bpy.ops.object.join()
-		ob.data.use_auto_smooth = True
-		bpy.ops.object.editmode_toggle()
-		bpy.ops.mesh.remove_doubles()
-		bpy.ops.object.editmode_toggle()
-		ob.select = False
-		
-	# Sort out hierarchy
-	for child in root:
-		if "library_visual_scenes" in child.tag:
-			for grandchild in child:
-				if "visual_scene" in grandchild.tag:
-					for node in grandchild:
-						if "node" in node.tag:
-							print("Checking for children of "+node.attrib["name"])
-							CheckForChildren(node,bpy.context,root)
-
-	###############################
-	#							 #
-	###############################
-
-	#Animations	
-	animLib = root.find(DAELibAnims)
-	for anim in animLib.iter(DAEAnim):
-		#print(animLib.getchildren().index(anim))
-		if anim.find(DAESource):
-			frames = []
-			locs = []
-			#bpy.data.objects[animLib[(animLib.getchildren().index(anim)-1)].attrib["name"]].select = True
-			for source in anim.iter(DAESource):
-				# print(source.attrib["id"])
-				if "input" in source.attrib["id"].lower():
-					frames = [float(i) for i in source.find(DAEFloats).text.split()]
-					#print(frames)
-				elif "output" in source.attrib["id"].lower():
-					locs = [float(i) for i in source.find(DAEFloats).text.split()]
-					#print(locs)
-			#bpy.data.objects[(anim.find(DAEChannel).attrib["target"].split("/")[0])].select = True
-			channel = anim.find(DAEChannel).attrib["target"].split("/")[1]
-			anim_target = anim.find(DAEChannel).attrib["target"].split("/")[0]
-			if anim_target in bpy.data.objects:
-				object = bpy.data.objects[anim_target]
-				for f in range(0, len(frames)):
-					currentFrame = (frames[f]*bpy.context.scene.render.fps)
-					if "translate" in channel.lower():
-						if "x" in channel.lower():
-							object.location.x =  locs[f]
-							object.keyframe_insert(data_path = 'location',index = 0, frame = currentFrame)
-						elif "y" in channel.lower():
-							object.location.y =  locs[f]
-							object.keyframe_insert(data_path = 'location',index = 1, frame = currentFrame)
-						elif "z" in channel.lower():
-							object.location.z =  locs[f]
-							object.keyframe_insert(data_path = 'location',index = 2, frame = currentFrame)
-					elif "rotatex" in channel.lower():
-						object.rotation_euler.x = locs[f]*(math.pi/180)
-						object.keyframe_insert(data_path = 'rotation_euler',index = 0, frame = currentFrame)
-					elif "rotatey" in channel.lower():
-						object.rotation_euler.y = locs[f]*(math.pi/180)
-						object.keyframe_insert(data_path = 'rotation_euler',index = 1, frame = currentFrame)
-					elif "rotatez" in channel.lower():
-						object.rotation_euler.z = locs[f]*(math.pi/180)
-						object.keyframe_insert(data_path = 'rotation_euler',index = 2, frame = currentFrame)
-			else:
-				print("!- Warning: could not find " + anim_target + " for creating animations...")
+	yield "textures"
+	
+	# If y up, the root joints are made rotated by +90deg
+	y_up = contents.y_up
+	if y_up:
+		print("This is probably a RODOH dae - Y axis = up and there is no x rotation on ROOT_LOD[0]")
+	
+	print(" ")
+	print("CREATING JOINTS")
+	print(" ")
+	scenes = [] # (nodes, nodeObjects) for each <visual_scene>
+	for nodes in contents.scenes:
+		if y_up:
+			nodes = YUpNodes(nodes)
+		nodeObjects = CreateJoints(nodes, dock_opt)
+		scenes.append((nodes, nodeObjects))
+		for objects in nodeObjects:
+			created.extend(objects)
+		yield "joints"
 	
 	###############################
 	# Check for Goblins and merge #
 	###############################
 	
+	geometries = contents.geometries
 	if goblins_opt:
 		print("CHECKING FOR GOBLINS")
-		
-		goblins_present = False
-		
-		bpy.ops.object.select_all(action='DESELECT')
-		
-		for x in bpy.data.objects:
-			if x.name.startswith("GOBG["):
-				goblins_present = True
-				print(x.name + " is a goblin mesh")
-				x.select = True
-			elif x.name.startswith("MULT[") and "LOD[0]" in x.name:
-				print(x.name + " is the LOD[0] mesh I will use to combine Goblins...")
-				LOD0 = x
-
-		if goblins_present:
-			print("Merging goblins...")
-			LOD0.select = True
-			bpy.context.scene.objects.active = LOD0
-			bpy.ops.object.join()
+		geometries = MergeGoblins(contents, [nodes for nodes, nodeObjects in scenes])
+		yield "meshes"
+	
+	for geo_id, meshName, meshData in geometries:
+		print(meshName)
+		ob = BuildGeometry(meshName, meshData, smoothing_opt)
+		index.geometries[geo_id] = ob.name
+		created.append(ob)
+		yield "meshes"
+	
+	# The proxies have been made in the background while the meshes were built
+	if pending is not None:
+		finishTextures(pending)
+		yield "textures"
+	
+	animations = contents.animations
+	
+	# Sort out hierarchy
+	for nodes, nodeObjects in scenes:
+		# Mesh nodes get the objects made for their geometries
+		for i, node in enumerate(nodes):
+			for url in node.geometries:
+				if url in index.geometries:
+					nodeObjects[i].append(bpy.data.objects[index.geometries[url]])
+		ApplyHierarchy(nodes, nodeObjects, index, bpy.context)
+		yield "hierarchy"
+
+	###############################
+	#							 #
+	###############################
+
+	#Animations	
+	# Targets are node names, looked up among this file's own objects - with
+	#  several files imported, the objects of an earlier one have the bare names
+	targets = {}
+	for nodes, nodeObjects in scenes:
+		for node, objects in zip(nodes, nodeObjects):
+			if len(objects) > 0 and node.name not in targets:
+				targets[node.name] = objects[0]
+	fps = bpy.context.scene.render.fps
+	for animation in animations:
+		anim_target = animation.target
+		if anim_target in targets:
+			BuildAnimation(targets[anim_target], animation, fps)
+		else:
+			print("!- Warning: could not find " + anim_target + " for creating animations...")
+		yield "animation"
 	
 	# Last thing, delete any HODOR param objects lying around
 	#  and correct joint names for SEG[] and DOCK[]
 	
 	print("CHECKING FOR HODOR PARAMS")
 	
-	bpy.ops.object.select_all(action='DESELECT')
-	
 	naughty_words = ["SUB_PARAMS",
 					"Ph[",
 					"Sz[",
@@ -784,36 +789,35 @@ def ImportDAE(DAEfullpath, smoothing_opt, dock_opt, goblins_opt):
 					"Sect["
 					]
 	
-	for x in bpy.data.objects:
+	doomed = []
+	for x in created:
 		# SUB_PARAM objects need deleting
-		if x.parent == None:
-			for w in naughty_words:
-				if x.name.startswith(w):
-					print(x.name + " is a HODOR SUB_PARAM and will be deleted...")
-					x.select = True
-					bpy.ops.object.delete()
+		if x.parent == None and x.name.startswith(tuple(naughty_words)):
+			print(x.name + " is a HODOR SUB_PARAM and will be deleted...")
+			doomed.append(x)
+			continue
 		# SEG[] and DOCK[] names need parameters stripping
-		if x.name.startswith("SEG["):
-			x.name = "SEG[" + x.name.split("]")[0].split("[")[1] + "]"
-		elif x.name.startswith("DOCK["):
-			x.name = "DOCK[" + x.name.split("]")[0].split("[")[1] + "]"
-	
-	# If y up, need to rotate all root jnts by +90deg
-	bpy.ops.object.select_all(action='DESELECT')
-	if y_up:
-		for y in bpy.data.objects:
-			if "ROOT_" in y.name:
-				y.select = True
-				bpy.ops.transform.rotate(value=(math.pi/2.0), axis=(1, 0, 0))
-				bpy.ops.object.select_all(action='DESELECT')
+		tag = hodor_names.parseName(x.name)
+		if tag.kind in ("SEG", "DOCK"):
+			x.name = tag.name
+	RemoveObjects(doomed, bpy.context.scene)
+	yield "cleanup"
 	
 	print("DAE file successfully imported!")
 
 
-def ImportLOD0(DAEfullpath, smoothing_opt):
-	tree = ET.parse(DAEfullpath)
-	root = tree.getroot()
-	
+def ImportLOD0(DAEfullpath, smoothing_opt, weld_dist=0.0001):
+	try:
+		BuildLOD0(DAEfullpath, dae_reader.readLOD0(DAEfullpath, weld_dist), smoothing_opt)
+		PurgeImported()
+	except Exception:
+		RollbackImported(bpy.context.scene)
+		raise
+	finally:
+		importedData.clear()
+
+def BuildLOD0(DAEfullpath, meshes, smoothing_opt):
+	# meshes are the (name, MeshData) of dae_reader.readLOD0()
 	if "\\" in DAEfullpath:
 		LOD0Name_ent = DAEfullpath.rstrip("dae").rstrip("DAE").rstrip(".").split("\\")
 	else:
@@ -823,75 +827,121 @@ def ImportLOD0(DAEfullpath, smoothing_opt):
 	print("Importing LOD[0] mesh(es) only...")
 	print(LOD0Name)
 	
-	#Find the mesh data and split the coords into 2D arrays
-	
 	LOD0_mesh = 0
+	
+	for geoName, meshData in meshes:
+		LOD0_mesh = LOD0_mesh + 1
+		meshName = LOD0Name + "-" + str(LOD0_mesh)
 		
-	for geo in root.iter(DAEGeo):
-		if "MULT[" in geo.attrib["name"] and "_LOD[0]" in geo.attrib["name"]:
-			LOD0_mesh = LOD0_mesh + 1
-			meshName = LOD0Name + "-" + str(LOD0_mesh)
-			mesh = geo.find(DAEMesh)
-			
-			blankMesh = bpy.data.meshes.new(meshName)
-			ob = bpy.data.objects.new(meshName, blankMesh)
-			bpy.context.scene.objects.link(ob)
-			
-			print("Importing " + geo.attrib["name"] + " as: " + meshName)
-			
-			UVs = []
-			
-			for source in mesh.iter(DAESource):
-				if "position" in source.attrib["id"].lower():
-					rawVerts = [float(i) for i in source.find(DAEFloats).text.split()]
-				
-				if "normal" in source.attrib["id"].lower():
-					rawNormals = [float(i) for i in source.find(DAEFloats).text.split()]
-				
-				if "uv" in source.attrib["id"].lower():
-					rawUVs = [float(i) for i in source.find(DAEFloats).text.split()]
-					coords = [rawUVs[i:i+2] for i in range(0, len(rawUVs),2)]
-					UVs.append(coords)
-						
-			vertPositions = [rawVerts[i:i+3] for i in range(0, len(rawVerts),3)]
-			meshNormals = [rawNormals[i:i+3] for i in range(0, len(rawNormals),3)]
-			
-			subMeshes = []
-			
-			for tris in mesh.iter(DAETris):
-				# For LOD[0] visual mesh, no materials needed
-				material = "None"
-					
-				maxOffset = 0
-				UVOffsets = []
-				vertOffset = 0
-				normOffset = 0
-				for inp in tris.iter(DAEInput):
-					if int(inp.attrib["offset"]) > maxOffset:
-						maxOffset = int(inp.attrib["offset"])
-					if inp.attrib["semantic"].lower() == "texcoord":
-						UVOffsets.append(int(inp.attrib["offset"]))
-					if inp.attrib["semantic"].lower() == "vertex":
-						vertOffset = int(inp.attrib["offset"])
-					if inp.attrib["semantic"].lower() == "normal":
-						normOffset =  int(inp.attrib["offset"])
-				if tris.find(DAEp).text is not None:
-					splitPsoup = [int(i) for i in tris.find(DAEp).text.split()]
-					pArray = [splitPsoup[i:i+(maxOffset+1)] for i in range(0, len(splitPsoup),(maxOffset+1))]
-					# Only build the submesh if it actually has triangles
-					subMeshes.append(meshBuilder(material, vertPositions, meshNormals, UVs, vertOffset, normOffset, UVOffsets, pArray, smoothing_opt))
-			
-			#Combines the material submeshes into one mesh
-			for obs in subMeshes:
-				obs.select = True
-			
-			ob.select = True
-			bpy.context.scene.objects.active = ob
-			bpy.ops.object.join()
-			ob.data.use_auto_smooth = True
-			bpy.ops.object.editmode_toggle()
-			bpy.ops.mesh.remove_doubles()
-			bpy.ops.object.editmode_toggle()
-			ob.select = False
+		print("Importing " + geoName + " as: " + meshName)
+		
+		# For LOD[0] visual mesh, no materials needed
+		BuildGeometry(meshName, meshData, smoothing_opt)
+
+def ImportDAEFiles(paths, smoothing_opt, dock_opt, goblins_opt, weld_dist=0.0001, lod0_only=False, cache_opt=True, proxy_opt=True, import_filter=None, raw_opt=False):
+	# Reads the files in parallel worker processes (see dae_reader.readDAEs())
+	#  and builds each one here as soon as it is read, in the order given.
+	#  import_filter is a dae_scene.ImportFilter of what to bring in, and
+	#  raw_opt decodes the arrays straight from the file (see dae_stream.py).
+	#  Returns the paths that could not be read, and the (count, bytes) of
+	#  the unused datablocks purged at the end (see PurgeImported()).
+	runner = ImportRunner(ImportDAEFilesSteps(paths, smoothing_opt, dock_opt, goblins_opt, weld_dist, lod0_only, cache_opt, proxy_opt, import_filter, raw_opt), len(paths))
+	while not runner.step(1.0):
+		pass
+	return runner.result
+
+def ImportDAEFilesSteps(paths, smoothing_opt, dock_opt, goblins_opt, weld_dist=0.0001, lod0_only=False, cache_opt=True, proxy_opt=True, import_filter=None, raw_opt=False, background=False):
+	# ImportDAEFiles() a piece at a time, yielding (phase, file number) as
+	#  each piece is done. With background the files are read on another
+	#  thread and ("reading", n) comes up while file n isn't ready yet, so no
+	#  step waits on a read. Returns what ImportDAEFiles() does. If a build
+	#  fails, everything the import made is taken out before the error goes
+	#  on; a cancelled import is taken out by ImportRunner.cancel().
+	failed = []
+	cache_dir = None
+	if cache_opt:
+		cache_dir = dae_cache.CACHE_DIR
+	results = dae_reader.readDAEs(paths, weld_dist, lod0_only, bpy.app.binary_path_python, cache_dir=cache_dir, importFilter=import_filter, raw=raw_opt)
+	if background:
+		results = dae_reader.BackgroundReader(results)
+	try:
+		for number in range(0, len(paths)):
+			while background and not results.ready():
+				yield ("reading", number)
+			DAEfullpath, result, error = next(results)
+			yield ("reading", number)
+			print("Building " + DAEfullpath)
+			if error is not None:
+				print("!- Could not read " + DAEfullpath)
+				print(error)
+				failed.append(DAEfullpath)
+			elif lod0_only:
+				BuildLOD0(DAEfullpath, result, smoothing_opt)
+				yield ("meshes", number)
+			else:
+				for phase in BuildDAESteps(result, smoothing_opt, dock_opt, goblins_opt, proxy_opt):
+					yield (phase, number)
+		purged = PurgeImported()
+		print("Purged " + str(purged[0]) + " unused datablocks, about " + str(purged[1] // (1024 * 1024)) + " MB")
+	except Exception:
+		count, size = RollbackImported(bpy.context.scene)
+		print("!- Import failed, took out " + str(count) + " datablocks")
+		raise
+	finally:
+		# Done, failed or cancelled, the readers go, and the proxy workers, and
+		#  nothing of this import is left for the next one to purge
+		results.close()
+		proxyDecoder.close()
+		importedData.clear()
+	return failed, purged
+
+class ImportRunner:
+	"""Runs an ImportDAEFilesSteps() a slice at a time, timing each phase.
+
+	count is the number of files, for the progress (0 to 1). Once step()
+	returns True, result holds what the steps returned.
+	"""
+	def __init__(self, steps, count):
+		self.steps = steps
+		self.count = max(count, 1)
+		self.times = collections.OrderedDict([(phase, 0.0) for phase in PHASES])
+		self.progress = 0.0
+		self.result = None
+		self.last = time.time()
+	
+	def step(self, budget):
+		# Runs steps for about budget seconds, or until it is left waiting on
+		#  a read. Returns True once the import is done.
+		end = self.last + budget
+		while True:
+			try:
+				phase, number = next(self.steps)
+			except StopIteration as e:
+				# The purge at the end
+				self.times["cleanup"] = self.times["cleanup"] + time.time() - self.last
+				self.result = e.value
+				self.progress = 1.0
+				return True
+			now = time.time()
+			self.times[phase] = self.times[phase] + now - self.last
+			self.last = now
+			self.progress = (number + PHASES.index(phase) / float(len(PHASES))) / self.count
+			if phase == "reading" or now >= end:
+				return False
+	
+	def resume(self):
+		# The time between step()s is Blender's (or the user's), not the import's
+		self.last = time.time()
+	
+	def cancel(self, scene):
+		# Takes out what the import had made, see RollbackImported(), then stops
+		#  it - closing the steps forgets what they made
+		purged = RollbackImported(scene)
+		self.steps.close()
+		return purged
+	
+	def report(self):
+		# "reading 1.2s, meshes 0.8s, ..." for the phases that took any time
+		return ", ".join(["%s %.1fs" % (phase, t) for phase, t in self.times.items() if t >= 0.05])
 #
 # end
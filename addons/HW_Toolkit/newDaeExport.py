@@ -3,10 +3,18 @@
 # Dom2 14-JUL-2019
 
 import bpy
+import bmesh
 import math
+import os
 import time
 from mathutils import *
 
+import numpy as np
+
+from . import hodor_names
+from . import dae_writer
+from . import texture_decode
+
 C = bpy.context
 D = bpy.data
 
@@ -60,19 +68,36 @@ def ColorToArrayToString(color):
     return colorArray
 
 def writeTextures(dae,libImages,texName):
-    thisImage = dae.ET.SubElement(libImages,'image',id=texName+'-image',name=texName)
-    init = dae.ET.SubElement(thisImage,'init_from')
+    libImages.start('image',id=texName+'-image',name=texName)
     print("Texture = "+texName)
-    init.text = D.textures[texName].image.filepath
+    image = D.textures[texName].image
+    if texture_decode.PROXY_PROP in image:
+        # a half size proxy from the import, point at the real file
+        libImages.element('init_from',image[texture_decode.PROXY_PROP])
+    else:
+        libImages.element('init_from',image.filepath)
+    libImages.end()
+
+def writeTextureSlot(lib,t):
+    lib.start('texture',texture=t.name+'-image',texcoord='CHANNEL0')
+    lib.start('extra')
+    lib.start('technique',profile='MAYA')
+    lib.element('wrapU','TRUE',sid='wrapU0')
+    lib.element('wrapV','TRUE',sid='wrapV0')
+    lib.element('blend_mode',t.blend_type)
+    lib.end()
+    lib.end()
+    lib.end()
 
 def writeMaterials(dae,libMats,libEffects,matName):
-    thisMaterial = dae.ET.SubElement(libMats,'material',id=matName,name=matName)
-    instance = dae.ET.SubElement(thisMaterial,'instance_effect',url='#'+matName+'-fx')
+    libMats.start('material',id=matName,name=matName)
+    libMats.element('instance_effect',url='#'+matName+'-fx')
+    libMats.end()
     
-    thisEffect = dae.ET.SubElement(libEffects,'effect',id=matName+'-fx',name=matName)
-    profile = dae.ET.SubElement(thisEffect,'profile_COMMON')
-    technique = dae.ET.SubElement(profile,'technique',sid='standard')
-    shtype = dae.ET.SubElement(technique,D.materials[matName].specular_shader.lower())
+    libEffects.start('effect',id=matName+'-fx',name=matName)
+    libEffects.start('profile_COMMON')
+    libEffects.start('technique',sid='standard')
+    libEffects.start(D.materials[matName].specular_shader.lower())
     
     #Get Textures
     diffuse_tex = []
@@ -91,192 +116,201 @@ def writeMaterials(dae,libMats,libEffects,matName):
                 normal_tex.append(t)
     
     #Emission Element
-    emit = dae.ET.SubElement(shtype,'emission')
-    color = dae.ET.SubElement(emit,'color',sid='emission')   
-    color.text = ColorToArrayToString(D.materials[matName].diffuse_color)
-    if (len(emission_tex) > 0):
-        for t in emission_tex:
-            texture = dae.ET.SubElement(emit,'texture',texture=t.name+'-image',texcoord='CHANNEL0')
-            extra = dae.ET.SubElement(texture,'extra')
-            technique = dae.ET.SubElement(extra,'technique',profile='MAYA')
-            wrapU = dae.ET.SubElement(technique,'wrapU',sid='wrapU0')
-            wrapU.text='TRUE'
-            wrapV = dae.ET.SubElement(technique,'wrapV',sid='wrapV0')
-            wrapV.text='TRUE'
-            blend = dae.ET.SubElement(technique,'blend_mode')
-            blend.text = t.blend_type
+    libEffects.start('emission')
+    libEffects.element('color',ColorToArrayToString(D.materials[matName].diffuse_color),sid='emission')
+    for t in emission_tex:
+        writeTextureSlot(libEffects,t)
+    libEffects.end()
     
     #Ambient
-    ambient = dae.ET.SubElement(shtype,'ambient')
-    color = dae.ET.SubElement(ambient,'color',sid='ambient')
-    color.text = ColorToArrayToString(D.worlds['World'].ambient_color)+' '+str(D.materials[matName].ambient)
+    libEffects.start('ambient')
+    libEffects.element('color',ColorToArrayToString(D.worlds['World'].ambient_color)+' '+str(D.materials[matName].ambient),sid='ambient')
+    libEffects.end()
     
     #Diffuse
-    diffuse = dae.ET.SubElement(shtype,'diffuse')
+    libEffects.start('diffuse')
     if (len(diffuse_tex)==0):
-        color = dae.ET.SubElement(diffuse,'color',sid='diffuse')
-        color.text = ColorToArrayToString(D.materials[matName].diffuse_color)
-    if (len(diffuse_tex)>0):
-        for t in diffuse_tex:
-            texture = dae.ET.SubElement(diffuse,'texture',texture=t.name+'-image',texcoord='CHANNEL0')
-            extra = dae.ET.SubElement(texture,'extra')
-            technique = dae.ET.SubElement(extra,'technique',profile='MAYA')
-            wrapU = dae.ET.SubElement(technique,'wrapU',sid='wrapU0')
-            wrapU.text='TRUE'
-            wrapV = dae.ET.SubElement(technique,'wrapV',sid='wrapV0')
-            wrapV.text='TRUE'
-            blend = dae.ET.SubElement(technique,'blend_mode')
-            blend.text = t.blend_type
+        libEffects.element('color',ColorToArrayToString(D.materials[matName].diffuse_color),sid='diffuse')
+    for t in diffuse_tex:
+        writeTextureSlot(libEffects,t)
+    libEffects.end()
     
     #Specular
-    specular = dae.ET.SubElement(shtype,'specular')
-    color = dae.ET.SubElement(specular,'color',sid='specular')
-    color.text = ColorToArrayToString(D.materials[matName].specular_color)
-    if (len(specular_tex)>0):
-        for t in specular_tex:
-            texture = dae.ET.SubElement(specular,'texture',texture=t.name+'-image',texcoord='CHANNEL0')
-            extra = dae.ET.SubElement(texture,'extra')
-            technique = dae.ET.SubElement(extra,'technique',profile='MAYA')
-            wrapU = dae.ET.SubElement(technique,'wrapU',sid='wrapU0')
-            wrapU.text="TRUE"
-            wrapV = dae.ET.SubElement(technique,'wrapV',sid='wrapV0')
-            wrapV.text = 'TRUE'
-            blend = dae.ET.SubElement(technique,'blend_mode')
-            blend.text = t.blend_type
-    shininess = dae.ET.SubElement(shtype,'shininess')
-    shine = dae.ET.SubElement(shininess,'float',sid='shininess')
-    shine.text = str(D.materials[matName].specular_hardness)
+    libEffects.start('specular')
+    libEffects.element('color',ColorToArrayToString(D.materials[matName].specular_color),sid='specular')
+    for t in specular_tex:
+        writeTextureSlot(libEffects,t)
+    libEffects.end()
+    libEffects.start('shininess')
+    libEffects.element('float',str(D.materials[matName].specular_hardness),sid='shininess')
+    libEffects.end()
     
     #Reflective
-    reflective = dae.ET.SubElement(shtype,'reflective')
-    color = dae.ET.SubElement(reflective,'color')
-    color.text = ColorToArrayToString(D.materials[matName].mirror_color)
+    libEffects.start('reflective')
+    libEffects.element('color',ColorToArrayToString(D.materials[matName].mirror_color))
+    libEffects.end()
     
     #Transparency
-    transparency = dae.ET.SubElement(shtype,'transparency')
-    float = dae.ET.SubElement(transparency,'float',sid='transparency')
-    float.text = str(D.materials[matName].alpha)
+    libEffects.start('transparency')
+    libEffects.element('float',str(D.materials[matName].alpha),sid='transparency')
+    libEffects.end()
+    
+    libEffects.end()
+    libEffects.end()
+    libEffects.end()
+    libEffects.end()
+
+def writeSource(lib,id,values,params,count,digits=0):
+    # A <source> of floats: values a flat array as written, params the names of each stride
+    lib.start('source',id=id)
+    lib.array('float_array',dae_writer.numberChunks(values,digits),id=id+'-array',count=str(len(values)))
+    lib.start('technique_common')
+    lib.start('accessor',source='#'+id+'-array',count=str(count),stride=str(len(params)))
+    for p in params:
+        lib.element('param',name=p,type='float')
+    lib.end()
+    lib.end()
+    lib.end()
+
+class MeshArrays:
+    """What writeGeometry needs of a mesh, read with foreach_get.
+
+    Loop arrays are in mesh.loops order, so a loop index is also the index
+    of its normal and UVs.
+    """
+    def __init__(self, mesh):
+        self.positions = np.empty(len(mesh.vertices)*3, np.float32) # x y z per vertex
+        mesh.vertices.foreach_get('co', self.positions)
+        self.loopVerts = np.empty(len(mesh.loops), np.int32) # indexes positions
+        mesh.loops.foreach_get('vertex_index', self.loopVerts)
+        self.loopNormals = np.empty(len(mesh.loops)*3, np.float32) # split normals, x y z per loop
+        mesh.loops.foreach_get('normal', self.loopNormals)
+        self.loopUVs = [] # (name, s t per loop), one per UV layer
+        for layer in mesh.uv_layers:
+            uvs = np.empty(len(layer.data)*2, np.float32)
+            layer.data.foreach_get('uv', uvs)
+            self.loopUVs.append((layer.name, uvs))
+        self.polyMaterials = np.empty(len(mesh.polygons), np.int32)
+        mesh.polygons.foreach_get('material_index', self.polyMaterials)
+        self.polyStarts = np.empty(len(mesh.polygons), np.int32)
+        mesh.polygons.foreach_get('loop_start', self.polyStarts)
+        self.polyTotals = np.empty(len(mesh.polygons), np.int32)
+        mesh.polygons.foreach_get('loop_total', self.polyTotals)
+
+    def corners(self, order=None):
+        # The <p> of the polygons in order (polygon indices, or all of them as they are):
+        #  a row per corner, its vertex then its loop index
+        starts = self.polyStarts if order is None else self.polyStarts[order]
+        totals = self.polyTotals if order is None else self.polyTotals[order]
+        firsts = np.cumsum(totals) - totals # where each polygon starts in the result
+        loops = np.repeat(starts - firsts, totals) + np.arange(np.sum(totals))
+        p = np.empty((len(loops),2), np.int64)
+        p[:,0] = self.loopVerts[loops]
+        p[:,1] = loops
+        return p
+
+    def materialCorners(self, numMaterials):
+        """The polygon count and <p> of each of the first numMaterials slots.
+
+        The polygons are sorted by material once, stably so each slot keeps
+        them in mesh order, and the corners are cut into one slice per slot.
+        """
+        order = np.argsort(self.polyMaterials, kind='mergesort')
+        p = self.corners(order)
+        polyCounts = np.bincount(self.polyMaterials, minlength=numMaterials)
+        loopCounts = np.bincount(self.polyMaterials, weights=self.polyTotals, minlength=numMaterials).astype(np.int64)
+        loopEnds = np.cumsum(loopCounts)
+        return [(polyCounts[m], p[loopEnds[m]-loopCounts[m]:loopEnds[m]]) for m in range(0,numMaterials)]
+
+def triangulatedMesh(ob):
+    # A temporary mesh of ob with its modifiers applied and every face split
+    #  into triangles as the Triangulate modifier does it (beauty for quads
+    #  and n-gons), leaving the object itself alone. Remove it when done
+    mesh = ob.to_mesh(C.scene, True, 'PREVIEW', calc_tessface=False)
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method=0, ngon_method=0)
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+def writeTriangles(libgeo,count,p,inputs,**attrib):
+    # One <triangles> of count polygons, p as from MeshArrays.corners()
+    libgeo.start('triangles',count=str(count),**attrib)
+    for semantic, offset, source, extra in inputs:
+        libgeo.element('input',semantic=semantic,offset=offset,source=source,**extra)
+    libgeo.array('p',dae_writer.numberChunks(p))
+    libgeo.end()
 
 def writeGeometry(dae,libgeo,geoName):
-    #Triangulate the Mesh
-    thisGeo = dae.ET.SubElement(libgeo,'geometry',name = geoName,id=geoName)
-    thisMesh = dae.ET.SubElement(thisGeo,'mesh')
-    C.scene.objects.active = D.objects[geoName]
-    bpy.ops.object.modifier_add(type='TRIANGULATE')
-    bpy.ops.object.modifier_apply(modifier='Triangulate')
-    
-    mesh = D.objects[geoName].data
-    mesh.update(calc_tessface=True)
-    mesh.calc_normals_split()
+    #Triangulate a copy of the Mesh
+    libgeo.start('geometry',name = geoName,id=geoName)
+    libgeo.start('mesh')
+    mesh = triangulatedMesh(D.objects[geoName])
+    try:
+        mesh.calc_normals_split()
+        arrays = MeshArrays(mesh)
+        materials = [m.name for m in mesh.materials]
+    finally:
+        D.meshes.remove(mesh)
     
     #Create the Vertices
-    vertices = []
-    for v in mesh.vertices:
-        vertices.append(v.co.x)
-        vertices.append(v.co.y)
-        vertices.append(v.co.z)    
-    meshPositions = dae.ET.SubElement(thisMesh,'source',id=geoName+'-positions')
-    vertArray = dae.ET.SubElement(meshPositions,'float_array',id=meshPositions.attrib['id']+'-array',count=str(len(vertices)))
-    vertices = str(vertices)    
-    vertArray.text = vertices.translate({ord(c):None for c in '[],'})
-    technique = dae.ET.SubElement(meshPositions,'technique_common')
-    accessor = dae.ET.SubElement(technique,'accessor',source='#'+vertArray.attrib['id'],count=str(len(mesh.vertices)),stride='3')
-    paramX = dae.ET.SubElement(accessor,'param',name='X',type='float')
-    paramY = dae.ET.SubElement(accessor,'param',name='Y',type='float')
-    paramZ = dae.ET.SubElement(accessor,'param',name='Z',type='float')
+    positionsID = geoName+'-positions'
+    writeSource(libgeo,positionsID,arrays.positions,['X','Y','Z'],len(arrays.positions)//3,dae.digits)
     
     #Create the Normals
-    normals = []
-    for v in mesh.loops:
-        normals.append(v.normal.x)
-        normals.append(v.normal.y)
-        normals.append(v.normal.z)    
-    meshNormals = dae.ET.SubElement(thisMesh,'source',id=geoName+'-normals')
-    normalArray = dae.ET.SubElement(meshNormals,'float_array',id=meshNormals.attrib['id']+'-array',count = str(len(normals)))
-    normals = str(normals)
-    normalArray.text = normals.translate({ord(c):None for c in '[],'})
-    technique = dae.ET.SubElement(meshNormals,'technique_common')
-    accessor = dae.ET.SubElement(technique,'accessor',source='#'+normalArray.attrib['id'],count=str(len(mesh.loops)),stride='3')
-    paramX = dae.ET.SubElement(accessor,'param',name='X',type='float')
-    paramY = dae.ET.SubElement(accessor,'param',name='Y',type='float')
-    paramZ = dae.ET.SubElement(accessor,'param',name='Z',type='float')
+    normalsID = geoName+'-normals'
+    writeSource(libgeo,normalsID,arrays.loopNormals,['X','Y','Z'],len(arrays.loopVerts),dae.digits)
     
     #Create UVs
     uvMaps = []
-    for uvi in mesh.uv_layers:
-        thisMap = dae.ET.SubElement(thisMesh,'source',id=geoName+'-texcoord-'+uvi.name)
-        uvMaps.append(thisMap)
-        coords = []
-        for v in uvi.data:
-            coords.append(v.uv.x)
-            coords.append(v.uv.y)
-        array = dae.ET.SubElement(thisMap,'float_array',id=thisMap.attrib['id']+'-array',count = str(len(coords)))
-        coords = str(coords)
-        array.text = coords.translate({ord(c):None for c in '[],'})
-        technique = dae.ET.SubElement(thisMap,'technique_common')
-        accessor = dae.ET.SubElement(technique,'accessor',source='#'+array.attrib['id'],count = str(len(uvi.data)),stride='2')
-        paramS = dae.ET.SubElement(accessor,'param',name='S',type='float')
-        paramT = dae.ET.SubElement(accessor,'param',name='T',type='float')
+    for name, uvs in arrays.loopUVs:
+        uvMaps.append(geoName+'-texcoord-'+name)
+        writeSource(libgeo,uvMaps[-1],uvs,['S','T'],len(uvs)//2,dae.digits)
     
     #Tell it where the vertices are
-    vertElement = dae.ET.SubElement(thisMesh,'vertices',id=geoName+'-vertices')
-    input = dae.ET.SubElement(vertElement,'input',semantic='POSITION',source='#'+meshPositions.attrib['id'])
+    verticesID = geoName+'-vertices'
+    libgeo.start('vertices',id=verticesID)
+    libgeo.element('input',semantic='POSITION',source='#'+positionsID)
+    libgeo.end()
     
     #Make the Triangles
-    if len(mesh.materials)>0:
-        for m in range(0,len(mesh.materials)):
-            print("+++"+str(m)+", len(mesh.materials)="+str(len(mesh.materials)))
-            mat = mesh.materials[m]
-            polys = []
-            for p in mesh.polygons:
-                if p.material_index == m:
-                    polys.append(p)
-            tris = dae.ET.SubElement(thisMesh,'triangles',material = mat.name,count=str(len(polys)))
-            inputVert = dae.ET.SubElement(tris,'input',semantic='VERTEX',offset='0',source='#'+vertElement.attrib['id'])
-            inputNormal = dae.ET.SubElement(tris,'input',semantic='NORMAL',offset ='1',source = '#'+ meshNormals.attrib['id'])
-            for u in range(0,len(uvMaps)):
-                map = dae.ET.SubElement(tris,'input',semantic = 'TEXCOORD',offset='1',set=str(u),source='#'+uvMaps[u].attrib['id'])
-            pElement = dae.ET.SubElement(tris,'p')
-            pVerts = []
-            pInds = []
-            for p in mesh.polygons:
-                for i in p.vertices:
-                    pVerts.append(i)
-            for p in mesh.polygons:
-                if (p.material_index==m):
-                    for i in p.loop_indices:
-                        pInds.append(pVerts[i])
-                        pInds.append(i)
-            pInds = str(pInds)
-            pElement.text = pInds.translate({ord(c):None for c in '[],'})
+    inputs = [('VERTEX','0','#'+verticesID,{}),('NORMAL','1','#'+normalsID,{})]
+    if len(materials)>0:
+        for u in range(0,len(uvMaps)):
+            inputs.append(('TEXCOORD','1','#'+uvMaps[u],{'set':str(u)}))
+        buckets = arrays.materialCorners(len(materials))
+        for m in range(0,len(materials)):
+            print("+++"+str(m)+", len(mesh.materials)="+str(len(materials)))
+            count, p = buckets[m]
+            writeTriangles(libgeo,count,p,inputs,material=materials[m])
     else:
-        polys = []
-        for p in mesh.polygons:
-            polys.append(p)
-        tris = dae.ET.SubElement(thisMesh,'triangles',count=str(len(polys)))
-        inputVert = dae.ET.SubElement(tris,'input',semantic='VERTEX',offset='0',source='#'+vertElement.attrib['id'])
-        inputNormal = dae.ET.SubElement(tris,'input',semantic='NORMAL',offset ='1',source = '#'+ meshNormals.attrib['id'])        
-        pElement = dae.ET.SubElement(tris,'p')
-        pVerts = []
-        pInds = []
-        for p in mesh.polygons:
-            for i in p.vertices:
-                pVerts.append(i)
-        for p in polys:
-            for i in p.loop_indices:
-                pInds.append(pVerts[i])
-                pInds.append(i)
-        pInds = str(pInds)
-        pElement.text = pInds.translate({ord(c):None for c in '[],'})
+        writeTriangles(libgeo,len(arrays.polyTotals),arrays.corners(),inputs)
+    libgeo.end()
+    libgeo.end()
         
         
+def writeAnimSource(lib,id,values,stride,count,type='float',digits=0):
+    lib.start('source',id=id)
+    if type == 'name':
+        lib.element('Name_array',' '.join(values),id=id+'-array',count=str(len(values)))
+    else:
+        lib.array('float_array',dae_writer.numberChunks(values,digits),id=id+'-array',count=str(len(values)))
+    lib.start('technique_common')
+    lib.start('accessor',source='#'+id+'-array',count=count,stride=str(stride))
+    for i in range(0,stride):
+        lib.element('param',type=type)
+    lib.end()
+    lib.end()
+    lib.end()
+
 def writeAnims(dae,libanims,objName):
     
-    thisAnim = dae.ET.SubElement(libanims,'animation',id=objName+'-anim',name=objName)
+    libanims.element('animation',id=objName+'-anim',name=objName)
     
     if D.objects[objName].animation_data.action is not None:
         for curve in D.objects[objName].animation_data.action.fcurves:
-            thisCurve = dae.ET.SubElement(libanims,'animation')
+            libanims.start('animation')
             print(curve.data_path+" "+str(curve.array_index))
             
             baseID = None
@@ -327,79 +361,38 @@ def writeAnims(dae,libanims,objName):
                 outtan.append(k.handle_right.x)
                 outtan.append(k.handle_right.y)
             
-            #Sampler
-            sampler = dae.ET.SubElement(thisCurve,'sampler',id=baseID)
+            #Sampler - the sources it points at follow it
+            libanims.start('sampler',id=baseID)
+            libanims.element('input',semantic = 'INPUT',source='#'+baseID+'-input')
+            libanims.element('input',semantic = 'OUTPUT',source='#'+baseID+'-output')
+            libanims.element('input',semantic='INTERPOLATION',source='#'+baseID+'-interpolation')
+            libanims.element('input',semantic='IN_TANGENT',source='#'+baseID+'-intan')
+            libanims.element('input',semantic='OUT_TANGENT',source='#'+baseID+'-outtan')
+            libanims.end()
             
             #Create the input values (keyframes)
-            source = dae.ET.SubElement(thisCurve,'source',id=baseID+'-input')
-            input = dae.ET.SubElement(sampler,'input',semantic = 'INPUT',source='#'+source.attrib['id'])
-            array = dae.ET.SubElement(source,'float_array',id=baseID+'-input-array',count = str(len(keys)))
-            array.text = str(keys).translate({ord(c):None for c in '[],'})
-            technique = dae.ET.SubElement(source,'technique_common')
-            accessor = dae.ET.SubElement(technique,'accessor',source='#'+array.attrib['id'],count = array.attrib['count'],stride = '1')
-            param = dae.ET.SubElement(accessor,'param',type='float')
+            writeAnimSource(libanims,baseID+'-input',keys,1,str(len(keys)),digits=dae.digits)
             
             #Create the output values (actual values)
-            source = dae.ET.SubElement(thisCurve,'source',id=baseID+'-output')
-            input = dae.ET.SubElement(sampler,'input',semantic = 'OUTPUT',source='#'+source.attrib['id'])
-            array = dae.ET.SubElement(source,'float_array',id=baseID+'-output-array',count = str(len(values)))
-            array.text = str(values).translate({ord(c):None for c in '[],'})
-            technique = dae.ET.SubElement(source,'technique_common')
-            accessor = dae.ET.SubElement(technique,'accessor',source='#'+array.attrib['id'],count = array.attrib['count'],stride = '1')
-            param = dae.ET.SubElement(accessor,'param',type='float')
+            writeAnimSource(libanims,baseID+'-output',values,1,str(len(values)),digits=dae.digits)
             
             #Create the interpolations
-            source = dae.ET.SubElement(thisCurve,'source',id=baseID+'-interpolation')
-            input = dae.ET.SubElement(sampler,'input',semantic='INTERPOLATION',source='#'+source.attrib['id'])
-            array = dae.ET.SubElement(source,'Name_array',id=baseID+'-interpolation-array',count = str(len(interp)))
-            array.text = str(interp).translate({ord(c):None for c in '[],\''})
-            technique = dae.ET.SubElement(source,'technique_common')
-            accessor = dae.ET.SubElement(technique,'accessor',source='#'+array.attrib['id'],count = array.attrib['count'],stride='1')
-            param = dae.ET.SubElement(accessor,'param',type='name')
+            writeAnimSource(libanims,baseID+'-interpolation',interp,1,str(len(interp)),'name')
             
             #Intangents for Bezier Curves
-            source = dae.ET.SubElement(thisCurve,'source',id=baseID+'-intan')
-            input = dae.ET.SubElement(sampler,'input',semantic='IN_TANGENT',source='#'+source.attrib['id'])
-            array = dae.ET.SubElement(source,'float_array',id=baseID+'-intan-array',count = str(len(intan)))
-            array.text = str(intan).translate({ord(c):None for c in '[],'})
-            technique = dae.ET.SubElement(source,'technique_common')
-            accessor = dae.ET.SubElement(technique,'accessor',source = '#'+array.attrib['id'],count = str(len(intan)/2),stride = '2')
-            paramA = dae.ET.SubElement(accessor,'param',type='float')
-            paramB = dae.ET.SubElement(accessor,'param',type='float')
+            writeAnimSource(libanims,baseID+'-intan',intan,2,str(len(intan)/2),digits=dae.digits)
             
             #Outtangents for Bezier Curves
-            source = dae.ET.SubElement(thisCurve,'source',id=baseID+'-outtan')
-            input = dae.ET.SubElement(sampler,'input',semantic='OUT_TANGENT',source='#'+source.attrib['id'])
-            array = dae.ET.SubElement(source,'float_array',id=baseID+'-outtan-array',count = str(len(outtan)))
-            array.text = str(outtan).translate({ord(c):None for c in '[],'})
-            technique = dae.ET.SubElement(source,'technique_common')
-            accessor = dae.ET.SubElement(technique,'accessor',source='#'+array.attrib['id'],count = str(len(outtan)/2),stride = '2')
-            paramA = dae.ET.SubElement(accessor,'param',type='float')
-            paramB = dae.ET.SubElement(accessor,'param',type='float')
+            writeAnimSource(libanims,baseID+'-outtan',outtan,2,str(len(outtan)/2),digits=dae.digits)
             
-            channel = dae.ET.SubElement(thisCurve,'channel',source='#'+baseID,target=baseID.split('-')[0]+'/'+baseID.split('-')[1])
+            libanims.element('channel',source='#'+baseID,target=baseID.split('-')[0]+'/'+baseID.split('-')[1])
+            libanims.end()
         
         
-def writeNodes(dae,parentNode,libgeo,libanims,objectName):
-    print("Writing Node for "+objectName)
-    thisNode = dae.ET.SubElement(parentNode,'node',name=objectName,id=objectName,sid=objectName)
-    thisPosition = dae.ET.SubElement(thisNode,'translate',sid='translate')
-    thisPosition.text = str(D.objects[objectName].matrix_local.translation.x)+' '+str(D.objects[objectName].matrix_local.translation.y)+' '+str(D.objects[objectName].matrix_local.translation.z)
-    rotZ = dae.ET.SubElement(thisNode,'rotate',sid='rotateZ')
-    rotZ.text = '0 0 1 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().z))
-    rotY = dae.ET.SubElement(thisNode,'rotate',sid='rotateY')
-    rotY.text = '0 1 0 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().y))
-    rotX = dae.ET.SubElement(thisNode,'rotate',sid='rotateX')
-    rotX.text = '1 0 0 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().x))
-    if D.objects[objectName].animation_data is not None:
-        writeAnims(dae,libanims,objectName)
-    if D.objects[objectName].type == 'MESH':
-        geoInstance = dae.ET.SubElement(thisNode,'instance_geometry',url='#'+objectName)
-        bindMat = dae.ET.SubElement(geoInstance,'bind_material')
-        matTechnique = dae.ET.SubElement(bindMat,'technique_common')
-        for m in D.objects[objectName].material_slots:
-            matInstance = dae.ET.SubElement(matTechnique,'instance_material',symbol = m.name,target='#'+m.name)            
-        writeGeometry(dae,libgeo,objectName)
+def getNodeName(objectName):
+    # The node name carries the HODOR parameters the object keeps as custom
+    #  properties, so it is worked out before the node is written
+    nodeName = objectName
     #Get Navlight Data and change append it into Node name
     if D.objects[objectName].type == 'LAMP':    
         print('Found Lamp '+objectName)
@@ -415,16 +408,16 @@ def writeNodes(dae,parentNode,libgeo,libanims,objectName):
             lampFreq = str(lamp["Freq"])
             lampType = lamp["Type"]
             
-            newName = objectName+'_Type['+lampType+']_Sz['+lampSize+']_Ph['+lampPhase+']_Fr['+lampFreq+']_Col['+lampColorR+','+lampColorG+','+lampColorB+']_Dist['+lampDist+']'
+            lampParams = [('Type',lampType),('Sz',lampSize),('Ph',lampPhase),('Fr',lampFreq),('Col',lampColorR+','+lampColorG+','+lampColorB),('Dist',lampDist)]
             
             if hasattr(lamp,'["Flags"]'):
                 lampFlags = lamp["Flags"]
-                newName = newName+'_Flags['+lampFlags+']'
+                lampParams.append(('Flags',lampFlags))
+            
+            newName = hodor_names.buildName(objectName,lampParams)
             
             print(newName)
-            thisNode.set('id',newName)
-            thisNode.set('name',newName)   
-            thisNode.set('sid',newName)
+            nodeName = newName
             
         elif hasattr(lamp,'["Atten"]'): # Need to pick up on "Atten" to avoid confusion with NavLights -- Dom2
             print('Found BackgroundLight')
@@ -438,12 +431,10 @@ def writeNodes(dae,parentNode,libgeo,libanims,objectName):
             lampAtten = lamp["Atten"]
             lampType = lamp["Type"]
             
-            newName = objectName+'_Type['+lampType+']_Diff['+lampColorR+','+lampColorG+','+lampColorB+']_Spec[0,0,0]_Atten['+lampAtten+']'
+            newName = hodor_names.buildName(objectName,[('Type',lampType),('Diff',lampColorR+','+lampColorG+','+lampColorB),('Spec','0,0,0'),('Atten',lampAtten)])
             
             print(newName)
-            thisNode.set('id',newName)
-            thisNode.set('name',newName)   
-            thisNode.set('sid',newName)
+            nodeName = newName
             
     #Parse Dock Node Data and append to name
     if 'DOCK[' in objectName:
@@ -451,36 +442,33 @@ def writeNodes(dae,parentNode,libgeo,libanims,objectName):
         dockNode = D.objects[objectName]
         if hasattr(dockNode,'["Fam"]'):
             shipFam = dockNode['Fam']
-            newName = objectName+'_Fam['+shipFam+']'
+            dockParams = [('Fam',shipFam)]
             if hasattr(dockNode,'["Link"]'):
                 dockLink = dockNode["Link"]
-                newName = newName+'_Link['+dockLink+']'
+                dockParams.append(('Link',dockLink))
             if hasattr(dockNode,'["Flags"]'):
                 dockFlags = dockNode["Flags"]
-                newName = newName+'_Flags['+dockFlags+']'
+                dockParams.append(('Flags',dockFlags))
             if hasattr(dockNode,'["MAD"]'):
                 dockMAD = str(dockNode["MAD"])
-                newName = newName+'_MAD['+dockMAD+']'
+                dockParams.append(('MAD',dockMAD))
+            newName = hodor_names.buildName(objectName,dockParams)
             
-            thisNode.set('id',newName)
-            thisNode.set('name',newName)
-            thisNode.set('sid',newName)
+            nodeName = newName
      
     #Parse Seg Nodes
     if 'SEG[' in objectName:
         segNode = D.objects[objectName]
         if hasattr(segNode,'["Speed"]'):
-            newName = objectName.split('.')[0]
             segTol = str(int(segNode.empty_draw_size))
             segSpeed = str(segNode["Speed"])
-            newName = newName+'_Tol['+segTol+']_Spd['+segSpeed+']'
+            segParams = [('Tol',segTol),('Spd',segSpeed)]
             if hasattr(segNode,'["Flags"]'):
                 segFlags = segNode["Flags"]
-                newName = newName+'_Flags['+segFlags+']'
+                segParams.append(('Flags',segFlags))
+            newName = hodor_names.buildName(objectName.split('.')[0],segParams)
             
-            thisNode.set('id',newName)
-            thisNode.set('name',newName)
-            thisNode.set('sid',newName)
+            nodeName = newName
     
     #Parse MAT[xxx]_PARAM[yyy] Nodes
     if 'MAT[' in objectName and 'PARAM[' in objectName:
@@ -498,112 +486,143 @@ def writeNodes(dae,parentNode,libgeo,libanims,objectName):
         """
         # If the joint has custom properties, build them into the name
         if len(matPexNode.keys())>1:
-            newName = newName + "_Data["
+            matPexData = []
             for p in matPexNode.keys():
                 print("found parameter " + str(p))
                 if p.startswith("data"):
                     print("it is a data paramter")
-                    if newName.endswith("["):
-                        newName = newName + str(matPexNode[p])
-                    else:
-                        newName = newName + "," + str(matPexNode[p])
-            newName = newName + "]" # Joint name should now be "MAT[xxx]_PARAM[yyy]_Type[RGBA]_Data[i,k,j]"
+                    matPexData.append(str(matPexNode[p]))
+            newName = hodor_names.buildName(newName,[('Data',','.join(matPexData))]) # Joint name should now be "MAT[xxx]_PARAM[yyy]_Type[RGBA]_Data[i,k,j]"
 
-        thisNode.set('id',newName)
-        thisNode.set('name',newName)
-        thisNode.set('sid',newName)
+        nodeName = newName
+    return nodeName
+
+def writeNodes(dae,parentNode,libgeo,libanims,objectName):
+    print("Writing Node for "+objectName)
+    nodeName = getNodeName(objectName)
+    parentNode.start('node',name=nodeName,id=nodeName,sid=nodeName)
+    parentNode.element('translate',str(D.objects[objectName].matrix_local.translation.x)+' '+str(D.objects[objectName].matrix_local.translation.y)+' '+str(D.objects[objectName].matrix_local.translation.z),sid='translate')
+    parentNode.element('rotate','0 0 1 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().z)),sid='rotateZ')
+    parentNode.element('rotate','0 1 0 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().y)),sid='rotateY')
+    parentNode.element('rotate','1 0 0 '+str(math.degrees(D.objects[objectName].matrix_local.to_euler().x)),sid='rotateX')
+    if D.objects[objectName].animation_data is not None:
+        writeAnims(dae,libanims,objectName)
+    if D.objects[objectName].type == 'MESH':
+        parentNode.start('instance_geometry',url='#'+objectName)
+        parentNode.start('bind_material')
+        parentNode.start('technique_common')
+        for m in D.objects[objectName].material_slots:
+            parentNode.element('instance_material',symbol = m.name,target='#'+m.name)
+        parentNode.end()
+        parentNode.end()
+        parentNode.end()
+        writeGeometry(dae,libgeo,objectName)
     
     if D.objects[objectName].children is not None:
         for c in D.objects[objectName].children:
-            writeNodes(dae,thisNode,libgeo,libanims,c.name)
-
-def prettify(element, indent='  '):
-    queue = [(0, element)]  # (level, element)
-    while queue:
-        level, element = queue.pop(0)
-        children = [(level + 1, child) for child in list(element)]
-        if children:
-            element.text = '\n' + indent * (level+1)  # for child open
-        if queue:
-            element.tail = '\n' + indent * queue[0][0]  # for sibling open
-        else:
-            element.tail = '\n' + indent * (level-1)  # for parent close
-        queue[0:0] = children  # prepend so children come before siblings  
-
-
+            writeNodes(dae,parentNode,libgeo,libanims,c.name)
+    parentNode.end()
 
 
 class HwDAE:
-    import xml.etree.ElementTree as ET
     
     
     
     def doExport(self,filepath):
         
-        
-        #Set up Collada Header Stuff
-        print('Writing Root')
-        root = self.ET.Element('COLLADA',version='1.4.1',xmlns = 'http://www.collada.org/2005/11/COLLADASchema')
-        asset = self.ET.SubElement(root,'asset')
-        contributorTag = self.ET.SubElement(asset,'contributor')
-        contribAuthor = self.ET.SubElement(contributorTag,'author')
-        contribAuthor.text = 'Anonymous'
-        contribTool = self.ET.SubElement(contributorTag,'authoring_tool')
-        contribTool.text = 'New Collada Exporter for Blender, by David Lejeune'
-        createdDate = self.ET.SubElement(asset,'created')
-        createdDate.text = time.ctime()
-        modifiedDate = self.ET.SubElement(asset,'modified')
-        modifiedDate.text = time.ctime()
-        units = self.ET.SubElement(asset,'unit',meter='1.0',name='meter')
-        upAxis = self.ET.SubElement(asset,'up_axis')
-        upAxis.text = 'Z_UP'
-
-        #Write the Library Visual Scenes Stuff
-        print('Writing Library Visual Scenes')
-        libScenes = self.ET.SubElement(root,'library_visual_scenes')    
-        thisScene = self.ET.SubElement(libScenes,'visual_scene',id=C.scene.name+'-id',name=C.scene.name)
-        daeScene = self.ET.SubElement(root,'scene')
-        visScene = self.ET.SubElement(daeScene,'instance_visual_scene',url='#'+thisScene.attrib["id"])
-    
-        print('Writing Library Images')
-        libImages = self.ET.SubElement(root,'library_images')
-        print('Writing Library Materials')
-        libMats = self.ET.SubElement(root,'library_materials')
-        print('Writing Library Effects')
-        libEffects = self.ET.SubElement(root,'library_effects')
-        print('Writing Library Geometries')
-        libGeometries = self.ET.SubElement(root,'library_geometries')
-        print('Writing Library Animations')
-        libAnimations = self.ET.SubElement(root,'library_animations')
-    
-        for ob in D.objects:
-            if ob.parent is None:
-                writeNodes(self,thisScene,libGeometries,libAnimations,ob.name)
-    
-        for mat in D.materials:
-            #Set Phong
-            D.materials[mat.name].specular_shader = "PHONG"
-            writeMaterials(self,libMats,libEffects,mat.name)   
-
-        for tex in D.textures:
-            if hasattr(tex,'image'):
-                writeTextures(self,libImages,tex.name)
-        
-        prettify(root)
-        doc = self.ET.ElementTree(root)
-#doc.write('F:\\mymod\\Test.dae',encoding = 'utf-8',xml_declaration=True)
-
         print(filepath)
-        doc.write(filepath,encoding='utf-8',xml_declaration=True)
+        # Written next to filepath and moved over it once complete, so a failed
+        #  export leaves the file that was there alone
+        temp = filepath + "." + str(os.getpid()) + ".tmp"
+        f = open(temp,'w',encoding='utf-8',newline='\n')
+        complete = False
+        # The libraries filled in while the nodes are written are spooled and
+        #  copied in after the visual scene, in the order they always had
+        libImages = dae_writer.Spool(2)
+        libMats = dae_writer.Spool(2)
+        libEffects = dae_writer.Spool(2)
+        libGeometries = dae_writer.Spool(2)
+        libAnimations = dae_writer.Spool(2)
+        try:
+            root = dae_writer.XMLWriter(f)
+            root.declaration()
+            
+            #Set up Collada Header Stuff
+            print('Writing Root')
+            root.start('COLLADA',version='1.4.1',xmlns = 'http://www.collada.org/2005/11/COLLADASchema')
+            root.start('asset')
+            root.start('contributor')
+            root.element('author','Anonymous')
+            root.element('authoring_tool','New Collada Exporter for Blender, by David Lejeune')
+            root.end()
+            root.element('created',time.ctime())
+            root.element('modified',time.ctime())
+            root.element('unit',meter='1.0',name='meter')
+            root.element('up_axis','Z_UP')
+            root.end()
+            
+            #Write the Library Visual Scenes Stuff
+            print('Writing Library Visual Scenes')
+            root.start('library_visual_scenes')
+            root.start('visual_scene',id=C.scene.name+'-id',name=C.scene.name)
+            for ob in D.objects:
+                if ob.parent is None:
+                    writeNodes(self,root,libGeometries,libAnimations,ob.name)
+            root.end()
+            root.end()
+            root.start('scene')
+            root.element('instance_visual_scene',url='#'+C.scene.name+'-id')
+            root.end()
+            
+            for mat in D.materials:
+                #Set Phong
+                D.materials[mat.name].specular_shader = "PHONG"
+                writeMaterials(self,libMats,libEffects,mat.name)   
+
+            for tex in D.textures:
+                if hasattr(tex,'image'):
+                    writeTextures(self,libImages,tex.name)
+            
+            print('Writing Library Images')
+            root.start('library_images')
+            root.copy(libImages)
+            root.end()
+            print('Writing Library Materials')
+            root.start('library_materials')
+            root.copy(libMats)
+            root.end()
+            print('Writing Library Effects')
+            root.start('library_effects')
+            root.copy(libEffects)
+            root.end()
+            print('Writing Library Geometries')
+            root.start('library_geometries')
+            root.copy(libGeometries)
+            root.end()
+            print('Writing Library Animations')
+            root.start('library_animations')
+            root.copy(libAnimations)
+            root.end()
+            root.end()
+            complete = True
+        finally:
+            for spool in (libImages, libMats, libEffects, libGeometries, libAnimations):
+                spool.discard()
+            f.close()
+            if complete:
+                os.replace(temp,filepath)
+            else:
+                os.remove(temp)
     
-    def __init__(self):
+    def __init__(self,digits=0):
         self.data = []
+        self.digits = digits # significant digits of the floats written, 0 writes them exactly
         
     
-def save(filepath): 
+def save(filepath,float_digits=0): 
 
-    thisDAE = HwDAE()
+    thisDAE = HwDAE(float_digits)
    
     thisDAE.doExport(filepath)
     
-    return{'FINISHED'}
\ No newline at end of file
+    return{'FINISHED'}
@@ -0,0 +1,203 @@
+# Texture proxies
+#
+# HWRM texture sheets are mostly 2k-4k TGAs. Rather than have Blender load
+# every one at full size while the import waits, the importer has them cut
+# down to half size here, in worker processes while it builds the
+# geometry. Each proxy is written out as a plain TGA that Blender can load
+# quickly, and kept in the user's cache folder so the next import of the
+# same texture skips the work. That folder outlives the session, unlike
+# the temp folder, as a saved .blend still points at its proxies. The full
+# images are only loaded when asked for (or when the scene is rendered).
+#
+# Walking the packets of a run length encoded TGA is plain Python, so on
+# threads it would hold Blender's GIL for most of the decode; in processes
+# it holds nobody up. The workers are a dae_reader.ReaderPool running this
+# module, started on the first request.
+#
+# Only TGA is decoded here; anything else gets no proxy and is left to
+# Blender's own loader.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import os
+import struct
+import sys
+import hashlib
+import traceback
+
+import numpy as np
+
+def userCacheDir():
+	# Where the OS keeps per-user caches that survive a reboot
+	if sys.platform == "win32":
+		return os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+	if sys.platform == "darwin":
+		return os.path.expanduser("~/Library/Caches")
+	return os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+
+PROXY_DIR = os.path.join(userCacheDir(), "HW_Toolkit", "proxies")
+
+# Proxy images keep the path of their full size image in this custom
+#  property. The importer sets it and the exporter writes that path instead.
+PROXY_PROP = "hw_full_res"
+
+###########
+#Functions#
+###########
+
+def readRLE(data, offset, count, bpp):
+	# TGA run length packets: a header byte, then one pixel repeated or a run of raw pixels.
+	#  Raises ValueError if data ends before count pixels are read.
+	out = bytearray(count * bpp)
+	o = 0
+	end = count * bpp
+	while o < end:
+		if offset >= len(data):
+			raise ValueError("run length data ends after " + str(o // bpp) + " of " + str(count) + " pixels")
+		header = data[offset]
+		offset = offset + 1
+		n = (header & 0x7f) + 1
+		size = bpp if header & 0x80 else n * bpp
+		if offset + size > len(data):
+			raise ValueError("run length data ends after " + str(o // bpp) + " of " + str(count) + " pixels")
+		if header & 0x80:
+			out[o:o + n * bpp] = data[offset:offset + bpp] * n
+		else:
+			out[o:o + n * bpp] = data[offset:offset + n * bpp]
+		offset = offset + size
+		o = o + n * bpp
+	return bytes(out[0:end])
+
+def decodeTGA(path):
+	"""Read a TGA into a (height, width, 4) uint8 BGRA array, bottom row first.
+
+	Handles uncompressed and run length encoded true colour (24 and 32 bit)
+	and greyscale images. Returns None for anything else.
+	"""
+	with open(path, "rb") as f:
+		data = f.read()
+	if len(data) < 18:
+		return None
+	idLength, mapType, imageType = struct.unpack_from("<BBB", data, 0)
+	width, height, depth, descriptor = struct.unpack_from("<HHBB", data, 12)
+	if mapType != 0 or imageType not in (2, 3, 10, 11) or width == 0 or height == 0:
+		return None
+	bpp = depth // 8
+	grey = imageType in (3, 11)
+	if (grey and bpp not in (1, 2)) or (not grey and bpp not in (3, 4)):
+		return None
+
+	offset = 18 + idLength
+	count = width * height
+	if imageType in (10, 11):
+		pixels = readRLE(data, offset, count, bpp)
+	else:
+		pixels = data[offset:offset + count * bpp]
+	if len(pixels) < count * bpp:
+		return None
+	pixels = np.frombuffer(pixels, np.uint8).reshape(height, width, bpp)
+
+	bgra = np.empty((height, width, 4), np.uint8)
+	if grey:
+		bgra[:, :, 0:3] = pixels[:, :, 0:1]
+		bgra[:, :, 3] = pixels[:, :, 1] if bpp == 2 else 255
+	else:
+		bgra[:, :, 0:3] = pixels[:, :, 0:3]
+		bgra[:, :, 3] = pixels[:, :, 3] if bpp == 4 else 255
+
+	# Bottom row first, left to right, whatever the file had
+	if descriptor & 0x20:
+		bgra = bgra[::-1]
+	if descriptor & 0x10:
+		bgra = bgra[:, ::-1]
+	return bgra
+
+def halfSize(pixels):
+	# 2x2 box filter; an odd last row or column is dropped
+	if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+		return pixels
+	height = pixels.shape[0] // 2
+	width = pixels.shape[1] // 2
+	blocks = pixels[0:height * 2, 0:width * 2].reshape(height, 2, width, 2, 4).astype(np.uint16)
+	return ((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8)
+
+def writeTGA(path, bgra):
+	# Uncompressed 32 bit, bottom row first
+	header = struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, bgra.shape[1], bgra.shape[0], 32, 8)
+	with open(path, "wb") as f:
+		f.write(header)
+		f.write(np.ascontiguousarray(bgra).tobytes())
+
+def proxyPath(path, proxy_dir):
+	stat = os.stat(path)
+	key = repr((os.path.abspath(path), stat.st_size, stat.st_mtime))
+	return os.path.join(proxy_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".tga")
+
+def readProxy(path, proxy_dir=PROXY_DIR):
+	"""Make (or find) the half size proxy of the image at path, returning its path or None."""
+	if os.path.splitext(path)[1].lower() != ".tga":
+		return None
+	try:
+		proxy = proxyPath(path, proxy_dir)
+		if os.path.isfile(proxy):
+			return proxy
+		pixels = decodeTGA(path)
+		if pixels is None:
+			return None
+		if not os.path.isdir(proxy_dir):
+			os.makedirs(proxy_dir)
+		# Written under another name and moved into place, so a half written
+		#  proxy is never picked up
+		temp = proxy + "." + str(os.getpid()) + ".tmp"
+		writeTGA(temp, halfSize(pixels))
+		os.replace(temp, proxy)
+		return proxy
+	except (IOError, OSError, ValueError, IndexError, struct.error) as e:
+		print("!- Could not make a proxy of " + path + ": " + str(e))
+		return None
+
+def readProxyJob(job):
+	# Runs in a worker: readProxy() of (path, proxy_dir)
+	return readProxy(*job)
+
+class ProxyDecoder:
+	"""Makes proxies in the processes of pool, each file once.
+
+	pool is a dae_reader.ReaderPool running this module. If it can't do the
+	work, result() makes the proxy here instead.
+	"""
+	def __init__(self, pool, proxy_dir=PROXY_DIR):
+		self.pool = pool
+		self.proxy_dir = proxy_dir
+		self.requests = {} # normcased path -> pending result, or None if the pool would not take it
+
+	def request(self, path):
+		"""Start on path in the pool if it hasn't been."""
+		key = os.path.normcase(os.path.abspath(path))
+		if key not in self.requests:
+			try:
+				self.requests[key] = self.pool.apply_async("readProxyJob", (path, self.proxy_dir))
+			except Exception:
+				traceback.print_exc()
+				self.requests[key] = None
+
+	def result(self, path):
+		"""What readProxy() gives for path, waiting for the pool if need be."""
+		self.request(path)
+		request = self.requests[os.path.normcase(os.path.abspath(path))]
+		if request is not None and self.pool.working():
+			try:
+				return request.get()
+			except Exception:
+				traceback.print_exc()
+		print("!- The proxy pool failed on " + path + ", making the proxy here instead")
+		return readProxy(path, self.proxy_dir)
+
+	def forget(self):
+		# Done with this batch - the proxy files stay for next time
+		self.requests.clear()
+
+	def close(self):
+		# Done with the pool too, until the next request
+		self.requests.clear()
+		self.pool.terminate()
@@ -0,0 +1,134 @@
+# Texture path resolution
+#
+# DAEs point at their textures every which way: absolute, relative with
+# "..", "./", a bare file name, file:// URLs, Windows separators, and with
+# the case of the name rarely matching the file on disk. resolveImagePath()
+# turns an <init_from> into a real file, looking names up in a case-
+# insensitive listing of each folder it has to search. The listings are
+# made once per folder and kept for the session.
+#
+# No bpy in here, so it can be used outside Blender.
+
+import os
+
+from urllib.parse import unquote
+
+# Texture name suffixes the importer swaps for _DIFF, it only uses the diffuse map
+TEXTURE_KINDS = ("DIFX", "GLOW", "GLOX", "NORM", "PAIN", "REFL", "REFX", "SPEC", "SPEX", "STRP", "TEAM")
+
+###########
+#Functions#
+###########
+
+def diffName(name):
+	# IMG[xxx_GLOW] -> IMG[xxx_DIFF]
+	for kind in TEXTURE_KINDS:
+		name = name.replace("_" + kind + "]", "_DIFF]")
+	return name
+
+def diffFileName(fileName):
+	# Sometimes the <image> is not the DIFF (e.g. Kad_Swarmer)... xxx_GLOW.tga -> xxx_DIFF.tga
+	if "DIFF" in fileName.upper():
+		return fileName
+	return fileName[0:len(fileName)-8] + "DIFF" + ".tga"
+
+def initPath(text):
+	# <init_from> text to a plain path with "/" separators
+	path = text.strip()
+	if path.lower().startswith("file:"):
+		path = unquote(path[len("file:"):])
+		# file:///C:/x, file:///home/x and file://./x
+		if path.startswith("///"):
+			path = path[2:]
+			if len(path) > 2 and path[2] == ":":
+				path = path[1:]
+		elif path.startswith("//"):
+			path = path[2:]
+	return path.replace("\\", "/")
+
+def isAbsolute(path):
+	# Windows drive paths are absolute whatever OS Blender is running on
+	return os.path.isabs(path) or (len(path) > 1 and path[1] == ":")
+
+class TextureIndex:
+	"""Case-insensitive listings of texture folders, made on first use."""
+	def __init__(self):
+		self.folders = {} # normcased folder -> {lower case file name: file name}
+		self.subfolders = {} # normcased folder -> [sub folder paths]
+
+	def listing(self, folder):
+		key = os.path.normcase(os.path.abspath(folder))
+		if key not in self.folders:
+			files = {}
+			try:
+				for name in os.listdir(folder):
+					files.setdefault(name.lower(), name)
+			except OSError:
+				pass
+			self.folders[key] = files
+		return self.folders[key]
+
+	def find(self, path):
+		"""The file on disk path refers to, ignoring case, or None."""
+		if os.path.isfile(path):
+			return path
+		folder, name = os.path.split(path)
+		# The folders on the way may be in the wrong case too
+		if folder and not os.path.isdir(folder):
+			folder = self.find(folder.rstrip("/\\"))
+			if folder is None:
+				return None
+		found = self.listing(folder or ".").get(name.lower())
+		if found is None:
+			return None
+		return os.path.join(folder, found)
+
+	def findNear(self, folder, name):
+		# name in folder or one of the folders directly under it (a ship's
+		#  DAE often sits next to the folder with its textures)
+		found = self.find(os.path.join(folder, name))
+		if found is not None:
+			return found
+		key = os.path.normcase(os.path.abspath(folder))
+		if key not in self.subfolders:
+			subfolders = []
+			for entry in sorted(self.listing(folder).values()):
+				if os.path.isdir(os.path.join(folder, entry)):
+					subfolders.append(os.path.join(folder, entry))
+			self.subfolders[key] = subfolders
+		for subfolder in self.subfolders[key]:
+			found = self.listing(subfolder).get(name.lower())
+			if found is not None:
+				return os.path.join(subfolder, found)
+		return None
+
+	def clear(self):
+		self.folders.clear()
+		self.subfolders.clear()
+
+# Kept for the session, see TextureIndex
+index = TextureIndex()
+
+def resolveImagePath(DAEPath, text, diffuse=True):
+	"""Find the image file an <init_from> of a DAE in the folder DAEPath means.
+
+	The path is normalised against DAEPath (unless it is absolute), switched
+	to the _DIFF texture if diffuse is set, then looked up without regard to
+	case. If that finds nothing the file name alone is looked for in DAEPath
+	and the folders directly under it.
+	Returns (path, found); path is the normalised guess when found is False.
+	"""
+	path = initPath(text)
+	if not isAbsolute(path):
+		path = os.path.join(DAEPath, path)
+	path = os.path.normpath(path)
+	if diffuse:
+		folder, name = os.path.split(path)
+		path = os.path.join(folder, diffFileName(name))
+
+	found = index.find(path)
+	if found is None:
+		found = index.findNear(DAEPath, os.path.basename(path))
+	if found is None:
+		return path, False
+	return os.path.normpath(found), True
@@ -0,0 +1,61 @@
+# Animation channel decoding and tangent conversion, outside Blender
+
+import math
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_anims
+
+def animation(inTangents, outTangents):
+	return ET.fromstring("""<animation xmlns="http://www.collada.org/2005/11/COLLADASchema" id="JNT-rotateZ">
+  <source id="JNT-rotateZ-input"><float_array id="i" count="3">0 1 2</float_array></source>
+  <source id="JNT-rotateZ-output"><float_array id="o" count="3">0 90 45</float_array></source>
+  <source id="JNT-rotateZ-interpolation"><Name_array id="n" count="3">BEZIER STEP LINEAR</Name_array></source>
+  <source id="JNT-rotateZ-intan"><float_array id="t0" count="6">""" + inTangents + """</float_array></source>
+  <source id="JNT-rotateZ-outtan"><float_array id="t1" count="6">""" + outTangents + """</float_array></source>
+  <sampler id="JNT-rotateZ-sampler">
+    <input semantic="INPUT" source="#JNT-rotateZ-input"/>
+    <input semantic="OUTPUT" source="#JNT-rotateZ-output"/>
+    <input semantic="INTERPOLATION" source="#JNT-rotateZ-interpolation"/>
+    <input semantic="IN_TANGENT" source="#JNT-rotateZ-intan"/>
+    <input semantic="OUT_TANGENT" source="#JNT-rotateZ-outtan"/>
+  </sampler>
+  <channel source="#JNT-rotateZ-sampler" target="JNT[Turret]/rotateZ.ANGLE"/>
+</animation>""")
+
+class AnimationTest(unittest.TestCase):
+	def test_decode(self):
+		anim = dae_anims.decodeAnimation(animation("-0.3 0 0.7 90 1.7 45", "0.3 0 1.3 90 2.3 45"))
+		self.assertEqual((anim.target, anim.channel), ("JNT[Turret]", "rotateZ.ANGLE"))
+		self.assertEqual(anim.blenderPath(), ("rotation_euler", 2))
+		np.testing.assert_array_equal(anim.times, [0, 1, 2])
+		np.testing.assert_array_equal(anim.values, [0, 90, 45])
+		self.assertEqual(anim.interpolations, ["BEZIER", "CONSTANT", "LINEAR"])
+		self.assertEqual(anim.inTangents.shape, (3, 2))
+
+	def test_no_samples(self):
+		empty = ET.fromstring("<animation xmlns=\"http://www.collada.org/2005/11/COLLADASchema\" id=\"JNT\"/>")
+		self.assertIsNone(dae_anims.decodeAnimation(empty))
+
+	def test_collada_tangents(self):
+		# x in seconds, y in degrees: converted to frames and radians
+		anim = dae_anims.decodeAnimation(animation("-0.3 0 0.7 90 1.7 45", "0.3 0 1.3 90 2.3 45"))
+		inTangents, outTangents = dae_anims.tangentsToFrames(anim, 24, math.pi / 180)
+		np.testing.assert_allclose(inTangents[:, 0], [-7.2, 16.8, 40.8])
+		np.testing.assert_allclose(outTangents[:, 1], [0, math.pi / 2, math.pi / 4])
+
+	def test_blender_handles(self):
+		# Written by the exporter as Blender has them: left as they are
+		anim = dae_anims.decodeAnimation(animation("-7 0 17 1.5 41 0.7", "7 0 31 1.5 55 0.7"))
+		inTangents, outTangents = dae_anims.tangentsToFrames(anim, 24, math.pi / 180)
+		self.assertIs(inTangents, anim.inTangents)
+		self.assertIs(outTangents, anim.outTangents)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,99 @@
+# Welding, split normals and polygon triangulation, outside Blender
+
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_arrays
+
+def quad(normals):
+	# Two triangles over the unit square, sharing the 0-2 diagonal, as a
+	#  MeshData with one row per corner (nothing welded yet)
+	square = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], np.float32)
+	corners = np.array([0, 1, 2, 0, 2, 3], np.int32)
+	uvs = square[corners][:, 0:2]
+	return dae_arrays.MeshData(square[corners], np.arange(6, dtype=np.int32), np.array(normals, np.float32), [uvs], np.zeros(2, np.int32), ["M"])
+
+class WeldTest(unittest.TestCase):
+	def test_shared_edge(self):
+		welded = dae_arrays.weldVertices(quad([[0, 0, 1]] * 6))
+		self.assertEqual(len(welded.positions), 4)
+		self.assertEqual(welded.loopVerts.tolist(), [0, 1, 2, 0, 2, 3])
+
+	def test_hard_edge(self):
+		# The two triangles disagree on the normal along the diagonal, so its
+		#  ends stay two vertices each
+		welded = dae_arrays.weldVertices(quad([[0, 0, 1]] * 3 + [[0, 1, 0]] * 3))
+		self.assertEqual(len(welded.positions), 6)
+
+	def test_uv_seam(self):
+		meshData = quad([[0, 0, 1]] * 6)
+		meshData.loopUVs[0][3] = (0.5, 0.5)
+		self.assertEqual(len(dae_arrays.weldVertices(meshData).positions), 5)
+
+	def test_within_tolerance(self):
+		meshData = quad([[0, 0, 1]] * 6)
+		meshData.positions[3] = meshData.positions[3] + 0.00001
+		self.assertEqual(len(dae_arrays.weldVertices(meshData, 0.0001).positions), 4)
+
+	def test_collapsed_triangle_dropped(self):
+		meshData = quad([[0, 0, 1]] * 6)
+		meshData.positions[4] = meshData.positions[3] # the second triangle is now a line
+		meshData.loopUVs[0][4] = meshData.loopUVs[0][3]
+		welded = dae_arrays.weldVertices(meshData)
+		self.assertEqual(len(welded.loopVerts), 3)
+		self.assertEqual(len(welded.positions), 3)
+		self.assertEqual(len(welded.triMaterials), 1)
+
+class SplitNormalsTest(unittest.TestCase):
+	def test_shared_edge_per_vertex(self):
+		normals, perVertex = dae_arrays.splitNormals(dae_arrays.weldVertices(quad([[0, 0, 2]] * 6)))
+		self.assertTrue(perVertex)
+		self.assertEqual(normals.shape, (4, 3))
+		np.testing.assert_allclose(normals, [[0, 0, 1]] * 4)
+
+	def test_hard_edge_per_loop(self):
+		# Welded by position only, so the corners of a vertex disagree
+		meshData = quad([[0, 0, 1]] * 3 + [[0, 1, 0]] * 3)
+		welded = dae_arrays.weldVertices(dae_arrays.MeshData(meshData.positions, meshData.loopVerts, None, [], meshData.triMaterials, meshData.materials))
+		welded.loopNormals = meshData.loopNormals
+		normals, perVertex = dae_arrays.splitNormals(welded)
+		self.assertFalse(perVertex)
+		np.testing.assert_allclose(normals, meshData.loopNormals)
+
+	def test_bad_normals_repaired(self):
+		normals, perVertex = dae_arrays.splitNormals(quad([[0, 0, 0], [np.nan, 0, 0]] + [[0, 0, 1]] * 4))
+		self.assertTrue(np.isfinite(normals).all())
+		np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1.0, rtol=1e-6)
+		np.testing.assert_allclose(normals[0:2], [[0, 0, 1], [0, 0, 1]], atol=1e-6)
+
+class PolygonTest(unittest.TestCase):
+	def test_fan(self):
+		corners = np.arange(12).reshape(-1, 1)
+		tris = dae_arrays.fanTriangulate(np.array([4, 3, 5]), corners)
+		self.assertEqual(tris.ravel().tolist(), [0, 1, 2, 0, 2, 3, 4, 5, 6, 7, 8, 9, 7, 9, 10, 7, 10, 11])
+
+	def test_fan_cut_short(self):
+		# The last polygon runs past the soup, and one has too few corners
+		tris = dae_arrays.fanTriangulate(np.array([3, 2, 4]), np.arange(7).reshape(-1, 1))
+		self.assertEqual(tris.ravel().tolist(), [0, 1, 2])
+
+	def polygons(self, body):
+		return ET.fromstring("<polygons xmlns=\"http://www.collada.org/2005/11/COLLADASchema\" material=\"M\">"
+			+ "<input semantic=\"VERTEX\" offset=\"0\"/><input semantic=\"NORMAL\" offset=\"1\"/>" + body + "</polygons>")
+
+	def test_polygons_with_hole(self):
+		tris = dae_arrays.decodePolygons(self.polygons("<p>0 0 1 1 2 2 3 3</p><ph><p>4 4 5 5 6 6</p><h>7 7 8 8 9 9</h></ph>"))
+		self.assertEqual(tris.indices[:, 0].tolist(), [0, 1, 2, 0, 2, 3, 4, 5, 6])
+
+	def test_polygons_bad_stride(self):
+		with self.assertRaises(ValueError):
+			dae_arrays.decodePolygons(self.polygons("<p>0 0 1 1 2 2</p><p>3 3 4 5 5</p>"))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,84 @@
+# The decoded DAE cache on disk and in memory, outside Blender
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_cache
+
+class DiskCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.cache_dir = os.path.join(self.dir, "cache")
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_store_load(self):
+		arrays = {"positions": np.arange(12, dtype=np.float32).reshape(-1, 3), "indices": np.arange(6, dtype=np.int32)}
+		dae_cache.store("abc", {"geometries": ["A"]}, arrays, self.cache_dir)
+		description, back = dae_cache.load("abc", self.cache_dir)
+		self.assertEqual(description, {"geometries": ["A"], "version": dae_cache.CACHE_VERSION})
+		self.assertEqual(sorted(back), ["indices", "positions"])
+		np.testing.assert_array_equal(back["positions"], arrays["positions"])
+		self.assertEqual(back["indices"].dtype, np.int32)
+		self.assertIsNone(dae_cache.load("missing", self.cache_dir))
+		self.assertEqual([name for name in os.listdir(self.cache_dir) if name.endswith(".tmp")], [])
+
+	def test_evict_oldest(self):
+		arrays = {"data": np.zeros(1000, np.float64)}
+		for n, key in enumerate(["a", "b", "c"]):
+			dae_cache.store(key, {}, arrays, self.cache_dir)
+			os.utime(dae_cache.entryPath(key, self.cache_dir), (1000 + n, 1000 + n))
+		# loading "a" makes it the most recently used
+		self.assertIsNotNone(dae_cache.load("a", self.cache_dir))
+		size = os.path.getsize(dae_cache.entryPath("a", self.cache_dir))
+		dae_cache.evict(self.cache_dir, size * 2)
+		self.assertEqual(sorted(os.listdir(self.cache_dir)), ["a.npz", "c.npz"])
+		dae_cache.clear(self.cache_dir)
+		self.assertEqual(os.listdir(self.cache_dir), [])
+
+	def test_file_key(self):
+		path = os.path.join(self.dir, "ship.dae")
+		with open(path, "w") as f:
+			f.write("<COLLADA/>")
+		key = dae_cache.fileKey(path, (0.0001, False))
+		self.assertEqual(key, dae_cache.fileKey(path, (0.0001, False)))
+		self.assertNotEqual(key, dae_cache.fileKey(path, (0.0001, True)))
+		with open(path, "w") as f:
+			f.write("<COLLADA />")
+		stat = os.stat(path)
+		os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+		self.assertNotEqual(key, dae_cache.fileKey(path, (0.0001, False)))
+
+class MemoryCacheTest(unittest.TestCase):
+	def test_least_recently_used_out(self):
+		cache = dae_cache.MemoryCache(limit=100)
+		cache.put("a", "A", 40)
+		cache.put("b", "B", 40)
+		self.assertEqual(cache.get("a"), "A")
+		cache.put("c", "C", 40)
+		self.assertIsNone(cache.get("b"))
+		self.assertEqual((cache.get("a"), cache.get("c")), ("A", "C"))
+		self.assertEqual(cache.total, 80)
+
+	def test_replace_and_limits(self):
+		cache = dae_cache.MemoryCache(limit=100)
+		cache.put("a", "A", 40)
+		cache.put("a", "A2", 50)
+		self.assertEqual((cache.get("a"), cache.total), ("A2", 50))
+		# too big to keep at all, and no key for a missing file
+		cache.put("big", "BIG", 101)
+		self.assertIsNone(cache.get("big"))
+		self.assertIsNone(cache.key(os.path.join(tempfile.gettempdir(), "no such file.dae"), ()))
+		cache.clear()
+		self.assertEqual((len(cache.entries), cache.total), (0, 0))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,187 @@
+# Reading DAEs with and without the reader pool, outside Blender
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_reader
+
+import dae_scene
+
+from test_dae_stream import DAE
+
+# Y up, with the scene after the geometries. "Hidden" is named like any
+#  other geometry, so only the scene says the filter drops it - and its
+#  positions don't decode, so it had better not be read.
+FILTERED_DAE = """<?xml version="1.0" encoding="utf-8"?>
+<COLLADA xmlns="http://www.collada.org/2005/11/COLLADASchema" version="1.4.1">
+  <asset><up_axis>Y_UP</up_axis></asset>
+  <library_geometries>
+    <geometry id="Hidden" name="Hidden">
+      <mesh>
+        <source id="Hidden-positions"><float_array id="Hidden-positions-array" count="3">not a float</float_array></source>
+        <vertices id="Hidden-vertices"><input semantic="POSITION" source="#Hidden-positions"/></vertices>
+        <triangles count="1"><input semantic="VERTEX" source="#Hidden-vertices" offset="0"/><p>0 0 0</p></triangles>
+      </mesh>
+    </geometry>
+    <geometry id="Hull-LOD1" name="MULT[Hull]_LOD[1]">
+      <mesh>
+        <source id="Hull-positions"><float_array id="Hull-positions-array" count="9">0 0 0 1 0 0 0 1 0</float_array></source>
+        <vertices id="Hull-vertices"><input semantic="POSITION" source="#Hull-positions"/></vertices>
+        <triangles count="1"><input semantic="VERTEX" source="#Hull-vertices" offset="0"/><p>0 1 2</p></triangles>
+      </mesh>
+    </geometry>
+  </library_geometries>
+  <library_visual_scenes>
+    <visual_scene id="Scene">
+      <node name="ROOT_LOD[0]"><rotate sid="rotateX">1 0 0 0</rotate></node>
+      <node name="ROOT_LOD[1]"><node name="MULT[Hull]_LOD[1]"><instance_geometry url="#Hull-LOD1"/></node></node>
+      <node name="ROOT_COL"><node name="Hidden"><instance_geometry url="#Hidden"/></node></node>
+    </visual_scene>
+  </library_visual_scenes>
+</COLLADA>
+"""
+
+class ReaderPoolTest(unittest.TestCase):
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".dae")
+		with os.fdopen(handle, "w") as f:
+			f.write(DAE)
+		# Every geometry goes to the pool, however small
+		self.jobSize = dae_reader.GEOMETRY_JOB_SIZE
+		dae_reader.GEOMETRY_JOB_SIZE = 0
+
+	def tearDown(self):
+		dae_reader.GEOMETRY_JOB_SIZE = self.jobSize
+		os.remove(self.path)
+
+	def assertSameGeometries(self, contents, expected):
+		self.assertEqual([g[0:2] for g in contents.geometries], [g[0:2] for g in expected.geometries])
+		for (id, name, a), (id, name, b) in zip(contents.geometries, expected.geometries):
+			np.testing.assert_array_equal(a.positions, b.positions)
+			np.testing.assert_array_equal(a.loopVerts, b.loopVerts)
+			self.assertEqual(a.materials, b.materials)
+
+	def test_pool(self):
+		expected = dae_reader.readDAE(self.path)
+		pool = dae_reader.ReaderPool(2, None)
+		try:
+			self.assertSameGeometries(dae_reader.readDAE(self.path, pool=pool), expected)
+			self.assertTrue(pool.working())
+		finally:
+			pool.terminate()
+
+	def test_pool_does_not_start(self):
+		expected = dae_reader.readDAE(self.path)
+		pool = dae_reader.ReaderPool(1, os.path.join(tempfile.gettempdir(), "no such python"))
+		timeout = dae_reader.STARTUP_TIMEOUT
+		dae_reader.STARTUP_TIMEOUT = 2
+		try:
+			self.assertSameGeometries(dae_reader.readDAE(self.path, pool=pool), expected)
+		finally:
+			dae_reader.STARTUP_TIMEOUT = timeout
+			pool.terminate()
+
+	def test_worker_fails(self):
+		class Failed:
+			def get(self):
+				raise EOFError("the worker died")
+		class FailingPool:
+			def apply_async(self, name, job):
+				return Failed()
+			def working(self):
+				return True
+		self.assertSameGeometries(dae_reader.readDAE(self.path, pool=FailingPool()), dae_reader.readDAE(self.path))
+
+	def test_several_files(self):
+		results = list(dae_reader.readDAEs([self.path, self.path], processes=2))
+		self.assertEqual([error for path, result, error in results], [None, None])
+		self.assertSameGeometries(results[1][1], dae_reader.readDAE(self.path))
+
+class ReadAheadTest(unittest.TestCase):
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".dae")
+		with os.fdopen(handle, "w") as f:
+			f.write(DAE)
+		self.readerPool = dae_reader.ReaderPool
+
+	def tearDown(self):
+		dae_reader.ReaderPool = self.readerPool
+		os.remove(self.path)
+
+	def test_pool_reads_ahead_one_file_per_process(self):
+		submitted = []
+		class Done:
+			def __init__(self, job):
+				self.job = job
+			def get(self):
+				return dae_reader.readJobPacked(self.job)
+		class CountingPool:
+			def __init__(self, processes, executable):
+				self.processes = processes
+			def working(self):
+				return True
+			def apply_async(self, name, job):
+				submitted.append(job)
+				return Done(job)
+			def terminate(self):
+				pass
+		dae_reader.ReaderPool = CountingPool
+		jobs = [(self.path, 0.0001, False, None, dae_scene.ImportFilter().key(), False)] * 5
+		results = dae_reader.readJobs(jobs, None, 2)
+		self.assertIsNone(next(results)[2])
+		# the two to start with, and one more for the file taken
+		self.assertEqual(len(submitted), 3)
+		self.assertEqual(len(list(results)), 4)
+		self.assertEqual(len(submitted), 5)
+
+	def test_background_reader_waits(self):
+		made = []
+		def results():
+			for n in range(0, 10):
+				made.append(n)
+				yield n
+		reader = dae_reader.BackgroundReader(results())
+		time.sleep(0.3)
+		# one waiting to be taken, and one the thread is holding
+		self.assertLessEqual(len(made), 2)
+		self.assertEqual(next(reader), 0)
+		reader.close()
+		reader.thread.join(5)
+		self.assertFalse(reader.thread.is_alive())
+
+class FilteredReadTest(unittest.TestCase):
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".dae")
+		with os.fdopen(handle, "w") as f:
+			f.write(FILTERED_DAE)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def test_scene_read_first(self):
+		contents = dae_reader.readDAE(self.path, importFilter=dae_scene.ImportFilter(lods=[1], collision=False), raw=True)
+		self.assertEqual([g[0] for g in contents.geometries], ["Hull-LOD1"])
+		self.assertEqual([node.name for node in contents.scenes[0]], ["ROOT_LOD[1]", "MULT[Hull]_LOD[1]"])
+
+	def test_y_up_without_root_lod0(self):
+		# ROOT_LOD[0] is filtered out, but still says the scene needs turning
+		contents = dae_reader.readDAE(self.path, importFilter=dae_scene.ImportFilter(lods=[1], collision=False))
+		self.assertTrue(contents.y_up)
+		description, arrays = dae_reader.packResult(contents, False)
+		self.assertTrue(dae_reader.unpackResult(description, arrays, False).y_up)
+
+	def test_y_up_needs_rotate_x(self):
+		with open(self.path, "w") as f:
+			f.write(FILTERED_DAE.replace("<rotate sid=\"rotateX\">1 0 0 0</rotate>", ""))
+		self.assertFalse(dae_reader.readDAE(self.path, importFilter=dae_scene.ImportFilter(lods=[1], collision=False)).y_up)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,89 @@
+# Node flattening, filtering and parenting, outside Blender
+
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_scene
+
+SCENE = """<visual_scene xmlns="http://www.collada.org/2005/11/COLLADASchema" id="Scene">
+  <node name="ROOT_LOD[0]">
+    <translate>1 2 3</translate>
+    <rotate sid="rotateZ">0 0 1 90</rotate>
+    <rotate>0 0 1 45</rotate>
+    <rotate sid="rotateX">1 0 0 -90</rotate>
+    <node name="MULT[Hull]_LOD[0]"><instance_geometry url="#Hull-LOD0"/></node>
+    <node name="MULT[Gone]_LOD[0]"><instance_geometry url="#Gone"/>
+      <node name="JNT[UnderGone]"/>
+    </node>
+    <node name="NAVL[Red]_Type[default]">
+      <node name="SUB_PARAMS"><node name="Ph[0.5]"/></node>
+    </node>
+  </node>
+  <node name="ROOT_LOD[1]">
+    <node name="MULT[Hull]_LOD[1]"><instance_geometry url="#Hull-LOD1"/></node>
+  </node>
+  <node name="ROOT_COL">
+    <node name="COL[Root]"><instance_geometry url="#Col"/></node>
+  </node>
+  <node name="HOLD_LITE"><node name="LITE[Sun]_Type[directional]"/></node>
+</visual_scene>"""
+
+def names(nodes):
+	return [node.name for node in nodes]
+
+class SceneTest(unittest.TestCase):
+	def setUp(self):
+		self.nodes = dae_scene.readNodes(ET.fromstring(SCENE))
+
+	def test_read_nodes(self):
+		self.assertEqual(names(self.nodes), ["ROOT_LOD[0]", "MULT[Hull]_LOD[0]", "MULT[Gone]_LOD[0]", "JNT[UnderGone]",
+			"NAVL[Red]_Type[default]", "SUB_PARAMS", "Ph[0.5]", "ROOT_LOD[1]", "MULT[Hull]_LOD[1]", "ROOT_COL", "COL[Root]",
+			"HOLD_LITE", "LITE[Sun]_Type[directional]"])
+		self.assertEqual([node.parent for node in self.nodes], [-1, 0, 0, 2, 0, 4, 5, -1, 7, -1, 9, -1, 11])
+		self.assertEqual(self.nodes[0].children, [1, 2, 4])
+		root = self.nodes[0]
+		self.assertEqual(root.location, [1.0, 2.0, 3.0])
+		# the <rotate> without a sid is skipped
+		self.assertEqual(root.rotation, [-90.0, 0.0, 90.0])
+		self.assertEqual([node.kind for node in self.nodes[0:5]], ["joint", "mesh", "mesh", "joint", "navl"])
+		self.assertEqual(dae_scene.subParams(self.nodes, 4), ["Ph[0.5]"])
+
+	def test_unrotated_root(self):
+		# ROOT_LOD[0] is turned by -90 about X, which counts as unturned
+		self.assertTrue(dae_scene.unrotatedRoot(ET.fromstring(SCENE)))
+		self.assertFalse(dae_scene.unrotatedRoot(ET.fromstring(SCENE.replace("1 0 0 -90", "1 0 0 90"))))
+		# no rotateX at all says nothing
+		self.assertFalse(dae_scene.unrotatedRoot(ET.fromstring(SCENE.replace("sid=\"rotateX\"", ""))))
+
+	def test_resolve_hierarchy(self):
+		pairs = dae_scene.resolveHierarchy(self.nodes, {"Hull-LOD0": "Hull", "Hull-LOD1": "Hull.001", "Col": "Col"})
+		# nothing under the mesh that wasn't made, or under the nav light
+		self.assertEqual(pairs, [(1, 0), (4, 0), (8, 7), (10, 9), (12, 11)])
+		self.assertEqual(self.nodes[12].kind, "lite")
+
+	def test_filter_lods(self):
+		importFilter = dae_scene.ImportFilter(lods=["1"], collision=False)
+		self.assertEqual(importFilter.key(), ((1,), False, True, True, True))
+		self.assertFalse(importFilter.everything())
+		filtered = dae_scene.filterNodes(self.nodes, importFilter)
+		self.assertEqual(names(filtered), ["ROOT_LOD[1]", "MULT[Hull]_LOD[1]", "HOLD_LITE", "LITE[Sun]_Type[directional]"])
+		self.assertEqual([node.parent for node in filtered], [-1, 0, -1, 2])
+		self.assertEqual(filtered[0].children, [1])
+		self.assertTrue(importFilter.geometryWanted("Hull-LOD1"))
+		self.assertFalse(importFilter.geometryWanted("MULT[Hull]_LOD[0]"))
+		self.assertFalse(importFilter.geometryWanted("COL[Root]"))
+
+	def test_filter_background(self):
+		filtered = dae_scene.filterNodes(self.nodes, dae_scene.ImportFilter(background=False))
+		# nav lights are part of the ship, not the background
+		self.assertEqual(names(filtered), names(self.nodes)[0:-2])
+
+	def test_no_filter(self):
+		self.assertIs(dae_scene.filterNodes(self.nodes, dae_scene.ImportFilter()), self.nodes)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,144 @@
+# The raw scan against plain ElementTree, outside Blender
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_arrays
+import dae_stream
+
+DAEGeo = "{http://www.collada.org/2005/11/COLLADASchema}geometry"
+DAEimage = "{http://www.collada.org/2005/11/COLLADASchema}image"
+DAELibImages = "{http://www.collada.org/2005/11/COLLADASchema}library_images"
+
+# Comments holding tags the scan looks for, empty <p>s, <ph> and <polylist>
+DAE = """<?xml version="1.0" encoding="utf-8"?>
+<COLLADA xmlns="http://www.collada.org/2005/11/COLLADASchema" version="1.4.1">
+  <!-- <p>9 9 9</p> and <float_array id="x" count="1">7</float_array> in a comment -->
+  <library_geometries>
+    <geometry id="A" name="A">
+      <mesh>
+        <source id="A-positions">
+          <float_array id="A-positions-array" count="15">0 0 0 1 0 0 1 1 0 0 1 0 0.5 2.25 -1e-3</float_array>
+          <technique_common><accessor source="#A-positions-array" count="5" stride="3"/></technique_common>
+        </source>
+        <source id="A-normals">
+          <float_array id="A-normals-array" count="3">0 0 1</float_array>
+          <technique_common><accessor source="#A-normals-array" count="1" stride="3"/></technique_common>
+        </source>
+        <source id="A-uvs">
+          <float_array id="A-uvs-array" count="0"/>
+          <technique_common><accessor source="#A-uvs-array" count="0" stride="2"/></technique_common>
+        </source>
+        <vertices id="A-vertices"><input semantic="POSITION" source="#A-positions"/></vertices>
+        <triangles material="M0" count="1">
+          <input semantic="VERTEX" source="#A-vertices" offset="0"/>
+          <input semantic="NORMAL" source="#A-normals" offset="1"/>
+          <p>0 0 1 0 2 0</p>
+        </triangles>
+        <triangles material="M1" count="0">
+          <input semantic="VERTEX" source="#A-vertices" offset="0"/>
+          <p/>
+        </triangles>
+        <!-- <p>5 5 5</p> -->
+        <polygons material="M2" count="3">
+          <input semantic="VERTEX" source="#A-vertices" offset="0"/>
+          <input semantic="NORMAL" source="#A-normals" offset="1"/>
+          <p>0 0 1 0 2 0 3 0</p>
+          <p></p>
+          <ph><p>0 0 2 0 4 0</p><h>1 0 2 0 3 0</h></ph>
+        </polygons>
+        <polylist material="M3" count="2">
+          <input semantic="VERTEX" source="#A-vertices" offset="0"/>
+          <vcount>4 3</vcount>
+          <p>0 1 2 3 2 3 4</p>
+        </polylist>
+      </mesh>
+    </geometry>
+    <geometry id="B" name="B">
+      <mesh>
+        <source id="B-positions">
+          <float_array id="B-positions-array" count="9">3 3 3 4 4 4 5 5 5</float_array>
+          <technique_common><accessor source="#B-positions-array" count="3" stride="3"/></technique_common>
+        </source>
+        <vertices id="B-vertices"><input semantic="POSITION" source="#B-positions"/></vertices>
+        <triangles material="M0" count="1">
+          <input semantic="VERTEX" source="#B-vertices" offset="0"/>
+          <p>2 1 0</p>
+        </triangles>
+      </mesh>
+    </geometry>
+  </library_geometries>
+</COLLADA>
+"""
+
+def readGeometries(path, raw):
+	return [dae_arrays.decodeGeometry(elem) for tag, elem in dae_stream.iterDAE(path, (DAEGeo,), raw=raw)]
+
+class RawScanTest(unittest.TestCase):
+	def setUp(self):
+		handle, self.path = tempfile.mkstemp(suffix=".dae")
+		with os.fdopen(handle, "w") as f:
+			f.write(DAE)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def test_same_as_elementtree(self):
+		plain = readGeometries(self.path, False)
+		raw = readGeometries(self.path, True)
+		self.assertEqual([g.id for g in raw], ["A", "B"])
+		for a, b in zip(plain, raw):
+			np.testing.assert_array_equal(a.positions, b.positions)
+			np.testing.assert_array_equal(a.normals, b.normals)
+			self.assertEqual(len(a.uvs), len(b.uvs))
+			self.assertEqual([t.material for t in a.triangles], [t.material for t in b.triangles])
+			for s, t in zip(a.triangles, b.triangles):
+				np.testing.assert_array_equal(s.indices, t.indices)
+
+	def test_contents(self):
+		a = readGeometries(self.path, True)[0]
+		self.assertEqual(a.positions.shape, (5, 3))
+		self.assertAlmostEqual(float(a.positions[4, 2]), -0.001)
+		# the empty <triangles> is dropped, the comments add nothing
+		self.assertEqual([t.material for t in a.triangles], ["M0", "M2", "M3"])
+		self.assertEqual(a.triangles[1].indices[:, 0].tolist(), [0, 1, 2, 0, 2, 3, 0, 2, 4])
+		self.assertEqual(a.triangles[2].indices[:, 0].tolist(), [0, 1, 2, 0, 2, 3, 2, 3, 4])
+
+	def test_merge_set_without_normals(self):
+		# M3 has no NORMAL input, so its corners get zero normals rather
+		#  than indexing the normals with vertex indices
+		a = readGeometries(self.path, True)[0]
+		self.assertIsNone(a.triangles[2].normOffset)
+		meshData = dae_arrays.mergeTriangleSets(a)
+		self.assertEqual(meshData.loopNormals.shape, (len(meshData.loopVerts), 3))
+		np.testing.assert_array_equal(meshData.loopNormals[0:12], [[0, 0, 1]] * 12)
+		np.testing.assert_array_equal(meshData.loopNormals[12:], np.zeros((9, 3)))
+		normals, perVertex = dae_arrays.splitNormals(meshData)
+		self.assertTrue(np.isfinite(normals).all())
+
+	def test_images_under_library(self):
+		with open(self.path, "w") as f:
+			f.write("<COLLADA xmlns=\"http://www.collada.org/2005/11/COLLADASchema\">"
+				+ "<library_images><image id=\"lib\"/></library_images>"
+				+ "<library_effects><effect id=\"fx\"><profile_COMMON><image id=\"fx-image\"/></profile_COMMON></effect></library_effects>"
+				+ "</COLLADA>")
+		for raw in (False, True):
+			self.assertEqual([e.attrib["id"] for t, e in dae_stream.iterDAE(self.path, (DAEimage,), raw=raw)], ["lib", "fx-image"])
+			images = dae_stream.iterDAE(self.path, (DAEimage,), raw=raw, under={DAEimage: DAELibImages})
+			self.assertEqual([e.attrib["id"] for t, e in images], ["lib"])
+
+	def test_element_spans(self):
+		root, spans = dae_stream.elementSpans(self.path, "geometry")
+		self.assertEqual(len(spans), 2)
+		geo = dae_stream.readElement(self.path, root, spans[1])
+		self.assertEqual(geo.attrib["id"], "B")
+		np.testing.assert_array_equal(dae_arrays.decodeGeometry(geo).positions, readGeometries(self.path, False)[1].positions)
+
+if __name__ == "__main__":
+	unittest.main()
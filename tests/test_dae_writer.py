@@ -0,0 +1,74 @@
+# Number formatting and the streaming XML writer, outside Blender
+
+import io
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_writer
+
+def text(values, digits=0):
+	return "".join(dae_writer.numberChunks(values, digits))
+
+class NumberChunksTest(unittest.TestCase):
+	def values(self, dtype):
+		# More than one chunk, with extremes and awkward fractions in it
+		rng = np.random.RandomState(1)
+		values = (rng.standard_normal(dae_writer.NUMBER_CHUNK * 2 + 7) * 10.0 ** rng.randint(-30, 30, dae_writer.NUMBER_CHUNK * 2 + 7)).astype(dtype)
+		extremes = [0.0, -0.0, 0.1, 1.0 / 3.0, np.finfo(dtype).max, np.finfo(dtype).tiny, -np.finfo(dtype).eps]
+		return np.concatenate([np.array(extremes, dtype), values])
+
+	def test_float32_lossless(self):
+		values = self.values(np.float32)
+		back = np.array(text(values).split(" "), np.float32)
+		np.testing.assert_array_equal(back, values)
+
+	def test_float64_lossless(self):
+		values = self.values(np.float64)
+		back = np.array(text(values).split(" "), np.float64)
+		np.testing.assert_array_equal(back, values)
+
+	def test_digits(self):
+		values = np.array([1.0 / 3.0, 123456789.0, -2.5e-7], np.float32)
+		self.assertEqual(text(values, 6), "0.333333 1.23457e+08 -2.5e-07")
+		back = np.array(text(self.values(np.float32), 6).split(" "), np.float32)
+		np.testing.assert_allclose(back, self.values(np.float32), rtol=1e-5)
+
+	def test_ints(self):
+		values = np.arange(-5, dae_writer.NUMBER_CHUNK + 5, dtype=np.int64)
+		self.assertEqual(text(values), " ".join([str(v) for v in values.tolist()]))
+
+	def test_empty(self):
+		self.assertEqual(text(np.zeros(0, np.float32)), "")
+
+class XMLWriterTest(unittest.TestCase):
+	def test_document(self):
+		f = io.StringIO()
+		root = dae_writer.XMLWriter(f)
+		root.declaration()
+		spool = dae_writer.Spool(1)
+		spool.element("item", "b & <c>", name="2")
+		root.start("doc", b="1", a="x\"y")
+		root.element("empty")
+		root.array("values", iter(["1", " 2 3"]), count="3")
+		root.array("none", iter([]))
+		root.copy(spool)
+		root.end()
+		spool.discard()
+		self.assertEqual(f.getvalue(), "<?xml version='1.0' encoding='utf-8'?>\n"
+			+ "<doc a=\"x&quot;y\" b=\"1\">\n"
+			+ "  <empty />\n"
+			+ "  <values count=\"3\">1 2 3</values>\n"
+			+ "  <none />\n"
+			+ "  <item name=\"2\">b &amp; &lt;c&gt;</item>\n"
+			+ "</doc>\n")
+		doc = ET.fromstring(f.getvalue().split("\n", 1)[1])
+		self.assertEqual(doc.find("item").text, "b & <c>")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,56 @@
+# HODOR joint name parsing and building, outside Blender
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import hodor_names
+
+NAMES = [
+	"NAVL[Light1]_Type[default]_Sz[1.5]_Ph[0]_Fr[1]_Col[1,0,0]_Dist[100]",
+	"DOCK[Path1]_Fam[Fighter]_Link[Path2]_Flags[Exit]_MAD[2]",
+	"SEG[0]_Tol[10]_Spd[50]_Flags[UseRot]",
+	"LITE[Sun]_Type[directional]",
+	"ROOT_LOD[0]",
+	"MULT[Hull]_LOD[1]",
+]
+
+class HodorNameTest(unittest.TestCase):
+	def test_round_trip(self):
+		for name in NAMES[0:4]:
+			tag = hodor_names.parseName(name)
+			self.assertEqual(hodor_names.buildName(tag.name, tag.params), name)
+		# a joint keeps its whole name, the exporter writes it back as it is
+		for name in NAMES[4:]:
+			self.assertEqual(hodor_names.parseName(name).name, name)
+
+	def test_kinds(self):
+		self.assertEqual([hodor_names.parseName(name).kind for name in NAMES], ["NAVL", "DOCK", "SEG", "LITE", "JOINT", "JOINT"])
+		self.assertEqual(hodor_names.parseName("Hull").kind, "JOINT")
+		self.assertEqual(hodor_names.parseName("Hull").tags, ())
+
+	def test_params(self):
+		tag = hodor_names.parseName(NAMES[0])
+		self.assertEqual(tag.name, "NAVL[Light1]")
+		self.assertEqual(tag.get("col"), "1,0,0")
+		self.assertEqual(tag.get("SZ"), "1.5")
+		self.assertIsNone(tag.get("Link"))
+		self.assertEqual(hodor_names.parseName("ROOT_LOD[0]").tags, (("ROOT_LOD", "0"),))
+
+	def test_material_param(self):
+		name = "MAT[Hull]_PARAM[Glow]_Type[RGBA]_Data[1,0,0,1]"
+		tag = hodor_names.parseName(name)
+		self.assertEqual(tag.kind, "MATPARAM")
+		# only Data[] is a parameter, the rest stays in the name
+		self.assertEqual(tag.name, "MAT[Hull]_PARAM[Glow]_Type[RGBA]")
+		self.assertEqual(tag.params, (("Data", "1,0,0,1"),))
+		self.assertEqual(hodor_names.buildName(tag.name, tag.params), name)
+
+	def test_build_values(self):
+		self.assertEqual(hodor_names.buildName("SEG[1]", [("Tol", 2.5), ("Spd", 0)]), "SEG[1]_Tol[2.5]_Spd[0]")
+		self.assertEqual(hodor_names.buildName("JNT[Gun]", []), "JNT[Gun]")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,145 @@
+# TGA decoding and half size proxies, outside Blender
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import dae_reader
+import texture_decode
+
+def tgaHeader(imageType, width, height, depth, descriptor=0):
+	return struct.pack("<BBBHHBHHHHBB", 0, 0, imageType, 0, 0, 0, 0, 0, width, height, depth, descriptor)
+
+def encodeRLE(pixels, bpp):
+	# Runs of equal pixels as run packets, the rest as raw packets, at most 128 a packet
+	pixels = [bytes(pixels[i:i + bpp]) for i in range(0, len(pixels), bpp)]
+	out = bytearray()
+	i = 0
+	while i < len(pixels):
+		n = 1
+		while i + n < len(pixels) and n < 128 and pixels[i + n] == pixels[i]:
+			n = n + 1
+		if n > 1:
+			out.append(0x80 | (n - 1))
+			out.extend(pixels[i])
+		else:
+			while i + n < len(pixels) and n < 128 and pixels[i + n] != pixels[i + n - 1]:
+				n = n + 1
+			out.append(n - 1)
+			for pixel in pixels[i:i + n]:
+				out.extend(pixel)
+		i = i + n
+	return bytes(out)
+
+def image(height, width, bpp):
+	# Flat stretches, for runs, and noise, for raw packets
+	rng = np.random.RandomState(height * width + bpp)
+	pixels = rng.randint(0, 256, (height, width, bpp)).astype(np.uint8)
+	pixels[0:height // 2, 0:width // 2] = 7
+	return pixels
+
+class TGATest(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def write(self, name, data):
+		path = os.path.join(self.dir, name)
+		with open(path, "wb") as f:
+			f.write(data)
+		return path
+
+	def test_uncompressed(self):
+		pixels = image(5, 6, 3)
+		bgra = texture_decode.decodeTGA(self.write("a.tga", tgaHeader(2, 6, 5, 24) + pixels.tobytes()))
+		np.testing.assert_array_equal(bgra[:, :, 0:3], pixels)
+		self.assertTrue((bgra[:, :, 3] == 255).all())
+
+	def test_run_length(self):
+		for bpp, imageType in ((4, 10), (3, 10), (1, 11), (2, 11)):
+			pixels = image(33, 70, bpp)
+			data = tgaHeader(imageType, 70, 33, bpp * 8) + encodeRLE(pixels.tobytes(), bpp)
+			bgra = texture_decode.decodeTGA(self.write("rle.tga", data))
+			plain = texture_decode.decodeTGA(self.write("plain.tga", tgaHeader(imageType - 8, 70, 33, bpp * 8) + pixels.tobytes()))
+			np.testing.assert_array_equal(bgra, plain)
+
+	def test_read_rle(self):
+		pixels = image(9, 300, 4).tobytes()
+		data = b"junk" + encodeRLE(pixels, 4)
+		self.assertEqual(texture_decode.readRLE(data, 4, 9 * 300, 4), pixels)
+		# A packet that runs past the pixels is cut short
+		self.assertEqual(texture_decode.readRLE(bytes([0x83, 1]), 0, 2, 1), bytes([1, 1]))
+		with self.assertRaises(ValueError):
+			texture_decode.readRLE(data[0:len(data) - 3], 4, 9 * 300, 4)
+		with self.assertRaises(ValueError):
+			texture_decode.readRLE(data, 4, 9 * 300 + 1, 4)
+
+	def test_orientation(self):
+		pixels = image(2, 3, 4)
+		topFirst = texture_decode.decodeTGA(self.write("t.tga", tgaHeader(2, 3, 2, 32, 0x28) + pixels.tobytes()))
+		np.testing.assert_array_equal(topFirst, pixels[::-1])
+		rightFirst = texture_decode.decodeTGA(self.write("r.tga", tgaHeader(2, 3, 2, 32, 0x18) + pixels.tobytes()))
+		np.testing.assert_array_equal(rightFirst, pixels[:, ::-1])
+
+	def test_not_handled(self):
+		self.assertIsNone(texture_decode.decodeTGA(self.write("short.tga", b"\0" * 10)))
+		self.assertIsNone(texture_decode.decodeTGA(self.write("map.tga", tgaHeader(1, 2, 2, 8) + b"\0" * 4)))
+		self.assertIsNone(texture_decode.decodeTGA(self.write("cut.tga", tgaHeader(2, 2, 2, 32) + b"\0" * 15)))
+
+	def test_half_size(self):
+		pixels = np.zeros((5, 3, 4), np.uint8)
+		pixels[0:2, 0:2] = [[[0, 1, 2, 255], [1, 1, 2, 255]], [[2, 1, 3, 255], [3, 1, 3, 255]]]
+		half = texture_decode.halfSize(pixels)
+		self.assertEqual(half.shape, (2, 1, 4))
+		self.assertEqual(half[0, 0].tolist(), [2, 1, 3, 255])
+		single = np.zeros((1, 8, 4), np.uint8)
+		self.assertIs(texture_decode.halfSize(single), single)
+
+	def test_proxy(self):
+		pixels = image(8, 6, 4)
+		path = self.write("Hull_DIFF.tga", tgaHeader(10, 6, 8, 32) + encodeRLE(pixels.tobytes(), 4))
+		proxy_dir = os.path.join(self.dir, "proxies")
+		proxy = texture_decode.readProxy(path, proxy_dir)
+		self.assertEqual(os.path.dirname(proxy), proxy_dir)
+		np.testing.assert_array_equal(texture_decode.decodeTGA(proxy), texture_decode.halfSize(pixels))
+		self.assertEqual(texture_decode.readProxy(path, proxy_dir), proxy)
+		self.assertIsNone(texture_decode.readProxy(self.write("Hull_DIFF.png", b"png"), proxy_dir))
+		# A truncated file gets no proxy, and no error
+		cut = self.write("Cut_DIFF.tga", tgaHeader(10, 6, 8, 32) + encodeRLE(pixels.tobytes(), 4)[0:20])
+		self.assertIsNone(texture_decode.readProxy(cut, proxy_dir))
+
+	def test_decoder(self):
+		pixels = image(8, 6, 4)
+		path = self.write("Hull_DIFF.tga", tgaHeader(10, 6, 8, 32) + encodeRLE(pixels.tobytes(), 4))
+		proxy_dir = os.path.join(self.dir, "proxies")
+		decoder = texture_decode.ProxyDecoder(dae_reader.ReaderPool(2, None, "texture_decode"), proxy_dir)
+		try:
+			decoder.request(path)
+			proxy = decoder.result(path)
+			self.assertTrue(decoder.pool.working())
+		finally:
+			decoder.close()
+		self.assertEqual(proxy, texture_decode.readProxy(path, proxy_dir))
+		np.testing.assert_array_equal(texture_decode.decodeTGA(proxy), texture_decode.halfSize(pixels))
+
+	def test_decoder_without_pool(self):
+		class FailingPool:
+			def apply_async(self, name, job):
+				raise OSError("no processes")
+			def working(self):
+				return False
+		path = self.write("Hull_DIFF.tga", tgaHeader(2, 6, 8, 32) + image(8, 6, 4).tobytes())
+		decoder = texture_decode.ProxyDecoder(FailingPool(), os.path.join(self.dir, "proxies"))
+		self.assertEqual(decoder.result(path), texture_decode.readProxy(path, decoder.proxy_dir))
+
+if __name__ == "__main__":
+	unittest.main()
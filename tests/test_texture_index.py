@@ -0,0 +1,65 @@
+# Texture path resolution, outside Blender
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addons", "HW_Toolkit"))
+
+import texture_index
+
+class TextureIndexTest(unittest.TestCase):
+	def setUp(self):
+		# ship/ship.dae next to ship/Textures/Hull_DIFF.TGA
+		self.dir = tempfile.mkdtemp()
+		self.ship = os.path.join(self.dir, "ship")
+		os.makedirs(os.path.join(self.ship, "Textures"))
+		self.texture = os.path.join(self.ship, "Textures", "Hull_DIFF.TGA")
+		open(self.texture, "wb").close()
+		texture_index.index.clear()
+
+	def tearDown(self):
+		texture_index.index.clear()
+		shutil.rmtree(self.dir)
+
+	def resolve(self, text, diffuse=True):
+		return texture_index.resolveImagePath(self.ship, text, diffuse)
+
+	def test_init_path(self):
+		self.assertEqual(texture_index.initPath("file:///C:/Ships/Hull%20A.tga"), "C:/Ships/Hull A.tga")
+		self.assertEqual(texture_index.initPath("file:///home/me/hull.tga"), "/home/me/hull.tga")
+		self.assertEqual(texture_index.initPath("file://./Textures/hull.tga"), "./Textures/hull.tga")
+		self.assertEqual(texture_index.initPath(" ..\\Textures\\hull.tga "), "../Textures/hull.tga")
+		self.assertTrue(texture_index.isAbsolute("C:/Ships/hull.tga"))
+		self.assertFalse(texture_index.isAbsolute("Textures/hull.tga"))
+
+	def test_diffuse_names(self):
+		self.assertEqual(texture_index.diffName("IMG[Hull_GLOW]"), "IMG[Hull_DIFF]")
+		self.assertEqual(texture_index.diffFileName("Hull_GLOW.tga"), "Hull_DIFF.tga")
+		self.assertEqual(texture_index.diffFileName("Hull_diff.tga"), "Hull_diff.tga")
+
+	def test_case_insensitive(self):
+		self.assertEqual(self.resolve("./textures/hull_glow.tga"), (self.texture, True))
+		self.assertEqual(self.resolve("file://" + self.ship.replace(os.sep, "/") + "/TEXTURES/HULL_DIFF.tga"), (self.texture, True))
+
+	def test_found_near(self):
+		# The path is wrong, but the file is in a folder under the DAE's
+		self.assertEqual(self.resolve("..\\..\\Elsewhere\\Hull_DIFF.tga"), (self.texture, True))
+
+	def test_not_found(self):
+		path, found = self.resolve("Textures/Deck_DIFF.tga")
+		self.assertFalse(found)
+		self.assertEqual(path, os.path.join(self.ship, "Textures", "Deck_DIFF.tga"))
+
+	def test_listing_kept(self):
+		self.resolve("Textures/Deck_DIFF.tga")
+		# Made after the folder was listed, so not seen until the index is cleared
+		open(os.path.join(self.ship, "Textures", "Deck_DIFF.tga"), "wb").close()
+		self.assertFalse(self.resolve("textures/deck_diff.tga")[1])
+		texture_index.index.clear()
+		self.assertTrue(self.resolve("textures/deck_diff.tga")[1])
+
+if __name__ == "__main__":
+	unittest.main()